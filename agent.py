@@ -1,22 +1,36 @@
 """Managed Deep Agent entrypoint for Chat LangChain."""
 
+from pathlib import Path
+
 from managed_deepagents import define_deep_agent
 
 from src.agent.config import (
     DEFAULT_MODEL,
     GUARDRAILS_MODEL,
+    MODEL_PREWARM,
+    context_budget_for,
+    get_chat_model,
     model_fallback_middleware,
     model_retry_middleware,
+    prewarm_models,
     summarization_model,
     tool_retry_middleware,
+    turn_budget_middleware,
 )
 from src.middleware.guardrails_middleware import GuardrailsMiddleware
 from src.middleware.ingress_guards_middleware import IngressGuardsMiddleware
 from src.middleware.summarization_middleware import CustomSummarizationMiddleware
-from src.prompts.context_summary_prompt import context_summary_prompt
+from src.middleware.tool_dedupe_middleware import ToolResultDedupeMiddleware
+from src.prompts.context_summary_prompt import (
+    context_summary_prompt,
+    incremental_context_summary_prompt,
+    merge_context_summary_prompt,
+)
 from src.tools.link_check_tools import check_links
 from src.tools.pricing_tools import fetch_langchain_pricing
 from src.tools.pylon_tools import get_support_article_content, search_support_articles
+from src.utils.summary_cache import SummaryCache
+from src.utils.token_estimation import token_estimator_for
 from src.utils.trace_root_metadata import build_docs_agent_trace_metadata
 
 # The MCP docs tools are declared in connectors/mcp.py so the managed runtime
@@ -28,7 +42,21 @@ docs_agent_tools = [
     check_links,
 ]
 
+# Shared cached token counts; the system prompt and local tool schemas are
+# counted once here instead of on every summarization check.
+token_estimator = token_estimator_for(DEFAULT_MODEL.id)
+token_estimator.precount_static(
+    system_prompt=(Path(__file__).parent / "instructions.md").read_text(
+        encoding="utf-8"
+    ),
+    tools=docs_agent_tools,
+)
+default_budget = DEFAULT_MODEL.context_budget()
+
 docs_agent_middleware = [
+    # Outermost: one deadline and attempt limit for every retry and fallback
+    # layer below, including summary calls.
+    turn_budget_middleware,
     # Cap oversized user input (was auth.py). Trace metadata is applied via
     # define_deep_agent(metadata=...) so it lands on the LangSmith root run.
     IngressGuardsMiddleware(),
@@ -38,13 +66,34 @@ docs_agent_middleware = [
         block_off_topic=True,
     ),
     CustomSummarizationMiddleware(
-        model=DEFAULT_MODEL.id,
+        # Shares the default model instance used by the summary runnable; it is
+        # built on first use, not at import.
+        model=get_chat_model(DEFAULT_MODEL.id),
         summary_model=summarization_model,
-        trigger=("tokens", 130_000),
-        keep=("tokens", 30_000),
+        trigger=("tokens", default_budget.trigger_tokens),
+        keep=("tokens", default_budget.keep_tokens),
+        # Thresholds follow the model that served the latest turn, so a fallback
+        # to a smaller or pricier model compacts earlier.
+        context_budget=context_budget_for,
+        token_counter=token_estimator,
         summary_prompt=context_summary_prompt,
+        incremental_summary_prompt=incremental_context_summary_prompt,
+        # Prepare the next compaction in the background well before the trigger.
+        presummarize_tokens=default_budget.presummarize_tokens,
+        # Stub re-fetchable tool results before asking the model to summarize.
+        compact_tool_outputs=True,
+        # Summarize 100k+ prefixes as concurrent ~25k-token chunks plus a merge;
+        # smaller prefixes are faster as a single call.
+        map_reduce_chunk_tokens=25_000,
+        map_reduce_concurrency=4,
+        map_reduce_min_tokens=100_000,
+        merge_summary_prompt=merge_context_summary_prompt,
+        # Regenerates and forks of a long thread reuse the summary of its prefix.
+        summary_cache=SummaryCache(),
         trim_tokens_to_summarize=None,
     ),
+    # Outside the retry layer, so a repeated call is answered without running.
+    ToolResultDedupeMiddleware(),
     tool_retry_middleware,
     model_retry_middleware,
     model_fallback_middleware,
@@ -62,3 +111,6 @@ agent = define_deep_agent(
     disable_memory=True,
     metadata=build_docs_agent_trace_metadata(),
 )
+
+if MODEL_PREWARM:
+    prewarm_models()
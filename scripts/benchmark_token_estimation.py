@@ -0,0 +1,82 @@
+"""Benchmark per-call token counting overhead as conversation history grows.
+
+Simulates the summarization check on each model call: the history gains one
+turn, then the whole history is counted. Compares recounting every message with
+``count_tokens_approximately`` against the cached ``TokenEstimator``.
+
+Usage:
+    python -m scripts.benchmark_token_estimation --sizes 100 1000 5000
+"""
+
+import argparse
+import sys
+import time
+import uuid
+
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from langchain_core.messages.utils import count_tokens_approximately
+
+from src.utils.token_estimation import TokenEstimator
+
+
+def _history(size: int) -> list:
+    messages = []
+    for i in range(size):
+        kind = i % 3
+        if kind == 0:
+            messages.append(
+                HumanMessage(content=f"How do I configure checkpointing? {i} " * 20)
+            )
+        elif kind == 1:
+            messages.append(
+                AIMessage(
+                    content="",
+                    tool_calls=[
+                        {
+                            "id": f"call_{i}",
+                            "name": "search_docs",
+                            "args": {"q": str(i)},
+                        }
+                    ],
+                )
+            )
+        else:
+            messages.append(
+                ToolMessage(
+                    content="Docs result snippet. " * 200, tool_call_id=f"call_{i - 1}"
+                )
+            )
+        messages[-1].id = str(uuid.uuid4())
+    return messages
+
+
+def _per_call_microseconds(count, messages: list, calls: int) -> float:
+    """Count ``messages`` once (warm-up), then time ``calls`` counts with one new message each."""
+    history = list(messages)
+    count(history)
+    started = time.perf_counter()
+    for i in range(calls):
+        history.append(HumanMessage(content=f"follow-up {i}", id=str(uuid.uuid4())))
+        count(history)
+    return (time.perf_counter() - started) / calls * 1e6
+
+
+def main() -> None:
+    """Print per-call counting overhead for each history size."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1_000, 5_000])
+    parser.add_argument("--calls", type=int, default=20)
+    args = parser.parse_args()
+
+    sys.stdout.write(f"{'messages':>10} {'recount (us)':>14} {'cached (us)':>12}\n")
+    for size in args.sizes:
+        messages = _history(size)
+        recount = _per_call_microseconds(
+            count_tokens_approximately, messages, args.calls
+        )
+        cached = _per_call_microseconds(TokenEstimator(), messages, args.calls)
+        sys.stdout.write(f"{size:>10} {recount:>14.0f} {cached:>12.0f}\n")
+
+
+if __name__ == "__main__":
+    main()
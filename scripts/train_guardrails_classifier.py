@@ -0,0 +1,73 @@
+"""Train the local guardrails classifier from a guardrails dataset export.
+
+Accepts a JSON or JSONL export of ``Chat-LangChain-Guardrails-Samples`` where each
+row is either a LangSmith example (``{"inputs": {"query": ...}, "outputs":
+{"expected_result": ...}}``) or a flat ``{"query": ..., "expected_result": ...}``
+record. Rows that were themselves decided by the local classifier are skipped so
+the model is not trained on its own labels.
+
+Usage:
+    python -m scripts.train_guardrails_classifier export.jsonl \
+        --output artifacts/guardrails_classifier.json
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+from src.middleware.guardrails_local_classifier import (
+    DEFAULT_ARTIFACT_PATH,
+    train_local_classifier,
+)
+
+
+def _read_rows(path: Path) -> list[dict]:
+    text = path.read_text(encoding="utf-8").strip()
+    if text.startswith("["):
+        return json.loads(text)
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+
+def _labelled_examples(rows: list[dict], include_local: bool) -> list[tuple[str, str]]:
+    examples = []
+    for row in rows:
+        inputs = row.get("inputs") or row
+        outputs = row.get("outputs") or row
+        query = inputs.get("query")
+        label = outputs.get("expected_result")
+        if not isinstance(query, str) or label not in ("ALLOWED", "BLOCKED"):
+            continue
+        if outputs.get("classifier") == "local" and not include_local:
+            continue
+        examples.append((query, label))
+    return examples
+
+
+def main() -> None:
+    """Train and write the local guardrails classifier artifact."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("export", type=Path, help="JSON or JSONL dataset export")
+    parser.add_argument("--output", type=Path, default=DEFAULT_ARTIFACT_PATH)
+    parser.add_argument("--target-precision", type=float, default=0.99)
+    parser.add_argument("--epochs", type=int, default=8)
+    parser.add_argument(
+        "--include-local",
+        action="store_true",
+        help="Also train on rows labelled by the local classifier",
+    )
+    args = parser.parse_args()
+
+    examples = _labelled_examples(_read_rows(args.export), args.include_local)
+    classifier, stats = train_local_classifier(
+        examples, epochs=args.epochs, target_precision=args.target_precision
+    )
+
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    artifact = classifier.to_artifact(source=args.export.name, stats=stats)
+    args.output.write_text(json.dumps(artifact), encoding="utf-8")
+    sys.stdout.write(f"{json.dumps(stats, indent=2)}\nWrote {args.output}\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,19 +2,25 @@
 
 import logging
 import os
+import threading
 from dataclasses import dataclass
+from typing import Any, AsyncIterator, Iterable, Iterator
 
 import dotenv
 from langchain.agents.middleware import ModelFallbackMiddleware
 from langchain.chat_models import init_chat_model
-from langchain_core.runnables import Runnable, RunnableLambda
+from langchain_core.language_models import BaseChatModel
+from langchain_core.runnables import Runnable, RunnableConfig, RunnableLambda
 
 from src.middleware.retry_middleware import (
     RETRYABLE_FINISH_REASONS,
     MalformedResponseError,
     ModelRetryMiddleware,
 )
+from src.middleware.retry_policy import DEFAULT_RETRY_POLICY, start_model_attempt
+from src.middleware.summarization_middleware import ContextBudget
 from src.middleware.tool_retry_middleware import ToolRetryMiddleware
+from src.middleware.turn_budget_middleware import TurnBudgetMiddleware
 
 dotenv.load_dotenv()
 
@@ -25,6 +31,14 @@ logger = logging.getLogger(__name__)
 # =============================================================================
 
 
+@dataclass(frozen=True)
+class LatencyProfile:
+    """How quickly a model responds; used to size its context budget."""
+
+    time_to_first_token_seconds: float
+    input_tokens_per_second: int  # Prompt processing throughput
+
+
 @dataclass
 class ModelConfig:
     """Configuration for a supported chat model."""
@@ -33,8 +47,47 @@ class ModelConfig:
     name: str  # Display name, e.g., "Gemini 3.5 Flash Lite"
     provider: str  # e.g., "google", "openai", "baseten"
     api_key_env: str  # Environment variable for API key
+    context_window: int  # Maximum input tokens
+    input_cost_per_mtok: float  # USD per million input tokens
+    output_cost_per_mtok: float  # USD per million output tokens
+    latency: LatencyProfile
     description: str | None = None
 
+    def context_budget(self) -> ContextBudget:
+        """Return the summarization thresholds this model should run with.
+
+        The trigger is the smallest of a share of the context window, the prompt
+        size the model processes within the prefill budget, and the prompt size
+        that costs the per-call input budget. It is also capped at the same share
+        of the smallest window in the fallback chain, since a failing call is
+        retried on the fallbacks with the history as it stands. Keep and soft
+        thresholds scale with it.
+        """
+        trigger = min(
+            int(self.context_window * SUMMARIZATION_WINDOW_FRACTION),
+            fallback_chain_trigger_tokens(),
+            int(
+                self.latency.input_tokens_per_second
+                * SUMMARIZATION_PREFILL_BUDGET_SECONDS
+            ),
+            int(
+                SUMMARIZATION_MAX_CALL_INPUT_COST / self.input_cost_per_mtok * 1_000_000
+            ),
+        )
+        return ContextBudget(
+            trigger_tokens=trigger,
+            keep_tokens=int(trigger * SUMMARIZATION_KEEP_FRACTION),
+            presummarize_tokens=int(trigger * SUMMARIZATION_PRESUMMARIZE_FRACTION),
+        )
+
+
+# Summarization thresholds derived from each model's window, speed and price.
+SUMMARIZATION_WINDOW_FRACTION = 0.65
+SUMMARIZATION_PREFILL_BUDGET_SECONDS = 5.0
+SUMMARIZATION_MAX_CALL_INPUT_COST = 0.10  # USD
+SUMMARIZATION_KEEP_FRACTION = 0.25
+SUMMARIZATION_PRESUMMARIZE_FRACTION = 0.75
+
 
 # Backend-supported models.
 MODELS: dict[str, ModelConfig] = {
@@ -44,6 +97,12 @@ MODELS: dict[str, ModelConfig] = {
         name="Claude Haiku 4.5",
         provider="anthropic",
         api_key_env="ANTHROPIC_API_KEY",
+        context_window=200_000,
+        input_cost_per_mtok=1.0,
+        output_cost_per_mtok=5.0,
+        latency=LatencyProfile(
+            time_to_first_token_seconds=0.7, input_tokens_per_second=20_000
+        ),
         description="Fast and cheap Anthropic model",
     ),
     # OpenAI
@@ -52,6 +111,12 @@ MODELS: dict[str, ModelConfig] = {
         name="GPT-5.4 Nano",
         provider="openai",
         api_key_env="OPENAI_API_KEY",
+        context_window=400_000,
+        input_cost_per_mtok=0.05,
+        output_cost_per_mtok=0.4,
+        latency=LatencyProfile(
+            time_to_first_token_seconds=0.9, input_tokens_per_second=40_000
+        ),
         description="Cheapest GPT-5.4-class model for simple high-volume tasks",
     ),
     # Google
@@ -60,6 +125,12 @@ MODELS: dict[str, ModelConfig] = {
         name="Gemini 3.5 Flash Lite",
         provider="google",
         api_key_env="GOOGLE_API_KEY",
+        context_window=1_048_576,
+        input_cost_per_mtok=0.1,
+        output_cost_per_mtok=0.4,
+        latency=LatencyProfile(
+            time_to_first_token_seconds=0.4, input_tokens_per_second=60_000
+        ),
         description="Fastest, most cost-effective Gemini",
     ),
 }
@@ -74,6 +145,40 @@ FALLBACK_MODELS = [
     MODELS["claude-haiku-4.5"],
 ]
 
+
+def model_config_for(model_name: str | None) -> ModelConfig | None:
+    """Return the registered model a response's ``model_name`` came from, if any.
+
+    Providers may append a date or revision, so ``gpt-5.4-nano-2026-03-01``
+    matches ``openai:gpt-5.4-nano``.
+    """
+    if not model_name:
+        return None
+    name = model_name.split(":", 1)[-1].removeprefix("models/")
+    matches = [
+        config
+        for config in MODELS.values()
+        if name.startswith(config.id.split(":", 1)[1])
+    ]
+    return max(matches, key=lambda config: len(config.id), default=None)
+
+
+def fallback_chain_trigger_tokens() -> int:
+    """Return the largest trigger every model in the fallback chain has room for."""
+    smallest_window = min(
+        model.context_window for model in (DEFAULT_MODEL, *FALLBACK_MODELS)
+    )
+    return int(smallest_window * SUMMARIZATION_WINDOW_FRACTION)
+
+
+def context_budget_for(model_name: str | None) -> ContextBudget:
+    """Return the context budget of the model that served the latest turn.
+
+    Unknown or missing models get the default model's budget.
+    """
+    return (model_config_for(model_name) or DEFAULT_MODEL).context_budget()
+
+
 # =============================================================================
 # API Key Setup
 # =============================================================================
@@ -96,10 +201,164 @@ for key in API_KEYS:
 
 # Retry configuration
 MAX_RETRIES = int(os.getenv("MODEL_MAX_RETRIES", "2"))
-
-# Primary model. Public callers cannot switch this at runtime.
-default_model = init_chat_model(model=DEFAULT_MODEL.id)
-logger.info(f"Default model: {DEFAULT_MODEL.name} ({DEFAULT_MODEL.id})")
+# Provider SDK retries are off: our retry layer is the only one, so attempts
+# are counted once and stay within the turn budget.
+PROVIDER_MAX_RETRIES = 0
+# End-to-end budget for one agent turn, across retries and fallbacks.
+TURN_DEADLINE_SECONDS = float(os.getenv("TURN_DEADLINE_SECONDS", "180"))
+# Retries and fallback attempts per turn; successful model calls are not capped.
+TURN_MAX_MODEL_RETRIES = int(os.getenv("TURN_MAX_MODEL_RETRIES", "10"))
+
+# Build every registered model in the background at startup.
+MODEL_PREWARM = os.getenv("MODEL_PREWARM", "").lower() in {"1", "true", "yes"}
+
+
+class LazyChatModel(Runnable[Any, Any]):
+    """Chat model proxy that builds the model, and imports its provider, on first use.
+
+    Runnable calls are delegated to the built model, and any other attribute
+    (``with_structured_output``, ``bind_tools``, ...) is read from it.
+    """
+
+    _OWN_ATTRIBUTES = frozenset({"model_id", "init_kwargs", "_model", "_lock"})
+
+    def __init__(self, model: str, **kwargs: Any):
+        """Record the model id and ``init_chat_model`` kwargs without building anything."""
+        self.model_id = model
+        self.init_kwargs = kwargs
+        self._model: BaseChatModel | None = None
+        self._lock = threading.Lock()
+
+    def resolve(self) -> BaseChatModel:
+        """Return the underlying chat model, building it on the first call."""
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    self._model = init_chat_model(
+                        model=self.model_id,
+                        **{"max_retries": PROVIDER_MAX_RETRIES, **self.init_kwargs},
+                    )
+                    logger.debug(f"Initialized model {self.model_id}")
+        return self._model
+
+    def __getattr__(self, name: str) -> Any:
+        """Read any other attribute from the built model."""
+        if name in self._OWN_ATTRIBUTES or (
+            name.startswith("__") and name.endswith("__")
+        ):
+            raise AttributeError(name)
+        return getattr(self.resolve(), name)
+
+    def __repr__(self) -> str:
+        """Show the model id and whether it has been built."""
+        state = "built" if self._model is not None else "not built"
+        return f"LazyChatModel({self.model_id!r}, {state})"
+
+    def invoke(
+        self, input: Any, config: RunnableConfig | None = None, **kwargs: Any
+    ) -> Any:
+        """Invoke the built model."""
+        return self.resolve().invoke(input, config, **kwargs)
+
+    async def ainvoke(
+        self, input: Any, config: RunnableConfig | None = None, **kwargs: Any
+    ) -> Any:
+        """Invoke the built model asynchronously."""
+        return await self.resolve().ainvoke(input, config, **kwargs)
+
+    def batch(self, inputs: list[Any], config: Any = None, **kwargs: Any) -> list[Any]:
+        """Batch-invoke the built model."""
+        return self.resolve().batch(inputs, config, **kwargs)
+
+    async def abatch(
+        self, inputs: list[Any], config: Any = None, **kwargs: Any
+    ) -> list[Any]:
+        """Batch-invoke the built model asynchronously."""
+        return await self.resolve().abatch(inputs, config, **kwargs)
+
+    def stream(
+        self, input: Any, config: RunnableConfig | None = None, **kwargs: Any
+    ) -> Iterator[Any]:
+        """Stream from the built model."""
+        yield from self.resolve().stream(input, config, **kwargs)
+
+    async def astream(
+        self, input: Any, config: RunnableConfig | None = None, **kwargs: Any
+    ) -> AsyncIterator[Any]:
+        """Stream from the built model asynchronously."""
+        async for chunk in self.resolve().astream(input, config, **kwargs):
+            yield chunk
+
+    def transform(
+        self, input: Iterator[Any], config: RunnableConfig | None = None, **kwargs: Any
+    ) -> Iterator[Any]:
+        """Transform an input stream with the built model."""
+        yield from self.resolve().transform(input, config, **kwargs)
+
+    async def atransform(
+        self,
+        input: AsyncIterator[Any],
+        config: RunnableConfig | None = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[Any]:
+        """Transform an input stream with the built model asynchronously."""
+        async for chunk in self.resolve().atransform(input, config, **kwargs):
+            yield chunk
+
+
+# One shared model, and therefore one HTTP client and connection pool, per
+# (model id, settings) pair across all middleware.
+_model_registry: dict[tuple[str, tuple[tuple[str, Any], ...]], LazyChatModel] = {}
+_model_registry_lock = threading.Lock()
+
+
+def get_chat_model(model_id: str, **settings: Any) -> LazyChatModel:
+    """Return the shared lazy chat model for ``model_id`` with ``settings``.
+
+    ``settings`` are ``init_chat_model`` kwargs and must be hashable.
+    """
+    key = (model_id, tuple(sorted(settings.items())))
+    with _model_registry_lock:
+        model = _model_registry.get(key)
+        if model is None:
+            model = LazyChatModel(model_id, **settings)
+            _model_registry[key] = model
+        return model
+
+
+def prewarm_models(models: Iterable[LazyChatModel] | None = None) -> threading.Thread:
+    """Build models (default: every registered one) on a background thread.
+
+    First use then skips the provider import and client construction.
+    """
+    if models is None:
+        with _model_registry_lock:
+            models = list(_model_registry.values())
+    else:
+        models = list(models)
+
+    def build() -> None:
+        for model in models:
+            try:
+                model.resolve()
+            except Exception as e:
+                logger.warning(f"Failed to pre-warm model {model.model_id}: {e}")
+        logger.info(f"Pre-warmed {len(models)} models")
+
+    thread = threading.Thread(target=build, name="model-prewarm", daemon=True)
+    thread.start()
+    return thread
+
+
+def __getattr__(name: str) -> Any:
+    """Build ``default_model`` on first access instead of at import."""
+    if name == "default_model":
+        # Primary model. Public callers cannot switch this at runtime.
+        model = get_chat_model(DEFAULT_MODEL.id).resolve()
+        globals()["default_model"] = model
+        logger.info(f"Default model: {DEFAULT_MODEL.name} ({DEFAULT_MODEL.id})")
+        return model
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 def _raise_for_retryable_finish_reason(response: object) -> object:
@@ -110,18 +369,19 @@ def _raise_for_retryable_finish_reason(response: object) -> object:
     return response
 
 
-def _init_retrying_model(model: str) -> Runnable:
-    return (
-        init_chat_model(model=model)
-        | RunnableLambda(_raise_for_retryable_finish_reason)
-    ).with_retry(stop_after_attempt=MAX_RETRIES + 1)
+def _init_retrying_model(model: str, fallback: bool = False) -> Runnable:
+    return DEFAULT_RETRY_POLICY.runnable_retry(
+        get_chat_model(model) | RunnableLambda(_raise_for_retryable_finish_reason),
+        max_attempts=MAX_RETRIES + 1,
+        fallback=fallback,
+    )
 
 
 def init_retry_fallback_model(model: str) -> Runnable:
     """Initialize a model runnable with the shared retry and fallback policy."""
     primary_model = _init_retrying_model(model)
     fallback_models = [
-        _init_retrying_model(fallback.id) for fallback in FALLBACK_MODELS
+        _init_retrying_model(fallback.id, fallback=True) for fallback in FALLBACK_MODELS
     ]
     return primary_model.with_fallbacks(fallback_models)
 
@@ -134,8 +394,52 @@ summarization_model = init_retry_fallback_model(DEFAULT_MODEL.id)
 
 model_retry_middleware = ModelRetryMiddleware(max_retries=MAX_RETRIES)
 tool_retry_middleware = ToolRetryMiddleware(max_attempts=3)
+turn_budget_middleware = TurnBudgetMiddleware(
+    turn_seconds=TURN_DEADLINE_SECONDS, max_model_retries=TURN_MAX_MODEL_RETRIES
+)
+
+
+def _shared_model(model: Any) -> Any:
+    """Return the registry instance of a registered ``model``, else ``model`` itself.
+
+    The agent's primary model is built by the agent factory with its SDK's
+    default retries; the registry instance retries only through our policy.
+    """
+    if isinstance(model, LazyChatModel):
+        return model.resolve()
+    name = getattr(model, "model", None) or getattr(model, "model_name", None)
+    if isinstance(name, str) and (config := model_config_for(name)) is not None:
+        return get_chat_model(config.id).resolve()
+    return model
+
+
+class LazyModelFallbackMiddleware(ModelFallbackMiddleware):
+    """``ModelFallbackMiddleware`` that builds its fallback models on first use."""
 
-model_fallback_middleware = ModelFallbackMiddleware(*[m.id for m in FALLBACK_MODELS])
+    def __init__(self, *model_ids: str) -> None:
+        """Register the fallback models, in order, without building them."""
+        super().__init__(*[get_chat_model(model_id) for model_id in model_ids])
+        self.model_ids = list(model_ids)
+
+    async def awrap_model_call(self, request: Any, handler: Any) -> Any:
+        """Try the primary then each fallback, counting fallbacks as turn retries."""
+        calls = 0
+
+        async def counted(attempt_request: Any) -> Any:
+            nonlocal calls
+            calls += 1
+            start_model_attempt(fallback=calls > 1)
+            model = _shared_model(attempt_request.model)
+            if model is not attempt_request.model:
+                attempt_request = attempt_request.override(model=model)
+            return await handler(attempt_request)
+
+        return await super().awrap_model_call(request, counted)
+
+
+model_fallback_middleware = LazyModelFallbackMiddleware(
+    *[m.id for m in FALLBACK_MODELS]
+)
 logger.info(f"Fallback chain: {' -> '.join(m.name for m in FALLBACK_MODELS)}")
 
 # =============================================================================
@@ -148,16 +452,26 @@ __all__ = [
     "DEFAULT_MODEL",
     "GUARDRAILS_MODEL",
     "FALLBACK_MODELS",
+    "LatencyProfile",
     "ModelConfig",
+    "context_budget_for",
+    "model_config_for",
     # Models
-    "default_model",
+    "LazyChatModel",
+    "get_chat_model",
+    "prewarm_models",
     "init_retry_fallback_model",
     "summarization_model",
     # Middleware
+    "LazyModelFallbackMiddleware",
     "model_retry_middleware",
     "tool_retry_middleware",
+    "turn_budget_middleware",
     "model_fallback_middleware",
     # Config
     "MAX_RETRIES",
+    "MODEL_PREWARM",
+    "TURN_DEADLINE_SECONDS",
+    "TURN_MAX_MODEL_RETRIES",
     "logger",
 ]
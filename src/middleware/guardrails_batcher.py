@@ -0,0 +1,101 @@
+"""Micro-batching of concurrent guardrails classifications.
+
+Classifications submitted within ``max_wait_seconds`` of each other are sent
+as one structured-output request (up to ``max_batch_size`` queries), so the
+long guardrails system prompt is paid once per batch instead of once per
+query. Any batch that cannot be used raises ``GuardrailsBatchError`` to each
+waiter, which then falls back to a single classification call.
+"""
+
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable
+
+logger = logging.getLogger(__name__)
+
+
+class GuardrailsBatchError(Exception):
+    """Raised when a query could not be classified as part of a batch."""
+
+    pass
+
+
+class GuardrailsMicroBatcher:
+    """Collect concurrent classification requests into small batches."""
+
+    def __init__(
+        self,
+        classify_batch: Callable[[list[str]], Awaitable[list[Any]]],
+        *,
+        max_batch_size: int = 8,
+        max_wait_seconds: float = 0.005,
+    ):
+        """Initialize with the batch classifier and the batch size and latency caps."""
+        self.classify_batch = classify_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait_seconds = max_wait_seconds
+        self._pending: list[tuple[str, asyncio.Future]] = []
+        self._timer: asyncio.TimerHandle | None = None
+        self._tasks: set[asyncio.Task] = set()
+
+    async def submit(self, query: str) -> Any:
+        """Classify ``query`` as part of the next batch.
+
+        Raises:
+            GuardrailsBatchError: If the batch failed, could not be parsed, or
+                contained only this query.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((query, future))
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait_seconds, self._flush)
+        return await future
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+
+        task = asyncio.get_running_loop().create_task(self._run(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: list[tuple[str, asyncio.Future]]) -> None:
+        if len(batch) == 1:
+            # Nothing to amortize; let the caller make its normal single call.
+            _, future = batch[0]
+            if not future.done():
+                future.set_exception(GuardrailsBatchError("batch of one"))
+            return
+
+        try:
+            results = await self.classify_batch([query for query, _ in batch])
+            if len(results) != len(batch):
+                raise GuardrailsBatchError(
+                    f"expected {len(batch)} decisions, got {len(results)}"
+                )
+        except Exception as e:
+            logger.warning(
+                "Batched guardrails classification of %s queries failed: %s. "
+                "Falling back to single calls.",
+                len(batch),
+                e,
+            )
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(GuardrailsBatchError(str(e)))
+            return
+
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+
+__all__ = ["GuardrailsBatchError", "GuardrailsMicroBatcher"]
@@ -0,0 +1,230 @@
+"""Batched background writer for guardrails dataset samples.
+
+Sampled guardrails decisions are buffered in a bounded in-process queue and
+written by a single long-lived writer task with one LangSmith client, in
+batches. Near-identical queries are deduplicated once written, samples are
+dropped (and counted) when the queue is full, and anything still buffered is
+flushed when the event loop cancels the writer at shutdown, or failing that
+at interpreter exit.
+"""
+
+import asyncio
+import atexit
+import hashlib
+import logging
+import re
+import threading
+from collections import OrderedDict, deque
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+_NORMALIZE_RE = re.compile(r"[^a-z0-9]+")
+
+
+def _dedupe_key(query: str, result: str) -> str:
+    """Hash the decision plus the query with case, punctuation and spacing removed."""
+    normalized = _NORMALIZE_RE.sub(" ", query.lower()).strip()
+    return hashlib.blake2b(
+        f"{result}\0{normalized}".encode(), digest_size=8
+    ).hexdigest()
+
+
+class GuardrailsSampleWriter:
+    """Queue guardrails samples and write them to a LangSmith dataset in batches."""
+
+    def __init__(
+        self,
+        dataset_name: str,
+        *,
+        description: str = "",
+        max_queue: int = 1_000,
+        batch_size: int = 50,
+        flush_interval: float = 5.0,
+        dedupe_window: int = 5_000,
+    ):
+        """Initialize the writer; the background task starts on the first sample."""
+        self.dataset_name = dataset_name
+        self.description = description
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.dedupe_window = dedupe_window
+
+        self.written = 0
+        self.dropped = 0
+        self.deduplicated = 0
+        self.failed = 0
+
+        # Samples are queued with their dedupe key. A key is pending until its
+        # sample is written; only then is it remembered as recent.
+        self._buffer: deque[tuple[str, dict[str, Any]]] = deque()
+        self._pending: set[str] = set()
+        self._recent: OrderedDict[str, None] = OrderedDict()
+        self._keys_lock = threading.Lock()
+        self._client = None
+        self._dataset_id: str | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._wakeup: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+        atexit.register(self.flush_sync)
+
+    def submit(
+        self,
+        query: str,
+        result: str,
+        explanation: str,
+        classifier: str = "llm",
+        *,
+        start_writer: bool = True,
+    ) -> bool:
+        """Queue one sample without blocking. Returns whether it was accepted.
+
+        With ``start_writer=False`` no writer task is started for the sample, so
+        it can be queued while the event loop shuts down; it is then written by
+        a writer that is still running, the next one, or at interpreter exit.
+        """
+        key = _dedupe_key(query, result)
+        with self._keys_lock:
+            if key in self._recent:
+                self._recent.move_to_end(key)
+            duplicate = key in self._recent or key in self._pending
+        if duplicate:
+            self.deduplicated += 1
+            return False
+
+        if len(self._buffer) >= self.max_queue:
+            self.dropped += 1
+            if self.dropped == 1 or self.dropped % 100 == 0:
+                logger.warning(
+                    "Guardrails sample queue full (%s); %s samples dropped so far",
+                    self.max_queue,
+                    self.dropped,
+                )
+            return False
+
+        with self._keys_lock:
+            self._pending.add(key)
+        self._buffer.append(
+            (
+                key,
+                {
+                    "inputs": {"query": query},
+                    "outputs": {
+                        "expected_result": result,
+                        "explanation": explanation,
+                        "classifier": classifier,
+                    },
+                },
+            )
+        )
+        if start_writer:
+            self._ensure_writer()
+        if self._wakeup is not None and len(self._buffer) >= self.batch_size:
+            self._wakeup.set()
+        return True
+
+    def _ensure_writer(self) -> None:
+        """Start the writer task on the running loop if it is not already running."""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return  # No loop: samples are flushed by the next writer or at exit.
+
+        if self._task is not None and not self._task.done() and self._loop is loop:
+            return
+
+        self._loop = loop
+        self._wakeup = asyncio.Event()
+        self._task = loop.create_task(self._run())
+
+    async def _run(self) -> None:
+        """Flush the buffer whenever a batch fills up or the flush interval elapses.
+
+        When the task is cancelled, by ``aclose`` or by the event loop shutting
+        down, it writes what is still buffered before it stops.
+        """
+        assert self._wakeup is not None
+        wakeup = self._wakeup
+        try:
+            while True:
+                try:
+                    await asyncio.wait_for(wakeup.wait(), timeout=self.flush_interval)
+                except TimeoutError:
+                    pass
+                wakeup.clear()
+                await self.flush()
+        except asyncio.CancelledError:
+            await self.flush()
+            raise
+
+    async def flush(self) -> None:
+        """Write everything currently buffered, one batch at a time."""
+        while batch := self._take_batch():
+            await asyncio.to_thread(self._write_batch, batch)
+
+    def flush_sync(self) -> None:
+        """Write everything currently buffered from synchronous code (e.g. at exit)."""
+        while batch := self._take_batch():
+            self._write_batch(batch)
+
+    async def aclose(self) -> None:
+        """Stop the writer task and flush any remaining samples."""
+        task, self._task = self._task, None
+        if task is not None and not task.done():
+            task.cancel()
+            if task.get_loop() is asyncio.get_running_loop():
+                await asyncio.gather(task, return_exceptions=True)
+        await self.flush()
+
+    def _take_batch(self) -> list[tuple[str, dict[str, Any]]]:
+        count = min(self.batch_size, len(self._buffer))
+        return [self._buffer.popleft() for _ in range(count)]
+
+    def _write_batch(self, batch: list[tuple[str, dict[str, Any]]]) -> None:
+        """Create one batch of examples, looking up or creating the dataset once.
+
+        Keys of written samples are remembered for deduplication; keys of a
+        failed batch are released so the same samples can be submitted again.
+        """
+        keys = [key for key, _ in batch]
+        try:
+            if self._client is None:
+                from langsmith import Client
+
+                self._client = Client()
+
+            if self._dataset_id is None:
+                try:
+                    dataset = self._client.read_dataset(dataset_name=self.dataset_name)
+                except Exception:
+                    dataset = self._client.create_dataset(
+                        dataset_name=self.dataset_name,
+                        description=self.description,
+                    )
+                self._dataset_id = str(dataset.id)
+
+            self._client.create_examples(
+                dataset_id=self._dataset_id, examples=[example for _, example in batch]
+            )
+        except Exception as e:
+            self.failed += len(batch)
+            with self._keys_lock:
+                self._pending.difference_update(keys)
+            logger.warning(
+                f"Failed to add {len(batch)} guardrails samples to dataset: {e}"
+            )
+            return
+
+        self.written += len(batch)
+        with self._keys_lock:
+            self._pending.difference_update(keys)
+            for key in keys:
+                self._recent[key] = None
+                self._recent.move_to_end(key)
+            while len(self._recent) > self.dedupe_window:
+                self._recent.popitem(last=False)
+        logger.debug(f"Added {len(batch)} guardrails samples to dataset")
+
+
+__all__ = ["GuardrailsSampleWriter"]
@@ -0,0 +1,293 @@
+"""Local first-stage guardrails classifier (hashed n-gram logistic regression).
+
+The model is trained offline from an export of the
+``Chat-LangChain-Guardrails-Samples`` dataset (see
+``scripts/train_guardrails_classifier.py``) and shipped as a JSON artifact.
+At request time it scores the current query in pure Python and only answers
+when it is confident; everything else is escalated to the LLM classifiers.
+"""
+
+import json
+import logging
+import math
+import os
+import random
+import re
+import zlib
+from collections.abc import Iterable
+from pathlib import Path
+from typing import Literal
+
+logger = logging.getLogger(__name__)
+
+ARTIFACT_VERSION = 1
+DEFAULT_N_FEATURES = 2**18
+DEFAULT_ALLOW_THRESHOLD = 0.02
+DEFAULT_BLOCK_THRESHOLD = 0.98
+#: Only the head of very long queries is featurized; the LLM sees the rest.
+MAX_FEATURE_CHARS = 2_000
+LOCAL_CLASSIFIER_EXPLANATION_PREFIX = "Local classifier"
+
+DEFAULT_ARTIFACT_PATH = (
+    Path(__file__).resolve().parents[2] / "artifacts" / "guardrails_classifier.json"
+)
+_ARTIFACT_PATH_ENV = "GUARDRAILS_LOCAL_CLASSIFIER_PATH"
+
+_TOKEN_RE = re.compile(r"[a-z0-9_]+")
+
+Label = Literal["ALLOWED", "BLOCKED"]
+
+
+def _hashed_features(text: str, n_features: int) -> dict[int, float]:
+    """Return L2-normalized hashed word uni/bigram and char trigram counts."""
+    tokens = _TOKEN_RE.findall(text[:MAX_FEATURE_CHARS].lower())
+    if not tokens:
+        return {}
+
+    grams = list(tokens)
+    grams.extend(f"{a} {b}" for a, b in zip(tokens, tokens[1:]))
+    joined = f" {' '.join(tokens)} "
+    grams.extend(f"#{joined[i : i + 3]}" for i in range(len(joined) - 2))
+
+    mask = n_features - 1
+    counts: dict[int, float] = {}
+    for gram in grams:
+        index = zlib.crc32(gram.encode()) & mask
+        counts[index] = counts.get(index, 0.0) + 1.0
+
+    norm = math.sqrt(sum(value * value for value in counts.values()))
+    return {index: value / norm for index, value in counts.items()}
+
+
+def _sigmoid(score: float) -> float:
+    if score >= 0:
+        return 1.0 / (1.0 + math.exp(-score))
+    exp_score = math.exp(score)
+    return exp_score / (1.0 + exp_score)
+
+
+class LocalGuardrailsClassifier:
+    """Score queries with a hashed n-gram linear model and decide confident cases."""
+
+    def __init__(
+        self,
+        weights: dict[int, float],
+        bias: float,
+        n_features: int = DEFAULT_N_FEATURES,
+        allow_threshold: float = DEFAULT_ALLOW_THRESHOLD,
+        block_threshold: float = DEFAULT_BLOCK_THRESHOLD,
+    ):
+        """Initialize the classifier from trained weights and decision thresholds."""
+        if n_features <= 0 or n_features & (n_features - 1):
+            raise ValueError(f"n_features must be a power of two, got {n_features}")
+        if not 0.0 <= allow_threshold < block_threshold <= 1.0:
+            raise ValueError(
+                "Expected 0 <= allow_threshold < block_threshold <= 1, got "
+                f"{allow_threshold} and {block_threshold}"
+            )
+        self.weights = weights
+        self.bias = bias
+        self.n_features = n_features
+        self.allow_threshold = allow_threshold
+        self.block_threshold = block_threshold
+
+    def blocked_probability(self, text: str) -> float:
+        """Return the model's probability that ``text`` should be BLOCKED."""
+        features = _hashed_features(text, self.n_features)
+        score = self.bias + sum(
+            self.weights.get(index, 0.0) * value for index, value in features.items()
+        )
+        return _sigmoid(score)
+
+    def classify(self, text: str) -> dict[str, str | float] | None:
+        """Return a guardrails decision when confident, otherwise ``None`` to escalate."""
+        if not text or not text.strip():
+            return None
+
+        probability = self.blocked_probability(text)
+        if probability <= self.allow_threshold:
+            decision: Label = "ALLOWED"
+        elif probability >= self.block_threshold:
+            decision = "BLOCKED"
+        else:
+            return None
+
+        return {
+            "decision": decision,
+            "explanation": (
+                f"{LOCAL_CLASSIFIER_EXPLANATION_PREFIX}: p(blocked)={probability:.3f}."
+            ),
+            "confidence": round(max(probability, 1.0 - probability), 3),
+        }
+
+    def to_artifact(self, **extra: object) -> dict[str, object]:
+        """Serialize the classifier into a JSON-compatible artifact."""
+        return {
+            "version": ARTIFACT_VERSION,
+            "n_features": self.n_features,
+            "bias": self.bias,
+            "allow_threshold": self.allow_threshold,
+            "block_threshold": self.block_threshold,
+            "weights": {str(index): weight for index, weight in self.weights.items()},
+            **extra,
+        }
+
+    @classmethod
+    def from_artifact(cls, artifact: dict) -> "LocalGuardrailsClassifier":
+        """Build a classifier from a deserialized artifact."""
+        version = artifact.get("version")
+        if version != ARTIFACT_VERSION:
+            raise ValueError(
+                f"Unsupported guardrails classifier artifact version: {version}"
+            )
+        return cls(
+            weights={int(index): float(w) for index, w in artifact["weights"].items()},
+            bias=float(artifact["bias"]),
+            n_features=int(artifact["n_features"]),
+            allow_threshold=float(artifact["allow_threshold"]),
+            block_threshold=float(artifact["block_threshold"]),
+        )
+
+    @classmethod
+    def load(cls, path: str | Path) -> "LocalGuardrailsClassifier":
+        """Load a classifier artifact from disk."""
+        with open(path, encoding="utf-8") as f:
+            return cls.from_artifact(json.load(f))
+
+
+def load_local_classifier(
+    path: str | Path | None = None,
+) -> LocalGuardrailsClassifier | None:
+    """Load the shipped artifact, returning ``None`` when it is absent or invalid."""
+    artifact_path = Path(path or os.getenv(_ARTIFACT_PATH_ENV) or DEFAULT_ARTIFACT_PATH)
+    if not artifact_path.is_file():
+        logger.info(
+            "No local guardrails classifier at %s; using LLM classification only",
+            artifact_path,
+        )
+        return None
+
+    try:
+        classifier = LocalGuardrailsClassifier.load(artifact_path)
+    except Exception as e:
+        logger.warning(
+            f"Failed to load local guardrails classifier {artifact_path}: {e}"
+        )
+        return None
+
+    logger.info(
+        "Loaded local guardrails classifier from %s (allow<=%.3f, block>=%.3f)",
+        artifact_path,
+        classifier.allow_threshold,
+        classifier.block_threshold,
+    )
+    return classifier
+
+
+def _confident_threshold(
+    scored: list[tuple[float, Label]], label: Label, target_precision: float
+) -> float | None:
+    """Return the widest threshold whose decided examples meet ``target_precision``.
+
+    For ALLOWED the threshold is an upper bound on p(blocked); for BLOCKED it is a
+    lower bound. Returns ``None`` when no threshold reaches the target.
+    """
+    ordered = sorted(scored, reverse=label == "BLOCKED")
+    best: float | None = None
+    correct = 0
+    for count, (probability, actual) in enumerate(ordered, start=1):
+        correct += actual == label
+        if correct / count >= target_precision:
+            best = probability
+    return best
+
+
+def train_local_classifier(
+    examples: Iterable[tuple[str, Label]],
+    *,
+    n_features: int = DEFAULT_N_FEATURES,
+    epochs: int = 8,
+    learning_rate: float = 0.5,
+    l2: float = 1e-5,
+    target_precision: float = 0.99,
+    validation_fraction: float = 0.2,
+    seed: int = 0,
+) -> tuple[LocalGuardrailsClassifier, dict[str, float | int]]:
+    """Train a hashed n-gram logistic regression on labelled guardrails samples.
+
+    Decision thresholds are calibrated on a held-out split so that locally decided
+    ALLOWED and BLOCKED queries each reach ``target_precision``; with too little
+    data the conservative defaults are kept.
+
+    Returns:
+        The trained classifier and a dict of training statistics.
+    """
+    rows = [(text, label) for text, label in examples if text and text.strip()]
+    if not rows:
+        raise ValueError("No labelled examples to train on")
+
+    rng = random.Random(seed)
+    rng.shuffle(rows)
+    split = int(len(rows) * (1 - validation_fraction)) if len(rows) >= 10 else len(rows)
+    train_rows, validation_rows = rows[:split], rows[split:]
+
+    featurized = [
+        (_hashed_features(text, n_features), 1.0 if label == "BLOCKED" else 0.0)
+        for text, label in train_rows
+    ]
+    weights: dict[int, float] = {}
+    bias = 0.0
+    for epoch in range(epochs):
+        rng.shuffle(featurized)
+        step = learning_rate / (1 + epoch)
+        for features, target in featurized:
+            score = bias + sum(weights.get(i, 0.0) * v for i, v in features.items())
+            gradient = _sigmoid(score) - target
+            bias -= step * gradient
+            for index, value in features.items():
+                weight = weights.get(index, 0.0)
+                weights[index] = weight - step * (gradient * value + l2 * weight)
+
+    weights = {index: w for index, w in weights.items() if abs(w) >= 1e-4}
+    classifier = LocalGuardrailsClassifier(
+        weights=weights, bias=bias, n_features=n_features
+    )
+
+    if validation_rows:
+        scored = [
+            (classifier.blocked_probability(text), label)
+            for text, label in validation_rows
+        ]
+        allow = _confident_threshold(scored, "ALLOWED", target_precision)
+        block = _confident_threshold(scored, "BLOCKED", target_precision)
+        if allow is not None and block is not None and allow < block:
+            classifier.allow_threshold = min(allow, 0.5)
+            classifier.block_threshold = max(block, 0.5)
+
+    stats: dict[str, float | int] = {
+        "train_examples": len(train_rows),
+        "validation_examples": len(validation_rows),
+        "blocked_examples": sum(label == "BLOCKED" for _, label in rows),
+        "allow_threshold": classifier.allow_threshold,
+        "block_threshold": classifier.block_threshold,
+    }
+    if validation_rows:
+        decided = [
+            (classifier.classify(text), label) for text, label in validation_rows
+        ]
+        local = [(d["decision"], label) for d, label in decided if d is not None]
+        stats["validation_coverage"] = len(local) / len(validation_rows)
+        stats["validation_accuracy"] = (
+            sum(decision == label for decision, label in local) / len(local)
+            if local
+            else 0.0
+        )
+    return classifier, stats
+
+
+__all__ = [
+    "LOCAL_CLASSIFIER_EXPLANATION_PREFIX",
+    "LocalGuardrailsClassifier",
+    "load_local_classifier",
+    "train_local_classifier",
+]
@@ -0,0 +1,169 @@
+"""Image preprocessing for guardrails classification.
+
+Screenshots arrive as full-size base64 data URLs. Before they are sent to the
+guardrails classifier they are downscaled, re-encoded as JPEG and capped in
+number, and images already present earlier in the thread (and therefore
+already classified) are replaced by a short text note.
+"""
+
+import base64
+import binascii
+import hashlib
+import io
+import logging
+from collections import OrderedDict
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+#: Longest image side sent to the classifier, in pixels.
+GUARDRAILS_IMAGE_MAX_SIDE = 768
+GUARDRAILS_IMAGE_JPEG_QUALITY = 70
+#: Maximum number of new images sent to the classifier per query.
+GUARDRAILS_MAX_IMAGES = 3
+
+_IMAGE_BLOCK_TYPES = ("image_url", "input_image", "image")
+_DOWNSCALE_CACHE_SIZE = 64
+
+# Downscaled data URLs keyed by image fingerprint, shared by the classification
+# and rejection paths so an image is only re-encoded once.
+_downscaled: OrderedDict[str, str] = OrderedDict()
+
+
+def _image_source(block: dict) -> str | None:
+    """Return the image URL / data URL for a supported image block."""
+    block_type = block.get("type")
+    if block_type == "image_url":
+        image_url = block.get("image_url")
+        if isinstance(image_url, dict):
+            return image_url.get("url")
+        return image_url if isinstance(image_url, str) else None
+    if block_type == "input_image":
+        image_url = block.get("image_url")
+        return image_url if isinstance(image_url, str) else None
+    if block_type == "image":
+        data = block.get("base64") or block.get("data")
+        if isinstance(data, str):
+            mime_type = block.get("mime_type") or "image/png"
+            return f"data:{mime_type};base64,{data}"
+        url = block.get("url")
+        return url if isinstance(url, str) else None
+    return None
+
+
+def image_fingerprint(block: Any) -> str | None:
+    """Return a content hash for an image block, or ``None`` if it is not an image."""
+    if not isinstance(block, dict) or block.get("type") not in _IMAGE_BLOCK_TYPES:
+        return None
+    source = _image_source(block)
+    if not source:
+        return None
+    return hashlib.blake2b(source.encode(), digest_size=16).hexdigest()
+
+
+def _downscale_data_url(source: str) -> str | None:
+    """Downscale and JPEG re-encode a base64 data URL; ``None`` if not possible."""
+    if not source.startswith("data:") or ";base64," not in source:
+        return None
+
+    try:
+        from PIL import Image
+    except ImportError:
+        return None
+
+    try:
+        raw = base64.b64decode(source.split(";base64,", 1)[1], validate=False)
+        with Image.open(io.BytesIO(raw)) as image:
+            image.thumbnail((GUARDRAILS_IMAGE_MAX_SIDE, GUARDRAILS_IMAGE_MAX_SIDE))
+            buffer = io.BytesIO()
+            image.convert("RGB").save(
+                buffer, format="JPEG", quality=GUARDRAILS_IMAGE_JPEG_QUALITY
+            )
+    except (OSError, ValueError, binascii.Error) as e:
+        logger.debug(f"Could not downscale image for guardrails: {e}")
+        return None
+
+    encoded = base64.b64encode(buffer.getvalue()).decode()
+    if len(encoded) >= len(source):
+        return None
+    return f"data:image/jpeg;base64,{encoded}"
+
+
+def downscale_image_block(block: dict) -> dict:
+    """Return a smaller ``image_url`` block for ``block``, or ``block`` unchanged."""
+    fingerprint = image_fingerprint(block)
+    if fingerprint is None:
+        return block
+
+    data_url = _downscaled.get(fingerprint)
+    if data_url is None:
+        data_url = _downscale_data_url(_image_source(block) or "")
+        if data_url is None:
+            return block
+        _downscaled[fingerprint] = data_url
+        if len(_downscaled) > _DOWNSCALE_CACHE_SIZE:
+            _downscaled.popitem(last=False)
+    else:
+        _downscaled.move_to_end(fingerprint)
+
+    return {"type": "image_url", "image_url": {"url": data_url}}
+
+
+def seen_image_fingerprints(messages: list) -> set[str]:
+    """Return fingerprints of every image in ``messages``."""
+    seen: set[str] = set()
+    for message in messages:
+        content = getattr(message, "content", None)
+        if isinstance(content, list):
+            for block in content:
+                if fingerprint := image_fingerprint(block):
+                    seen.add(fingerprint)
+    return seen
+
+
+def prepare_guardrails_media(content: Any, seen: set[str] | None = None) -> Any:
+    """Downscale, deduplicate and cap the images in message content for guardrails.
+
+    Args:
+        content: Message content (a string is returned unchanged).
+        seen: Fingerprints of images that were already classified in this thread.
+    """
+    if not isinstance(content, list):
+        return content
+
+    seen = set(seen or ())
+    prepared: list[Any] = []
+    sent = 0
+    repeated = 0
+    omitted = 0
+    for block in content:
+        fingerprint = image_fingerprint(block)
+        if fingerprint is None:
+            prepared.append(block)
+        elif fingerprint in seen:
+            repeated += 1
+        elif sent >= GUARDRAILS_MAX_IMAGES:
+            omitted += 1
+        else:
+            seen.add(fingerprint)
+            prepared.append(downscale_image_block(block))
+            sent += 1
+
+    if repeated:
+        prepared.append(
+            {
+                "type": "text",
+                "text": f"[{repeated} image(s) omitted: already reviewed in this conversation]",
+            }
+        )
+    if omitted:
+        prepared.append({"type": "text", "text": f"[{omitted} more image(s) omitted]"})
+    return prepared
+
+
+__all__ = [
+    "downscale_image_block",
+    "image_fingerprint",
+    "prepare_guardrails_media",
+    "seen_image_fingerprints",
+]
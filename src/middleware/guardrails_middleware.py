@@ -1,28 +1,73 @@
 """Lenient guardrails middleware to filter only egregious misuse."""
 
 import asyncio
+import contextvars
+import copy
 import logging
+import math
 import os
 import random
-from typing import Any, Literal
+import re
+from typing import Annotated, Any, Awaitable, Callable, Literal
 
 import langsmith as ls
 from langchain.agents.middleware import AgentMiddleware, AgentState, hook_config
-from langchain.chat_models import init_chat_model
+from langchain.agents.middleware.types import (
+    ExtendedModelResponse,
+    ModelCallResult,
+    ModelRequest,
+    ModelResponse,
+)
+from langchain_core.callbacks import BaseCallbackManager
 from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from langchain_core.runnables.config import ensure_config, var_child_runnable_config
 from langgraph.runtime import Runtime
-from langsmith import Client
+from langgraph.types import Command
 from typing_extensions import NotRequired, TypedDict
 
+from src.middleware.guardrails_batcher import (
+    GuardrailsBatchError,
+    GuardrailsMicroBatcher,
+)
+from src.middleware.guardrails_dataset_writer import GuardrailsSampleWriter
+from src.middleware.guardrails_local_classifier import (
+    LocalGuardrailsClassifier,
+    load_local_classifier,
+)
+from src.middleware.guardrails_media import (
+    downscale_image_block,
+    prepare_guardrails_media,
+    seen_image_fingerprints,
+)
+from src.prompts.guardrails_prompts import (
+    explanation_instruction as _EXPLANATION_INSTRUCTION,
+)
 from src.prompts.guardrails_prompts import (
     fallback_rejection_message as _FALLBACK_REJECTION_MESSAGE,
 )
 from src.prompts.guardrails_prompts import (
     guardrails_system_prompt as _LOCAL_GUARDRAILS_SYSTEM_PROMPT,
 )
+from src.prompts.guardrails_prompts import (
+    minimal_output_instruction as _MINIMAL_OUTPUT_INSTRUCTION,
+)
 from src.prompts.guardrails_prompts import (
     rejection_system_prompt as _REJECTION_SYSTEM_PROMPT,
 )
+from src.prompts.guardrails_prompts import (
+    rejection_templates as _REJECTION_TEMPLATES,
+)
+from src.prompts.guardrails_prompts import (
+    single_call_rejection_instruction as _SINGLE_CALL_REJECTION_INSTRUCTION,
+)
+from src.utils.latency import RollingLatency
+from src.utils.prompt_registry import HubPrompt, prompt_registry
+
+try:
+    # Private to langgraph; speculative mode needs it to hold streamed tokens.
+    from langgraph.pregel._messages import StreamMessagesHandler
+except ImportError:  # pragma: no cover - depends on the installed langgraph
+    StreamMessagesHandler = None
 
 logger = logging.getLogger(__name__)
 
@@ -30,12 +75,87 @@ logger = logging.getLogger(__name__)
 GUARDRAILS_DATASET_NAME = "Chat-LangChain-Guardrails-Samples"
 ALLOWED_SAMPLE_RATE = 0.01  # 1% of allowed queries go to dataset
 GUARDRAILS_MAX_RETRIES = 2
+# Per-attempt timeouts adapt to each model's observed p99 latency times the
+# multiplier, clamped to [min, max]. The max applies until enough samples exist.
 GUARDRAILS_TIMEOUT_SECONDS = 10
+GUARDRAILS_MIN_TIMEOUT_SECONDS = 1.0
+GUARDRAILS_TIMEOUT_PERCENTILE = 0.99
+GUARDRAILS_TIMEOUT_MULTIPLIER = 2.0
+# Total guardrails budget per turn: every classifier model, retry and hedge,
+# plus the rejection message.
+GUARDRAILS_DEADLINE_SECONDS = 15
+# Hedge to the next model once the current one exceeds its observed p95 latency
+# (or the default delay until enough samples exist), clamped to [min, timeout].
+GUARDRAILS_HEDGE_PERCENTILE = 0.95
+GUARDRAILS_HEDGE_DELAY_SECONDS = 3.0
+GUARDRAILS_HEDGE_MIN_DELAY_SECONDS = 0.5
 _USE_LOCAL_PROMPTS = os.getenv("USE_LOCAL_PROMPTS", "").lower() in {
     "1",
     "true",
     "yes",
 }
+# Classify concurrently with the first model call instead of blocking on it.
+GUARDRAILS_SPECULATIVE = os.getenv("GUARDRAILS_SPECULATIVE", "").lower() in {
+    "1",
+    "true",
+    "yes",
+}
+# Drop a speculative verdict no model call claimed, e.g. because the run failed
+# before reaching the model. Must outlast a turn's slowest path to the model.
+GUARDRAILS_UNCLAIMED_VERDICT_SECONDS = 300
+# Batch concurrent text-only classifications into one request.
+GUARDRAILS_MICRO_BATCH = os.getenv("GUARDRAILS_MICRO_BATCH", "").lower() in {
+    "1",
+    "true",
+    "yes",
+}
+GUARDRAILS_BATCH_MAX_SIZE = 8
+GUARDRAILS_BATCH_MAX_WAIT_SECONDS = 0.005
+# Ask the classifier for the rejection reply too, so blocked turns take one call.
+GUARDRAILS_SINGLE_CALL = os.getenv("GUARDRAILS_SINGLE_CALL", "").lower() in {
+    "1",
+    "true",
+    "yes",
+}
+# Accept confident answers from the first (cheapest) classifier and escalate
+# only low-confidence ones to the next model in the chain.
+GUARDRAILS_CASCADE = os.getenv("GUARDRAILS_CASCADE", "").lower() in {
+    "1",
+    "true",
+    "yes",
+}
+GUARDRAILS_CASCADE_MIN_CONFIDENCE = 0.8
+# Ask the classifier for a single-word decision and write explanations later,
+# only for blocked or sampled queries. Ignored in single-call mode.
+GUARDRAILS_MINIMAL_OUTPUT = os.getenv("GUARDRAILS_MINIMAL_OUTPUT", "").lower() in {
+    "1",
+    "true",
+    "yes",
+}
+# Model id prefixes whose chat models return token logprobs.
+_LOGPROB_MODEL_PREFIXES = ("openai:",)
+_MINIMAL_DECISION_RE = re.compile(r"\b(ALLOWED|BLOCKED)\b")
+# Skip the classifier for short text follow-ups in threads whose recent turns
+# were ALLOWED, unless the follow-up matches a zero-tolerance pattern.
+GUARDRAILS_REUSE_VERDICTS = os.getenv("GUARDRAILS_REUSE_VERDICTS", "").lower() in {
+    "1",
+    "true",
+    "yes",
+}
+GUARDRAILS_FOLLOW_UP_MAX_CHARS = 80
+# Prior queries (and their decisions) kept in state as classifier context.
+GUARDRAILS_CONTEXT_TURNS = 3
+# Consecutive reused turns before the thread is classified again.
+GUARDRAILS_MAX_REUSED_TURNS = 3
+_ZERO_TOLERANCE_RE = re.compile(
+    r"system prompt|developer (message|prompt)|your (instructions|rules|prompt)"
+    r"|ignore (all |any |the )?(previous|prior|above)"
+    r"|poem|story|stories|song|lyric|haiku|roleplay|role-play|pretend|fiction"
+    r"|sex|nsfw|nude|porn|erotic"
+    r"|malware|ransomware|keylogger|phishing|exploit|weapon"
+    r"|my boss|fired|just this once|you must|or else",
+    re.IGNORECASE,
+)
 _USE_STAGING = (
     os.getenv("LANGSMITH_HOST_PROJECT_NAME") == "immanuel-chat-langchain-test"
     or os.getenv("LANGSMITH_ENV") == "dev"
@@ -46,8 +166,18 @@ _GUARDRAILS_PROMPT_HUB_NAME = (
     else "public-chat-langchain-guardrails-test:production"
 )
 
-# Cache for dataset ID to avoid repeated lookups
-_dataset_id_cache: str | None = None
+# Single background writer shared by every middleware instance in the process.
+_sample_writer = GuardrailsSampleWriter(
+    GUARDRAILS_DATASET_NAME,
+    description=(
+        "Production samples for guardrails evaluation. Contains all blocked "
+        "queries and 1% of allowed queries."
+    ),
+)
+
+# Call latencies per model (and per model for rejection messages), used for
+# adaptive timeouts and hedge delays. Timed-out calls count at their timeout.
+_classifier_latency = RollingLatency()
 
 
 class GuardrailsDecision(TypedDict):
@@ -57,6 +187,108 @@ class GuardrailsDecision(TypedDict):
     explanation: str
 
 
+# Asked for only in cascade mode, where it decides whether to escalate; the
+# local classifier and token logprobs may also add it to a decision.
+_Confidence = Annotated[
+    float, ..., "How certain the decision is, from 0.0 (a guess) to 1.0 (certain)"
+]
+
+
+class GuardrailsScoredDecision(GuardrailsDecision):
+    """Structured output for a cascade guardrails decision, with its confidence."""
+
+    confidence: _Confidence
+
+
+BlockCategory = Literal[
+    "none",
+    "off_topic",
+    "creative_writing",
+    "explicit_content",
+    "harmful_use",
+    "prompt_extraction",
+    "social_pressure",
+]
+
+
+class GuardrailsVerdict(GuardrailsDecision):
+    """Structured output for single-call guardrails: decision plus rejection reply."""
+
+    block_category: Annotated[
+        BlockCategory, ..., 'Why the query was blocked; "none" when ALLOWED'
+    ]
+    rejection_message: Annotated[
+        str, ..., "User-facing reply when BLOCKED; empty when ALLOWED"
+    ]
+
+
+class GuardrailsScoredVerdict(GuardrailsVerdict):
+    """Structured output for a cascade single-call verdict, with its confidence."""
+
+    confidence: _Confidence
+
+
+_QueryId = Annotated[int, ..., "The id of the query this decision is for"]
+
+
+class GuardrailsBatchItem(GuardrailsDecision):
+    """One decision in a batched guardrails response."""
+
+    id: _QueryId
+
+
+class GuardrailsScoredBatchItem(GuardrailsScoredDecision):
+    """One cascade decision in a batched guardrails response."""
+
+    id: _QueryId
+
+
+class GuardrailsVerdictBatchItem(GuardrailsVerdict):
+    """One single-call verdict in a batched guardrails response."""
+
+    id: _QueryId
+
+
+class GuardrailsScoredVerdictBatchItem(GuardrailsScoredVerdict):
+    """One cascade single-call verdict in a batched guardrails response."""
+
+    id: _QueryId
+
+
+class GuardrailsDecisionBatch(TypedDict):
+    """Structured output for a batch of guardrails decisions."""
+
+    decisions: list[GuardrailsBatchItem]
+
+
+class GuardrailsScoredDecisionBatch(TypedDict):
+    """Structured output for a batch of cascade guardrails decisions."""
+
+    decisions: list[GuardrailsScoredBatchItem]
+
+
+class GuardrailsVerdictBatch(TypedDict):
+    """Structured output for a batch of single-call guardrails verdicts."""
+
+    decisions: list[GuardrailsVerdictBatchItem]
+
+
+class GuardrailsScoredVerdictBatch(TypedDict):
+    """Structured output for a batch of cascade single-call guardrails verdicts."""
+
+    decisions: list[GuardrailsScoredVerdictBatchItem]
+
+
+# Structured-output schema per (single_call, cascade) mode, for one query and
+# for a batch of queries.
+_OUTPUT_SCHEMAS: dict[tuple[bool, bool], tuple[type, type]] = {
+    (False, False): (GuardrailsDecision, GuardrailsDecisionBatch),
+    (False, True): (GuardrailsScoredDecision, GuardrailsScoredDecisionBatch),
+    (True, False): (GuardrailsVerdict, GuardrailsVerdictBatch),
+    (True, True): (GuardrailsScoredVerdict, GuardrailsScoredVerdictBatch),
+}
+
+
 class GuardrailsClassificationError(Exception):
     """Raised when guardrails classification fails after retries."""
 
@@ -67,34 +299,137 @@ class GuardrailsState(AgentState):
     """Extended state schema with off-topic flag."""
 
     off_topic_query: NotRequired[bool]
+    # Rolling guardrails context for verdict reuse (oldest first).
+    guardrails_recent_queries: NotRequired[list[str]]
+    guardrails_recent_decisions: NotRequired[list[str]]
+    guardrails_reused_turns: NotRequired[int]
 
 
-if _USE_LOCAL_PROMPTS:
-    _GUARDRAILS_SYSTEM_PROMPT = _LOCAL_GUARDRAILS_SYSTEM_PROMPT
-    guardrails_prompt_commit = None
-    guardrails_prompt_source = "local:src/prompts/guardrails_prompts.py"
-    logger.info("Using local guardrails prompt because USE_LOCAL_PROMPTS is enabled")
-else:
-    _langsmith_client = Client()
-    try:
-        _prompt_template = _langsmith_client.pull_prompt(_GUARDRAILS_PROMPT_HUB_NAME)
-        _GUARDRAILS_SYSTEM_PROMPT = _prompt_template.invoke({"messages": []}).messages[
-            0
-        ].content
-        guardrails_prompt_commit = (_prompt_template.metadata or {}).get(
-            "lc_hub_commit_hash"
-        )
-        guardrails_prompt_source = f"hub:{_GUARDRAILS_PROMPT_HUB_NAME}"
-        logger.info(
-            f"Loaded guardrails prompt from hub: {_GUARDRAILS_PROMPT_HUB_NAME} @ {(guardrails_prompt_commit or '')[:8]}"
-        )
-    except Exception:
-        logger.warning(
-            f"Failed to pull guardrails prompt from hub ({_GUARDRAILS_PROMPT_HUB_NAME}), falling back to local file"
+_LOCAL_GUARDRAILS_PROMPT_SOURCE = "local:src/prompts/guardrails_prompts.py"
+
+
+def _guardrails_hub_prompt() -> HubPrompt | None:
+    """Return the Hub guardrails prompt if it has been loaded, without blocking."""
+    if _USE_LOCAL_PROMPTS:
+        return None
+    return prompt_registry.get(_GUARDRAILS_PROMPT_HUB_NAME)
+
+
+def _guardrails_system_prompt() -> str:
+    """Return the Hub guardrails prompt, or the local one until it is available."""
+    hub_prompt = _guardrails_hub_prompt()
+    return hub_prompt.content if hub_prompt else _LOCAL_GUARDRAILS_SYSTEM_PROMPT
+
+
+def __getattr__(name: str) -> Any:
+    """Resolve the guardrails prompt and its provenance lazily."""
+    if name == "_GUARDRAILS_SYSTEM_PROMPT":
+        return _guardrails_system_prompt()
+    if name == "guardrails_prompt_commit":
+        hub_prompt = _guardrails_hub_prompt()
+        return hub_prompt.commit if hub_prompt else None
+    if name == "guardrails_prompt_source":
+        hub_prompt = _guardrails_hub_prompt()
+        return (
+            f"hub:{_GUARDRAILS_PROMPT_HUB_NAME}"
+            if hub_prompt
+            else _LOCAL_GUARDRAILS_PROMPT_SOURCE
         )
-        _GUARDRAILS_SYSTEM_PROMPT = _LOCAL_GUARDRAILS_SYSTEM_PROMPT
-        guardrails_prompt_commit = None
-        guardrails_prompt_source = "local:src/prompts/guardrails_prompts.py"
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def _adaptive_timeout(latency_key: str) -> float:
+    """Return a per-attempt timeout derived from the key's observed latency."""
+    observed = _classifier_latency.percentile(
+        latency_key, GUARDRAILS_TIMEOUT_PERCENTILE
+    )
+    if observed is None:
+        return GUARDRAILS_TIMEOUT_SECONDS
+    return min(
+        max(observed * GUARDRAILS_TIMEOUT_MULTIPLIER, GUARDRAILS_MIN_TIMEOUT_SECONDS),
+        GUARDRAILS_TIMEOUT_SECONDS,
+    )
+
+
+class _HeldStream:
+    """Hold ``stream_mode="messages"`` chunks until released, then pass them through."""
+
+    def __init__(self, stream: Callable[[Any], None]):
+        """Wrap the ``stream`` callable of a messages stream handler."""
+        self._stream = stream
+        self._held: list[Any] = []
+        self._released = False
+
+    def __call__(self, chunk: Any) -> None:
+        """Emit ``chunk`` if released, otherwise hold it."""
+        if self._released:
+            self._stream(chunk)
+        else:
+            self._held.append(chunk)
+
+    def release(self) -> None:
+        """Emit the held chunks in order and stream later ones directly."""
+        self._released = True
+        held, self._held = self._held, []
+        for chunk in held:
+            self._stream(chunk)
+
+
+def _holding_callbacks(callbacks: Any) -> tuple[Any, list[_HeldStream]]:
+    """Return ``callbacks`` with each messages stream handler held back.
+
+    The held streams are returned with the callbacks; nothing they receive
+    reaches the client until they are released.
+    """
+    swapped: dict[int, StreamMessagesHandler] = {}
+    streams: list[_HeldStream] = []
+
+    def hold(handler: Any) -> Any:
+        if not isinstance(handler, StreamMessagesHandler):
+            return handler
+        if id(handler) not in swapped:
+            held = copy.copy(handler)
+            held.stream = _HeldStream(handler.stream)
+            streams.append(held.stream)
+            swapped[id(handler)] = held
+        return swapped[id(handler)]
+
+    if isinstance(callbacks, BaseCallbackManager):
+        manager = callbacks.copy()
+        manager.handlers = [hold(handler) for handler in manager.handlers]
+        manager.inheritable_handlers = [
+            hold(handler) for handler in manager.inheritable_handlers
+        ]
+        return manager, streams
+    if isinstance(callbacks, list):
+        return [hold(handler) for handler in callbacks], streams
+    return callbacks, streams
+
+
+async def _timed_call(
+    latency_key: str, call: Awaitable[Any], deadline: float | None = None
+) -> Any:
+    """Await ``call`` within the key's adaptive timeout and record how long it took.
+
+    A call that times out is recorded at the timeout: it took at least that long.
+    Without those samples a model that slowed down would keep timing out at the
+    same adaptive timeout and never raise it. Attempts cut short by ``deadline``
+    say nothing about the model and are not recorded.
+    """
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    timeout = _adaptive_timeout(latency_key)
+    clipped = deadline is not None and deadline - started < timeout
+    if clipped:
+        timeout = max(0.0, deadline - started)
+    try:
+        result = await asyncio.wait_for(call, timeout=timeout)
+    except TimeoutError:
+        if not clipped:
+            _classifier_latency.record(latency_key, timeout)
+        raise
+    _classifier_latency.record(latency_key, loop.time() - started)
+    return result
 
 
 class GuardrailsMiddleware(AgentMiddleware[GuardrailsState]):
@@ -102,14 +437,74 @@ class GuardrailsMiddleware(AgentMiddleware[GuardrailsState]):
 
     state_schema = GuardrailsState
 
+    local_classifier: LocalGuardrailsClassifier | None = None
+    speculative: bool = False
+    single_call: bool = False
+    cascade: bool = False
+    minimal_output: bool = False
+    reuse_verdicts: bool = False
+    batcher: GuardrailsMicroBatcher | None = None
+
     def __init__(
         self,
         model: str | None = None,
         fallback_model: str | None = None,
         block_off_topic: bool = True,
+        local_classifier_path: str | None = None,
+        speculative: bool | None = None,
+        single_call: bool | None = None,
+        micro_batch: bool | None = None,
+        cascade: bool | None = None,
+        minimal_output: bool | None = None,
+        reuse_verdicts: bool | None = None,
     ):
-        """Initialize guardrails with a primary classifier and fallback model."""
+        """Initialize guardrails with a primary classifier and fallback model.
+
+        When a local classifier artifact is available (``local_classifier_path``,
+        ``GUARDRAILS_LOCAL_CLASSIFIER_PATH`` or ``artifacts/guardrails_classifier.json``),
+        confident decisions are made locally and only uncertain queries reach the LLMs.
+
+        With ``speculative`` (default: ``GUARDRAILS_SPECULATIVE``), classification runs
+        concurrently with the first model call. That call's output, streamed tokens
+        included, is held until the verdict arrives and discarded if the query is
+        blocked.
+
+        With ``single_call`` (default: ``GUARDRAILS_SINGLE_CALL``), the classifier also
+        writes the rejection reply, so blocked turns need no second LLM call; a
+        per-category template is used when it does not.
+
+        With ``micro_batch`` (default: ``GUARDRAILS_MICRO_BATCH``), text-only
+        classifications arriving within a few milliseconds of each other share one
+        request to the primary model; failed batches fall back to single calls.
+
+        With ``cascade`` (default: ``GUARDRAILS_CASCADE``), a decision from the primary
+        (cheapest) model is only accepted when its confidence is at least
+        ``GUARDRAILS_CASCADE_MIN_CONFIDENCE``; less confident ones are escalated to the
+        next model, whose answer replaces it.
+
+        With ``minimal_output`` (default: ``GUARDRAILS_MINIMAL_OUTPUT``), the classifier
+        answers with a single word (its token logprob is used as the confidence where
+        the provider supports it). Explanations are generated in the background, and
+        only for blocked queries and dataset samples. Single-call mode takes precedence.
+
+        With ``reuse_verdicts`` (default: ``GUARDRAILS_REUSE_VERDICTS``), recent queries
+        and decisions are kept in state. Short text follow-ups in threads whose recent
+        turns were all ALLOWED skip the classifier unless they match a zero-tolerance
+        pattern, for at most ``GUARDRAILS_MAX_REUSED_TURNS`` turns in a row.
+        """
         super().__init__()
+        if _USE_LOCAL_PROMPTS:
+            logger.info(
+                "Using local guardrails prompt because USE_LOCAL_PROMPTS is enabled"
+            )
+        else:
+            # Served from the on-disk cache when present; refreshed in the background.
+            # The local prompt is used until the first fetch completes.
+            prompt_registry.prefetch([_GUARDRAILS_PROMPT_HUB_NAME])
+        # Pending verdicts keyed by the id of the human message being classified.
+        self._pending_verdicts: dict[str, asyncio.Task] = {}
+        # Lazy explanations still running off the request path.
+        self._background_tasks: set[asyncio.Task] = set()
         if model is None:
             from src.agent.config import DEFAULT_MODEL, GUARDRAILS_MODEL
 
@@ -120,64 +515,66 @@ class GuardrailsMiddleware(AgentMiddleware[GuardrailsState]):
 
             fallback_model = DEFAULT_MODEL.id
 
-        self.llm = init_chat_model(model=model, temperature=0)
+        from src.agent.config import get_chat_model
+
+        # Shared models, built with their provider packages on first classification.
+        self.llm = get_chat_model(model, temperature=0)
         self.classifier_llms = [(model, self.llm)]
         if fallback_model != model:
             self.classifier_llms.append(
-                (fallback_model, init_chat_model(model=fallback_model, temperature=0))
+                (fallback_model, get_chat_model(fallback_model, temperature=0))
             )
         self.block_off_topic = block_off_topic
+        self.local_classifier = load_local_classifier(local_classifier_path)
+        self.speculative = (
+            GUARDRAILS_SPECULATIVE if speculative is None else speculative
+        )
+        if self.speculative and StreamMessagesHandler is None:
+            logger.warning(
+                "Speculative guardrails need langgraph's messages stream handler, "
+                "which this langgraph version does not provide; classifying first"
+            )
+            self.speculative = False
+        self.single_call = (
+            GUARDRAILS_SINGLE_CALL if single_call is None else single_call
+        )
+        self.cascade = GUARDRAILS_CASCADE if cascade is None else cascade
+        self.minimal_output = (
+            GUARDRAILS_MINIMAL_OUTPUT if minimal_output is None else minimal_output
+        )
+        self.reuse_verdicts = (
+            GUARDRAILS_REUSE_VERDICTS if reuse_verdicts is None else reuse_verdicts
+        )
+        if GUARDRAILS_MICRO_BATCH if micro_batch is None else micro_batch:
+            self.batcher = GuardrailsMicroBatcher(
+                self._classify_batch,
+                max_batch_size=GUARDRAILS_BATCH_MAX_SIZE,
+                max_wait_seconds=GUARDRAILS_BATCH_MAX_WAIT_SECONDS,
+            )
         logger.info(
             "GuardrailsMiddleware initialized with model chain: %s",
             " -> ".join(model_name for model_name, _ in self.classifier_llms),
         )
 
-    async def _add_to_dataset(
-        self, query: str, result: str, explanation: str, preview: str
-    ) -> None:
-        """Add query to dataset asynchronously using AsyncClient."""
-        global _dataset_id_cache
-        try:
-            async with ls.AsyncClient() as client:
-                # Get or create dataset (cache the ID)
-                if _dataset_id_cache is None:
-                    try:
-                        dataset = await client.read_dataset(
-                            dataset_name=GUARDRAILS_DATASET_NAME
-                        )
-                        _dataset_id_cache = str(dataset.id)
-                    except Exception:
-                        dataset = await client.create_dataset(
-                            dataset_name=GUARDRAILS_DATASET_NAME,
-                            description="Production samples for guardrails evaluation. Contains all blocked queries and 10% of allowed queries.",
-                        )
-                        _dataset_id_cache = str(dataset.id)
-
-                await client.create_example(
-                    dataset_id=_dataset_id_cache,
-                    inputs={"query": query},
-                    outputs={
-                        "expected_result": result,
-                        "explanation": explanation,
-                    },
-                )
-                logger.debug(f"Added {result} query to dataset: {preview}...")
-        except Exception as e:
-            logger.warning(f"Failed to add query to dataset: {e}")
-
-    async def _generate_rejection_message(self, content) -> AIMessage:
+    async def _generate_rejection_message(
+        self, content, deadline: float | None = None
+    ) -> AIMessage:
         """Generate a friendly rejection message for off-topic queries."""
         prompt = [
             SystemMessage(content=_REJECTION_SYSTEM_PROMPT),
-            HumanMessage(
-                content=self._build_rejection_content(content)
-            ),
+            HumanMessage(content=self._build_rejection_content(content)),
         ]
 
+        latency_key = f"{self.classifier_llms[0][0]}#rejection"
+        if deadline is not None and deadline <= asyncio.get_running_loop().time():
+            logger.warning(
+                "Guardrails budget exhausted; using fallback rejection message"
+            )
+            return AIMessage(content=_FALLBACK_REJECTION_MESSAGE)
+
         try:
-            response = await asyncio.wait_for(
-                self.llm.ainvoke(prompt),
-                timeout=GUARDRAILS_TIMEOUT_SECONDS,
+            response = await _timed_call(
+                latency_key, self.llm.ainvoke(prompt), deadline
             )
             return AIMessage(id=response.id, content=response.content)
         except Exception as e:
@@ -193,6 +590,84 @@ class GuardrailsMiddleware(AgentMiddleware[GuardrailsState]):
         if not messages:
             return None
 
+        verdict_key = self._verdict_key(messages)
+        if self.speculative and verdict_key:
+            # The verdict is awaited by the first awrap_model_call of this run.
+            self._hold_verdict(
+                verdict_key, asyncio.create_task(self._evaluate_query(messages, state))
+            )
+            return None
+
+        return await self._evaluate_query(messages, state)
+
+    async def aafter_agent(
+        self, state: GuardrailsState, runtime: Runtime
+    ) -> dict[str, Any] | None:
+        """Drop a speculative verdict that no model call consumed."""
+        if not self.speculative:
+            return None
+
+        self._drop_verdict(self._verdict_key(state.get("messages", [])))
+        return None
+
+    async def awrap_model_call(
+        self,
+        request: ModelRequest,
+        handler: Callable[[ModelRequest], Awaitable[ModelResponse]],
+    ) -> ModelCallResult:
+        """Hold the first model call of a speculative run until the verdict arrives."""
+        if not self.speculative:
+            return await handler(request)
+
+        verdict = self._pending_verdicts.pop(
+            self._verdict_key(request.messages) or "", None
+        )
+        if verdict is None:
+            return await handler(request)
+
+        # Hold the speculative call's streamed tokens until the query is allowed.
+        config = ensure_config()
+        callbacks, held_streams = _holding_callbacks(config.get("callbacks"))
+        context = contextvars.copy_context()
+        context.run(var_child_runnable_config.set, {**config, "callbacks": callbacks})
+        speculative_call = asyncio.create_task(handler(request), context=context)
+
+        try:
+            update = await verdict
+        except BaseException:
+            verdict.cancel()
+            speculative_call.cancel()
+            raise
+
+        if update is None or not update.get("jump_to"):
+            for stream in held_streams:
+                stream.release()
+            response = await speculative_call
+            if update is None:
+                return response
+
+        state_update = {
+            key: value
+            for key, value in update.items()
+            if key not in ("messages", "jump_to")
+        }
+        if not update.get("jump_to"):
+            return ExtendedModelResponse(
+                model_response=response, command=Command(update=state_update)
+            )
+
+        speculative_call.cancel()
+        return ExtendedModelResponse(
+            model_response=ModelResponse(result=update["messages"]),
+            command=Command(update=state_update),
+        )
+
+    async def _evaluate_query(
+        self, messages: list, state: GuardrailsState | None = None
+    ) -> dict[str, Any] | None:
+        """Classify the latest query and return the guardrails state update."""
+        deadline = asyncio.get_running_loop().time() + GUARDRAILS_DEADLINE_SECONDS
+
         # Extract the current query for all checks below.
         last_message = messages[-1]
         last_content = (
@@ -208,33 +683,52 @@ class GuardrailsMiddleware(AgentMiddleware[GuardrailsState]):
         # social-pressure). The prompt's lenient follow-up rules keep legit
         # mid-conversation follow-ups ("show in Python", "3rd one") ALLOWED,
         # while zero-tolerance bullets override the default ALLOW.
-        try:
-            guardrails_decision = await self._classify_query(messages)
-        except GuardrailsClassificationError:
-            logger.error("Guardrails check failed after retries; allowing query.")
-            return {"off_topic_query": False}
+        # A local first stage answers confident cases without an LLM call.
+        guardrails_decision = self._classify_locally(last_message)
+        classifier = "local"
+        if guardrails_decision is None and self._can_reuse_verdict(last_message, state):
+            logger.info("Short follow-up in an allowed thread; reusing verdict")
+            self._track_decision_metadata(
+                {
+                    "decision": "ALLOWED",
+                    "explanation": "Short follow-up in a thread whose recent turns were allowed.",
+                },
+                "reused",
+            )
+            return self._conversation_update(last_message, state, None)
+
+        if guardrails_decision is None:
+            classifier = "llm"
+            prior_queries = (
+                (state or {}).get("guardrails_recent_queries")
+                if self.reuse_verdicts
+                else None
+            )
+            try:
+                guardrails_decision = await self._classify_query(
+                    messages, prior_queries, deadline=deadline
+                )
+            except GuardrailsClassificationError:
+                logger.error("Guardrails check failed after retries; allowing query.")
+                return {"off_topic_query": False}
 
         decision = guardrails_decision["decision"]
         explanation = guardrails_decision["explanation"]
 
         # Track in LangSmith metadata
-        self._track_decision_metadata(guardrails_decision)
-
-        # Sample to dataset for evaluation (100% blocked, 10% allowed)
-        if decision == "BLOCKED" or random.random() < ALLOWED_SAMPLE_RATE:
-            asyncio.create_task(
-                self._add_to_dataset(
-                    safe_last_content,
-                    decision,
-                    explanation,
-                    query_preview,
-                )
-            )
+        self._track_decision_metadata(guardrails_decision, classifier)
+
+        # Sample to dataset for evaluation (100% blocked, 1% allowed)
+        sampled = decision == "BLOCKED" or random.random() < ALLOWED_SAMPLE_RATE
+        if not explanation and sampled:
+            self._explain_later(safe_last_content, decision, classifier)
+        elif sampled:
+            _sample_writer.submit(safe_last_content, decision, explanation, classifier)
 
         # Handle allowed queries
         if decision == "ALLOWED":
             logger.info("Query validated: %s", explanation)
-            return None
+            return self._conversation_update(last_message, state, decision)
 
         # Handle blocked queries
         logger.warning(
@@ -247,16 +741,182 @@ class GuardrailsMiddleware(AgentMiddleware[GuardrailsState]):
             logger.info(
                 "Off-topic query detected but block_off_topic=False, allowing..."
             )
-            return None
+            return self._conversation_update(last_message, state, decision)
 
         # Generate rejection and block
-        off_topic_message = await self._generate_rejection_message(last_content)
+        off_topic_message = self._rejection_from_decision(guardrails_decision)
+        if off_topic_message is None:
+            off_topic_message = await self._generate_rejection_message(
+                last_content, deadline=deadline
+            )
         return {
+            **(self._conversation_update(last_message, state, decision) or {}),
             "messages": [off_topic_message],
             "off_topic_query": True,
             "jump_to": "end",
         }
 
+    def _can_reuse_verdict(self, message, state: GuardrailsState | None) -> bool:
+        """Return whether a short follow-up can reuse the thread's ALLOWED verdicts."""
+        if (
+            not self.reuse_verdicts
+            or not state
+            or not isinstance(message, HumanMessage)
+        ):
+            return False
+
+        decisions = state.get("guardrails_recent_decisions") or []
+        if not decisions or any(decision != "ALLOWED" for decision in decisions):
+            return False
+        if state.get("guardrails_reused_turns", 0) >= GUARDRAILS_MAX_REUSED_TURNS:
+            return False
+
+        content = getattr(message, "content", None)
+        query = self._extract_message_text(message)
+        return (
+            bool(query)
+            and len(query) <= GUARDRAILS_FOLLOW_UP_MAX_CHARS
+            and not self._content_has_media(content)
+            and _ZERO_TOLERANCE_RE.search(query) is None
+        )
+
+    def _conversation_update(
+        self, message, state: GuardrailsState | None, decision: str | None
+    ) -> dict[str, Any] | None:
+        """Return the rolling guardrails context after this turn.
+
+        ``decision`` is ``None`` when the verdict was reused without classifying.
+        """
+        if not self.reuse_verdicts:
+            return None
+
+        state = state or {}
+        queries = list(state.get("guardrails_recent_queries") or [])
+        query = (
+            self._extract_message_text(message)
+            if isinstance(message, HumanMessage)
+            else None
+        )
+        if query:
+            queries = [*queries, query[:200]][-GUARDRAILS_CONTEXT_TURNS:]
+
+        if decision is None:
+            return {
+                "guardrails_recent_queries": queries,
+                "guardrails_reused_turns": state.get("guardrails_reused_turns", 0) + 1,
+            }
+        return {
+            "guardrails_recent_queries": queries,
+            "guardrails_recent_decisions": [
+                *(state.get("guardrails_recent_decisions") or []),
+                decision,
+            ][-GUARDRAILS_CONTEXT_TURNS:],
+            "guardrails_reused_turns": 0,
+        }
+
+    def _explain_later(self, query: str, decision: str, classifier: str) -> None:
+        """Explain a minimal-output decision in the background, then record it.
+
+        The explanation is added to the run metadata if the run is still open and
+        always goes to the dataset sample. When the event loop cancels the task at
+        shutdown, the sample is still queued, without an explanation, and written
+        with the rest of the buffer.
+        """
+        run_tree = ls.get_current_run_tree()
+
+        async def explain() -> None:
+            try:
+                explanation = await self._generate_explanation(query, decision)
+            except asyncio.CancelledError:
+                _sample_writer.submit(
+                    query, decision, "", classifier, start_writer=False
+                )
+                raise
+            if run_tree is not None and run_tree.end_time is None:
+                run_tree.metadata["guardrails_explanation"] = explanation
+            _sample_writer.submit(query, decision, explanation, classifier)
+
+        task = asyncio.create_task(explain())
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+
+    async def aclose(self) -> None:
+        """Finish explanations still running, then flush their dataset samples."""
+        if self._background_tasks:
+            await asyncio.gather(*self._background_tasks, return_exceptions=True)
+        await _sample_writer.aclose()
+
+    async def _generate_explanation(self, query: str, decision: str) -> str:
+        """Return one sentence explaining ``decision``, or an empty string on failure."""
+        prompt = [
+            SystemMessage(content=_guardrails_system_prompt()),
+            HumanMessage(
+                content=(
+                    f"{_EXPLANATION_INSTRUCTION.format(decision=decision)}"
+                    f"\n\nUser query: {query}"
+                )
+            ),
+        ]
+        latency_key = f"{self.classifier_llms[0][0]}#explanation"
+        try:
+            response = await _timed_call(
+                latency_key,
+                self.llm.ainvoke(
+                    prompt, config={"callbacks": [], "tags": ["guardrails"]}
+                ),
+            )
+            return response.text.strip()
+        except Exception as e:
+            logger.warning(f"Failed to generate guardrails explanation: {e}")
+            return ""
+
+    def _rejection_from_decision(
+        self, decision: GuardrailsDecision
+    ) -> AIMessage | None:
+        """Return the single-call rejection reply, falling back to a category template."""
+        if not self.single_call:
+            return None
+
+        message = (decision.get("rejection_message") or "").strip()
+        if message:
+            return AIMessage(content=message)
+
+        category = decision.get("block_category") or "off_topic"
+        return AIMessage(
+            content=_REJECTION_TEMPLATES.get(category, _FALLBACK_REJECTION_MESSAGE)
+        )
+
+    def _verdict_key(self, messages: list) -> str | None:
+        """Return the key of the speculative verdict for a run over ``messages``."""
+        return getattr(self._last_human_message(messages), "id", None)
+
+    def _hold_verdict(self, key: str, task: asyncio.Task) -> None:
+        """Keep ``task`` for the run's first model call, replacing any earlier one.
+
+        A verdict no model call claims, because the run failed before reaching
+        the model, is cancelled and dropped after
+        ``GUARDRAILS_UNCLAIMED_VERDICT_SECONDS``.
+        """
+        self._drop_verdict(key)
+        self._pending_verdicts[key] = task
+        asyncio.get_running_loop().call_later(
+            GUARDRAILS_UNCLAIMED_VERDICT_SECONDS, self._drop_verdict, key, task
+        )
+
+    def _drop_verdict(self, key: str | None, task: asyncio.Task | None = None) -> None:
+        """Cancel and forget the pending verdict under ``key`` (only if it is ``task``)."""
+        pending = self._pending_verdicts.get(key or "")
+        if pending is not None and (task is None or pending is task):
+            del self._pending_verdicts[key]
+            pending.cancel()
+
+    def _last_human_message(self, messages: list) -> HumanMessage | None:
+        """Return the most recent human message, if any."""
+        for message in reversed(messages):
+            if isinstance(message, HumanMessage):
+                return message
+        return None
+
     def _content_to_safe_text(self, content) -> str:
         """Convert multimodal content to text without leaking encoded media."""
         if isinstance(content, str):
@@ -300,7 +960,7 @@ class GuardrailsMiddleware(AgentMiddleware[GuardrailsState]):
             if isinstance(block, str):
                 blocks.append({"type": "text", "text": block})
             elif isinstance(block, dict):
-                blocks.append(block)
+                blocks.append(downscale_image_block(block))
 
         blocks.append(
             {
@@ -325,12 +985,23 @@ class GuardrailsMiddleware(AgentMiddleware[GuardrailsState]):
 
     def _build_guardrails_content(self, content, context_section: str) -> str | list:
         """Build classifier input while preserving image blocks for vision models."""
+        if self.minimal_output and not self.single_call:
+            ask = _MINIMAL_OUTPUT_INSTRUCTION
+        elif self.cascade:
+            ask = (
+                "Return the decision, one concise sentence explaining why, and how "
+                "confident you are in it."
+            )
+        else:
+            ask = "Return the decision and one concise sentence explaining why."
         instruction = (
             "Classify this user query for the LangChain documentation assistant. "
-            "Consider both the text and any attached images. "
-            "Return both the decision and one concise sentence explaining why."
+            f"Consider both the text and any attached images. {ask}"
         )
 
+        if self.single_call:
+            instruction += _SINGLE_CALL_REJECTION_INSTRUCTION
+
         if context_section:
             instruction += context_section
 
@@ -367,9 +1038,34 @@ class GuardrailsMiddleware(AgentMiddleware[GuardrailsState]):
 
         return None
 
-    async def _classify_query(self, messages: list) -> GuardrailsDecision:
+    def _classify_locally(self, message) -> GuardrailsDecision | None:
+        """Return a confident local decision for a text-only human message, if any."""
+        if self.local_classifier is None or not isinstance(message, HumanMessage):
+            return None
+
+        content = getattr(message, "content", None)
+        if self._content_has_media(content):
+            return None
+
+        query = self._extract_message_text(message)
+        if not query:
+            return None
+
+        return self.local_classifier.classify(query)
+
+    async def _classify_query(
+        self,
+        messages: list,
+        prior_queries: list[str] | None = None,
+        deadline: float | None = None,
+    ) -> GuardrailsDecision:
         """Classify query as ALLOWED or BLOCKED.
 
+        ``prior_queries`` (oldest first) is the rolling context kept in state; the
+        previous human messages are scanned only when it is not available.
+        ``deadline`` (event loop time) bounds every call made for the query; it
+        defaults to ``GUARDRAILS_DEADLINE_SECONDS`` from now.
+
         Raises:
             GuardrailsClassificationError: If classification fails after retries.
         """
@@ -380,101 +1076,357 @@ class GuardrailsMiddleware(AgentMiddleware[GuardrailsState]):
             if isinstance(msg, HumanMessage):
                 current_message = msg
                 current_query = self._extract_message_text(msg)
-                if current_query or self._content_has_media(getattr(msg, "content", None)):
+                if current_query or self._content_has_media(
+                    getattr(msg, "content", None)
+                ):
                     break
 
         if current_message is None or (
             not current_query
             and not self._content_has_media(getattr(current_message, "content", None))
         ):
-            return {"decision": "ALLOWED", "explanation": "No human query was available to classify."}
+            return {
+                "decision": "ALLOWED",
+                "explanation": "No human query was available to classify.",
+            }
 
         # Build context from previous human messages (for follow-up detection)
-        prior_queries = []
-        for msg in reversed(messages[:-1]):  # Exclude current message
-            if isinstance(msg, HumanMessage):
-                text = self._extract_message_text(msg)
-                if text:
-                    prior_queries.append(text[:200])  # Truncate for brevity
-                    if len(prior_queries) == 3:
-                        break
+        if prior_queries is None:
+            prior_queries = []
+            for msg in reversed(messages[:-1]):  # Exclude current message
+                if isinstance(msg, HumanMessage):
+                    text = self._extract_message_text(msg)
+                    if text:
+                        prior_queries.append(text[:200])  # Truncate for brevity
+                        if len(prior_queries) == GUARDRAILS_CONTEXT_TURNS:
+                            break
+            prior_queries.reverse()  # Restore chronological order.
 
         # Build the classification prompt
         context_section = ""
         if prior_queries:
-            recent = list(reversed(prior_queries))  # Restore chronological order.
+            recent = prior_queries[-GUARDRAILS_CONTEXT_TURNS:]
             context_section = (
                 "\n\nPrevious questions in this conversation:\n"
                 + "\n".join(f"- {q}" for q in recent)
             )
 
-        current_content = getattr(current_message, "content", current_query or "")
-        prompt = [
-            SystemMessage(content=_GUARDRAILS_SYSTEM_PROMPT),
+        # Send smaller images, and skip ones already classified earlier in the thread.
+        current_content = prepare_guardrails_media(
+            getattr(current_message, "content", current_query or ""),
+            seen_image_fingerprints(
+                [
+                    msg
+                    for msg in messages
+                    if isinstance(msg, HumanMessage) and msg is not current_message
+                ]
+            ),
+        )
+        loop = asyncio.get_running_loop()
+        if deadline is None:
+            deadline = loop.time() + GUARDRAILS_DEADLINE_SECONDS
+        # Batch from the prepared content: it keeps the notes about omitted images,
+        # and may hold only those when every image was already reviewed.
+        batch_text = (
+            self._content_to_safe_text(current_content)
+            if self.batcher is not None and not self._content_has_media(current_content)
+            else ""
+        )
+        if batch_text:
+            try:
+                batched = await asyncio.wait_for(
+                    self.batcher.submit(
+                        f"{context_section.strip()}\n\nUser query: {batch_text}".strip()
+                    ),
+                    timeout=max(0.0, deadline - loop.time()),
+                )
+            except (GuardrailsBatchError, TimeoutError):
+                pass  # Classify on its own below, in whatever time is left.
+            else:
+                if not self._should_escalate(batched) or len(self.classifier_llms) < 2:
+                    return batched
+                # The batch already asked the primary model; escalate past it.
+                return await self._hedged_classification(
+                    self._guardrails_prompt(current_content, context_section),
+                    deadline,
+                    first_model=1,
+                    tentative=batched,
+                )
+
+        return await self._hedged_classification(
+            self._guardrails_prompt(current_content, context_section), deadline
+        )
+
+    def _guardrails_prompt(self, content, context_section: str) -> list:
+        """Return the classifier messages for one query."""
+        return [
+            SystemMessage(content=_guardrails_system_prompt()),
             HumanMessage(
-                content=self._build_guardrails_content(current_content, context_section)
+                content=self._build_guardrails_content(content, context_section)
             ),
         ]
 
+    async def _classify_batch(self, queries: list[str]) -> list[GuardrailsDecision]:
+        """Classify several independent text queries in one structured-output call.
+
+        Raises:
+            GuardrailsBatchError: If the response does not hold one decision per query.
+        """
+        instruction = (
+            f"Classify each of the {len(queries)} independent user queries below for "
+            "the LangChain documentation assistant. Judge every query on its own, "
+            "using only its own previous questions as context. Return exactly one "
+            "decision per query id, each with one concise sentence explaining why"
+            + (" and how confident you are." if self.cascade else ".")
+        )
+        if self.single_call:
+            instruction += _SINGLE_CALL_REJECTION_INSTRUCTION
+        items = "\n\n".join(
+            f'<query id="{index}">\n{query}\n</query>'
+            for index, query in enumerate(queries)
+        )
+        prompt = [
+            SystemMessage(content=_guardrails_system_prompt()),
+            HumanMessage(content=f"{instruction}\n\n{items}"),
+        ]
+
+        model_name, llm = self.classifier_llms[0]
+        latency_key = f"{model_name}#batch"
+        structured_llm = llm.with_structured_output(self._output_schema(batch=True))
+        result = await _timed_call(
+            latency_key,
+            structured_llm.ainvoke(
+                prompt,
+                config={"callbacks": [], "tags": ["guardrails", "guardrails_batch"]},
+            ),
+        )
+
+        by_id = {item["id"]: item for item in (result or {}).get("decisions", [])}
+        if set(by_id) != set(range(len(queries))):
+            raise GuardrailsBatchError(
+                f"decision ids {sorted(by_id)} do not match {len(queries)} queries"
+            )
+        return [
+            {key: value for key, value in by_id[index].items() if key != "id"}
+            for index in range(len(queries))
+        ]
+
+    async def _hedged_classification(
+        self,
+        prompt: list,
+        deadline: float,
+        first_model: int = 0,
+        tentative: GuardrailsDecision | None = None,
+    ) -> GuardrailsDecision:
+        """Race the classifier chain with hedged requests until ``deadline``.
+
+        The next model is started when the current one has not answered within its
+        hedge delay or has exhausted its retries. The first successful result wins
+        and every other in-flight request is cancelled. In cascade mode a
+        low-confidence result is kept as ``tentative`` while the next model is asked;
+        it is returned only if no later model answers.
+
+        Raises:
+            GuardrailsClassificationError: If every model fails or the deadline passes.
+        """
+        loop = asyncio.get_running_loop()
+        pending: dict[asyncio.Task, str] = {}
+        next_index = first_model
+        last_launch = loop.time()
         last_exception: Exception | None = None
 
-        for model_index, (model_name, llm) in enumerate(self.classifier_llms):
-            structured_llm = llm.with_structured_output(GuardrailsDecision)
+        def launch() -> None:
+            nonlocal next_index, last_launch
+            model_name, llm = self.classifier_llms[next_index]
+            next_index += 1
+            last_launch = loop.time()
+            task = asyncio.create_task(
+                self._classify_with_model(model_name, llm, prompt, deadline)
+            )
+            pending[task] = model_name
+
+        try:
+            while True:
+                if not pending:
+                    if next_index >= len(self.classifier_llms):
+                        break
+                    launch()
 
-            for attempt in range(GUARDRAILS_MAX_RETRIES + 1):
-                try:
-                    result: GuardrailsDecision = await asyncio.wait_for(
-                        structured_llm.ainvoke(
-                            prompt, config={"callbacks": [], "tags": ["guardrails"]}
-                        ),
-                        timeout=GUARDRAILS_TIMEOUT_SECONDS,
+                now = loop.time()
+                timeout = deadline - now
+                if timeout <= 0:
+                    last_exception = TimeoutError("guardrails deadline exceeded")
+                    break
+                can_hedge = next_index < len(self.classifier_llms)
+                if can_hedge:
+                    hedge_at = last_launch + self._hedge_delay(
+                        self.classifier_llms[next_index - 1][0]
                     )
-                    if model_index > 0:
-                        logger.info(
-                            "Guardrails classification succeeded with fallback model: %s",
-                            model_name,
-                        )
-                    return result
-                except Exception as e:
-                    last_exception = e
-                    if attempt < GUARDRAILS_MAX_RETRIES:
+                    timeout = min(timeout, max(0.0, hedge_at - now))
+
+                done, _ = await asyncio.wait(
+                    pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    if can_hedge and loop.time() < deadline:
                         logger.warning(
-                            "Guardrails classification failed with %s attempt %s/%s: %s. Retrying...",
-                            model_name,
-                            attempt + 1,
-                            GUARDRAILS_MAX_RETRIES + 1,
-                            e,
+                            "Guardrails classification with %s is slow; hedging to %s",
+                            self.classifier_llms[next_index - 1][0],
+                            self.classifier_llms[next_index][0],
                         )
-                        continue
+                        launch()
+                    continue
 
-                    if model_index < len(self.classifier_llms) - 1:
-                        next_model = self.classifier_llms[model_index + 1][0]
-                        logger.error(
-                            "Guardrails classification failed with %s after %s attempts: %s. Falling back to %s.",
+                for task in done:
+                    model_name = pending.pop(task)
+                    try:
+                        result = task.result()
+                    except Exception as e:
+                        last_exception = e
+                        continue
+                    if self._should_escalate(result) and (
+                        pending or next_index < len(self.classifier_llms)
+                    ):
+                        logger.info(
+                            "Guardrails classification with %s has confidence %.2f; "
+                            "escalating",
                             model_name,
-                            GUARDRAILS_MAX_RETRIES + 1,
-                            e,
-                            next_model,
+                            result.get("confidence"),
                         )
-                    else:
-                        logger.error(
-                            "Guardrails classification failed with %s after %s attempts: %s",
+                        tentative = result
+                        continue
+                    if model_name != self.classifier_llms[0][0]:
+                        logger.info(
+                            "Guardrails classification succeeded with fallback model: %s",
                             model_name,
-                            GUARDRAILS_MAX_RETRIES + 1,
-                            e,
                         )
+                    return result
+        finally:
+            for task in pending:
+                task.cancel()
 
+        if tentative is not None:
+            return tentative
         raise GuardrailsClassificationError(
             f"Guardrails classification failed after retries: {last_exception}"
         )
 
-    def _track_decision_metadata(self, decision: GuardrailsDecision) -> None:
+    def _parse_minimal_decision(self, response: AIMessage) -> GuardrailsDecision:
+        """Parse a single-word classifier reply, with its logprob as the confidence.
+
+        Raises:
+            ValueError: If the reply contains neither ALLOWED nor BLOCKED.
+        """
+        match = _MINIMAL_DECISION_RE.search(response.text.upper())
+        if match is None:
+            raise ValueError(f"Unexpected guardrails reply: {response.text[:50]!r}")
+
+        result: GuardrailsScoredDecision = {
+            "decision": match.group(1),
+            "explanation": "",
+        }
+        tokens = (response.response_metadata.get("logprobs") or {}).get("content") or []
+        if tokens and tokens[0].get("logprob") is not None:
+            result["confidence"] = round(math.exp(tokens[0]["logprob"]), 3)
+        return result
+
+    def _output_schema(self, batch: bool = False) -> type:
+        """Return the structured-output schema, with confidence only when cascading."""
+        single, batched = _OUTPUT_SCHEMAS[(self.single_call, self.cascade)]
+        return batched if batch else single
+
+    def _should_escalate(self, decision: GuardrailsDecision) -> bool:
+        """Return whether a cascade should ask the next model about ``decision``."""
+        if not self.cascade:
+            return False
+        confidence = decision.get("confidence")
+        # Decisions without a usable score are accepted as before.
+        if not isinstance(confidence, (int, float)):
+            return False
+        return confidence < GUARDRAILS_CASCADE_MIN_CONFIDENCE
+
+    def _hedge_delay(self, model_name: str) -> float:
+        """Return how long to wait on ``model_name`` before hedging to the next model."""
+        observed = _classifier_latency.percentile(
+            model_name, GUARDRAILS_HEDGE_PERCENTILE
+        )
+        delay = GUARDRAILS_HEDGE_DELAY_SECONDS if observed is None else observed
+        return min(
+            max(delay, GUARDRAILS_HEDGE_MIN_DELAY_SECONDS),
+            _adaptive_timeout(model_name),
+        )
+
+    async def _classify_with_model(
+        self, model_name: str, llm, prompt: list, deadline: float
+    ) -> GuardrailsDecision:
+        """Classify with one model, retrying within its attempt budget and the deadline."""
+        loop = asyncio.get_running_loop()
+        minimal = self.minimal_output and not self.single_call
+        if minimal:
+            classifier_llm = (
+                llm.bind(logprobs=True)
+                if model_name.startswith(_LOGPROB_MODEL_PREFIXES)
+                else llm
+            )
+        else:
+            classifier_llm = llm.with_structured_output(self._output_schema())
+
+        for attempt in range(GUARDRAILS_MAX_RETRIES + 1):
+            try:
+                result = await _timed_call(
+                    model_name,
+                    classifier_llm.ainvoke(
+                        prompt, config={"callbacks": [], "tags": ["guardrails"]}
+                    ),
+                    deadline,
+                )
+                if minimal:
+                    result = self._parse_minimal_decision(result)
+                return result
+            except Exception as e:
+                # A timeout means the model is slower than it normally is: fail over
+                # (the hedge starts the next model) rather than wait on it again.
+                if (
+                    attempt < GUARDRAILS_MAX_RETRIES
+                    and not isinstance(e, TimeoutError)
+                    and loop.time() < deadline
+                ):
+                    logger.warning(
+                        "Guardrails classification failed with %s attempt %s/%s: %s. Retrying...",
+                        model_name,
+                        attempt + 1,
+                        GUARDRAILS_MAX_RETRIES + 1,
+                        e,
+                    )
+                    continue
+
+                logger.error(
+                    "Guardrails classification failed with %s after %s attempts: %s",
+                    model_name,
+                    attempt + 1,
+                    e,
+                )
+                raise
+
+        raise GuardrailsClassificationError(
+            f"No classification attempts for {model_name}"
+        )
+
+    def _track_decision_metadata(
+        self, decision: GuardrailsDecision, classifier: str = "llm"
+    ) -> None:
         """Add guardrails decision to LangSmith run metadata."""
         try:
             run_tree = ls.get_current_run_tree()
             if run_tree:
                 run_tree.metadata["guardrails_result"] = decision["decision"]
                 run_tree.metadata["guardrails_explanation"] = decision["explanation"]
+                run_tree.metadata["guardrails_classifier"] = classifier
+                if decision.get("confidence") is not None:
+                    run_tree.metadata["guardrails_confidence"] = decision["confidence"]
+                category = decision.get("block_category")
+                if category and category != "none":
+                    run_tree.metadata["guardrails_block_category"] = category
         except Exception:
             pass  # Silently ignore if run tree is not available
 
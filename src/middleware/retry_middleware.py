@@ -1,4 +1,4 @@
-# Retry middleware for model calls with exponential backoff
+# Retry middleware for model calls, paced by the shared retry policy
 import asyncio
 import logging
 from typing import Awaitable, Callable
@@ -10,6 +10,8 @@ from langchain.agents.middleware.types import (
     ModelResponse,
 )
 
+from src.middleware.retry_policy import DEFAULT_RETRY_POLICY, RetryPolicy
+
 logger = logging.getLogger(__name__)
 
 # Finish reasons that indicate a retryable failure (not an exception)
@@ -28,13 +30,11 @@ class ModelRetryMiddleware(AgentMiddleware):
     def __init__(
         self,
         max_retries: int = 2,
-        initial_delay: float = 0.5,
-        backoff_factor: float = 2.0,
+        policy: RetryPolicy = DEFAULT_RETRY_POLICY,
     ):
         super().__init__()
         self.max_retries = max_retries
-        self.initial_delay = initial_delay
-        self.backoff_factor = backoff_factor
+        self.policy = policy
 
     def _get_finish_reason(self, response: ModelResponse) -> str:
         """Extract finish_reason from response metadata."""
@@ -47,50 +47,48 @@ class ModelRetryMiddleware(AgentMiddleware):
         handler: Callable[[ModelRequest], Awaitable[ModelResponse]],
     ) -> ModelCallResult:
         last_exception: Exception | None = None
-        last_retryable_reason: str | None = None
+        delay: float | None = None
 
         for attempt in range(self.max_retries + 1):
             try:
                 response = await handler(request)
-                finish_reason = self._get_finish_reason(response)
-
-                if finish_reason in RETRYABLE_FINISH_REASONS:
-                    if attempt < self.max_retries:
-                        delay = self.initial_delay * (self.backoff_factor**attempt)
-                        logger.warning(
-                            f"Retryable response ({finish_reason}) "
-                            f"attempt {attempt + 1}/{self.max_retries + 1}, "
-                            f"retrying in {delay:.2f}s"
-                        )
-                        last_retryable_reason = finish_reason
-                        await asyncio.sleep(delay)
-                        continue
-
-                return response
-
             except Exception as e:
                 last_exception = e
-                if attempt < self.max_retries:
-                    delay = self.initial_delay * (self.backoff_factor**attempt)
+                if (
+                    attempt < self.max_retries
+                    and (delay := self.policy.next_delay(delay, e)) is not None
+                ):
                     logger.warning(
                         f"Model call failed attempt {attempt + 1}/{self.max_retries + 1}: {e}, "
                         f"retrying in {delay:.2f}s"
                     )
                     await asyncio.sleep(delay)
-                else:
-                    logger.error(
-                        f"Model call failed after {self.max_retries + 1} attempts: {e}"
-                    )
+                    continue
+                logger.error(f"Model call failed after {attempt + 1} attempts: {e}")
+                break
+
+            last_exception = None
+            finish_reason = self._get_finish_reason(response)
+            if (
+                finish_reason in RETRYABLE_FINISH_REASONS
+                and attempt < self.max_retries
+                and (delay := self.policy.next_delay(delay)) is not None
+            ):
+                logger.warning(
+                    f"Retryable response ({finish_reason}) "
+                    f"attempt {attempt + 1}/{self.max_retries + 1}, "
+                    f"retrying in {delay:.2f}s"
+                )
+                await asyncio.sleep(delay)
+                continue
+
+            # A retryable response is still returned when no retry is left.
+            return response
 
         # Exhausted retries - raise for fallback middleware
         if last_exception:
             raise last_exception
 
-        if last_retryable_reason:
-            raise MalformedResponseError(
-                f"Model returned {last_retryable_reason} after {self.max_retries + 1} attempts"
-            )
-
         raise RuntimeError("Unexpected state in retry middleware")
 
 
@@ -0,0 +1,318 @@
+"""Shared retry engine for model calls, tool calls and the summary runnable.
+
+Every retry layer asks one ``RetryPolicy`` how long to wait before trying
+again. The policy uses decorrelated jitter, so concurrent runs that fail
+together do not retry in lockstep. It honours a provider's ``Retry-After``
+header, and gives up rather than wait when that header asks for longer than
+``max_retry_after``. Each retry also spends a token from a process-wide
+``RetryBudget``. During a provider brownout the bucket drains and further
+failures go straight to the caller's fallback instead of multiplying load.
+
+An ``AttemptBudget`` bounds one turn end to end. While one is active (see
+``attempt_scope``), every retry and fallback attempt from every layer counts
+against the turn's retry limit, and no attempt or retry wait may run past its
+deadline.
+The same budget is seen by retries, fallbacks and the summary runnable, so
+nested layers can no longer multiply retries or latency.
+"""
+
+import logging
+import random
+import threading
+import time
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from email.utils import parsedate_to_datetime
+from typing import Any
+
+from langchain_core.runnables.retry import RunnableRetry
+from tenacity import RetryCallState, retry_if_exception, retry_if_exception_type
+
+logger = logging.getLogger(__name__)
+
+
+class RetryBudget:
+    """Token bucket limiting how many retries the whole process may issue.
+
+    The bucket starts full with ``capacity`` tokens and refills at
+    ``refill_per_second``. First attempts are free; each retry takes one token.
+    """
+
+    def __init__(self, capacity: float = 20.0, refill_per_second: float = 1.0):
+        """Initialize a full bucket of ``capacity`` retry tokens."""
+        self.capacity = capacity
+        self.refill_per_second = refill_per_second
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def try_acquire(self) -> bool:
+        """Take one retry token, returning False when the budget is exhausted."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self.capacity,
+                self._tokens + (now - self._updated) * self.refill_per_second,
+            )
+            self._updated = now
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+
+def retry_after_seconds(error: BaseException | None) -> float | None:
+    """Return the delay a provider asked for via ``Retry-After``, if any.
+
+    Reads the HTTP response attached to SDK errors and accepts
+    ``retry-after-ms``, ``Retry-After`` in seconds, and ``Retry-After`` as an
+    HTTP date.
+    """
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    if not headers:
+        return None
+    try:
+        if (milliseconds := headers.get("retry-after-ms")) is not None:
+            return max(0.0, float(milliseconds) / 1000)
+        value = headers.get("retry-after")
+        if value is None:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class AttemptBudgetExceeded(Exception):
+    """Raised instead of starting a model attempt the turn has no budget for."""
+
+
+class AttemptBudget:
+    """Retry limit and wall-clock deadline shared by every layer of one turn.
+
+    Every model attempt is counted in ``attempts``, but only retries and
+    fallback attempts must start before the deadline and count against
+    ``max_retries``: the first attempt of a call always runs, so a long turn of
+    healthy model calls never runs out.
+    ``deadline`` is a Unix timestamp so it can be carried in graph state
+    between nodes; either limit may be None.
+    """
+
+    def __init__(
+        self,
+        deadline: float | None = None,
+        max_retries: int | None = None,
+        attempts: int = 0,
+        retries: int = 0,
+    ):
+        """Initialize a budget that has already used ``attempts`` and ``retries``."""
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.attempts = attempts
+        self.retries = retries
+        self._lock = threading.Lock()
+
+    def remaining_seconds(self) -> float | None:
+        """Seconds left before the deadline, or None without one."""
+        return None if self.deadline is None else self.deadline - time.time()
+
+    def _retries_exhausted(self) -> bool:
+        return self.max_retries is not None and self.retries >= self.max_retries
+
+    def allows(self, delay: float = 0.0) -> bool:
+        """Whether a retry may start after waiting ``delay`` seconds."""
+        if self._retries_exhausted():
+            return False
+        remaining = self.remaining_seconds()
+        return remaining is None or remaining > delay
+
+    def spend_retry(self) -> None:
+        """Count one retry against the turn's retry limit."""
+        with self._lock:
+            self.retries += 1
+
+    def start_attempt(self, fallback: bool = False) -> None:
+        """Count one model attempt, or raise if the turn has no budget for it.
+
+        Only a ``fallback`` attempt can be refused; it also takes one of the
+        turn's retries.
+        """
+        with self._lock:
+            if fallback:
+                remaining = self.remaining_seconds()
+                if remaining is not None and remaining <= 0:
+                    raise AttemptBudgetExceeded(
+                        f"Turn deadline passed after {self.attempts} model attempts"
+                    )
+                if self._retries_exhausted():
+                    raise AttemptBudgetExceeded(
+                        f"Turn retry budget exhausted after {self.retries} retries"
+                    )
+                self.retries += 1
+            self.attempts += 1
+
+
+_current_budget: ContextVar[AttemptBudget | None] = ContextVar(
+    "attempt_budget", default=None
+)
+
+
+@contextmanager
+def attempt_scope(budget: AttemptBudget | None) -> Iterator[AttemptBudget | None]:
+    """Make ``budget`` the active attempt budget (None for none) within the block."""
+    token = _current_budget.set(budget)
+    try:
+        yield budget
+    finally:
+        _current_budget.reset(token)
+
+
+def current_attempt_budget() -> AttemptBudget | None:
+    """Return the attempt budget of the running turn, if any."""
+    return _current_budget.get()
+
+
+def start_model_attempt(fallback: bool = False) -> None:
+    """Count a model attempt against the running turn's budget, if there is one."""
+    if (budget := _current_budget.get()) is not None:
+        budget.start_attempt(fallback=fallback)
+
+
+class RetryPolicy:
+    """Backoff and budget rules shared by every retry layer."""
+
+    def __init__(
+        self,
+        base_delay: float = 0.5,
+        max_delay: float = 8.0,
+        max_retry_after: float = 30.0,
+        budget: RetryBudget | None = None,
+    ):
+        """Initialize the policy; without ``budget`` it gets a bucket of its own."""
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_retry_after = max_retry_after
+        self.budget = budget or RetryBudget()
+
+    def allow_retry(self, error: BaseException | None = None) -> bool:
+        """Whether one more attempt may be made, spending a budget token if so."""
+        retry_after = retry_after_seconds(error)
+        if retry_after is not None and retry_after > self.max_retry_after:
+            logger.warning(f"Not retrying: provider asked to wait {retry_after:.1f}s")
+            return False
+        turn = current_attempt_budget()
+        if turn is not None and not turn.allows(retry_after or self.base_delay):
+            logger.warning("Not retrying: turn retry budget or deadline reached")
+            return False
+        if not self.budget.try_acquire():
+            logger.warning("Not retrying: process retry budget exhausted")
+            return False
+        if turn is not None:
+            turn.spend_retry()
+        return True
+
+    def delay(
+        self, previous_delay: float | None, error: BaseException | None = None
+    ) -> float:
+        """Return the next sleep: decorrelated jitter, at least any ``Retry-After``."""
+        upper = max(self.base_delay, (previous_delay or self.base_delay) * 3)
+        delay = min(self.max_delay, random.uniform(self.base_delay, upper))
+        delay = max(delay, retry_after_seconds(error) or 0.0)
+        turn = current_attempt_budget()
+        if turn is not None and (remaining := turn.remaining_seconds()) is not None:
+            # Never sleep past the turn deadline.
+            delay = max(0.0, min(delay, remaining))
+        return delay
+
+    def next_delay(
+        self, previous_delay: float | None, error: BaseException | None = None
+    ) -> float | None:
+        """Return how long to wait before retrying, or None to stop retrying now."""
+        if not self.allow_retry(error):
+            return None
+        return self.delay(previous_delay, error)
+
+    def runnable_retry(
+        self,
+        bound: Any,
+        max_attempts: int,
+        retry_on: tuple[type[BaseException], ...] | Callable[[BaseException], bool] = (
+            Exception,
+        ),
+        fallback: bool = False,
+    ) -> "PolicyRetry":
+        """Wrap a runnable so its retries follow this policy.
+
+        Each attempt must start within the turn's deadline and each retry takes
+        one of the turn's retries. A ``fallback`` runnable only runs after
+        another model failed, so its first attempt takes one as well.
+        """
+        return PolicyRetry(
+            bound=bound,
+            policy=self,
+            max_attempt_number=max_attempts,
+            retry_exception_types=retry_on,
+            fallback=fallback,
+        )
+
+
+class PolicyRetry(RunnableRetry):
+    """``RunnableRetry`` whose waits and stop condition come from a ``RetryPolicy``."""
+
+    policy: RetryPolicy
+    fallback: bool = False
+
+    @property
+    def _kwargs_retrying(self) -> dict[str, Any]:
+        def stop(retry_state: RetryCallState) -> bool:
+            if retry_state.attempt_number >= self.max_attempt_number:
+                return True
+            return not self.policy.allow_retry(_exception(retry_state))
+
+        def wait(retry_state: RetryCallState) -> float:
+            # Still holds the previous wait: tenacity only overwrites it with ours.
+            previous = retry_state.upcoming_sleep or None
+            return self.policy.delay(previous, _exception(retry_state))
+
+        def before(retry_state: RetryCallState) -> None:
+            # Retries were already counted when ``stop`` allowed them.
+            start_model_attempt(
+                fallback=self.fallback and retry_state.attempt_number == 1
+            )
+
+        kwargs: dict[str, Any] = {"stop": stop, "wait": wait, "before": before}
+        if callable(self.retry_exception_types):
+            kwargs["retry"] = retry_if_exception(self.retry_exception_types)
+        else:
+            kwargs["retry"] = retry_if_exception_type(self.retry_exception_types)
+        return kwargs
+
+
+def _exception(retry_state: RetryCallState) -> BaseException | None:
+    """Return the exception raised by the latest attempt, if it failed."""
+    outcome = retry_state.outcome
+    return outcome.exception() if outcome is not None and outcome.failed else None
+
+
+#: Retry tokens shared by every layer in this process.
+RETRY_BUDGET = RetryBudget()
+#: Policy used by the model and tool retry middleware and the summary runnable.
+DEFAULT_RETRY_POLICY = RetryPolicy(budget=RETRY_BUDGET)
+
+
+__all__ = [
+    "AttemptBudget",
+    "AttemptBudgetExceeded",
+    "DEFAULT_RETRY_POLICY",
+    "PolicyRetry",
+    "RETRY_BUDGET",
+    "RetryBudget",
+    "RetryPolicy",
+    "attempt_scope",
+    "current_attempt_budget",
+    "retry_after_seconds",
+    "start_model_attempt",
+]
@@ -1,20 +1,517 @@
-"""Summarization middleware with shared model retry and fallback behavior."""
+"""Summarization middleware with shared model retry and fallback behavior.
 
-from typing import Any
+When an ``incremental_summary_prompt`` is configured, the summary written at the
+previous compaction is kept as a first-class artifact (the leading summary
+message and the ``conversation_summary`` state key). Later compactions fold only
+the messages evicted since then into it, so the work per compaction is
+proportional to the new history rather than to the whole conversation.
+
+With ``presummarize_tokens`` set, the prefix that the next compaction will evict
+is summarized in the background once the history passes that soft threshold,
+both during a turn and after it ends. The result is stored in state
+(``presummary``) and applied when the hard trigger fires, so the user's turn
+does not wait for a full summary-model call.
+
+With ``compact_tool_outputs``, each compaction first replaces older results of
+re-fetchable tools with reference stubs (see ``tool_output_compaction``) and
+only calls the summary model if the history is still over the trigger.
+
+With ``map_reduce_chunk_tokens``, histories larger than
+``map_reduce_min_tokens`` are split into chunks on message boundaries, the chunks are summarized concurrently and a final call
+merges the partial summaries (and any previous summary) into one.
+
+With a ``summary_cache``, summaries are reused when the same messages are
+summarized onto the same previous summary with the same prompts by the same
+actor, as happens after a regenerate or a fork.
+
+Summary calls made for a turn count against that turn's attempt budget (see
+``turn_budget_middleware``); background pre-summaries do not.
+"""
+
+import asyncio
+import logging
+from collections.abc import Callable
+from functools import partial
+from typing import Any, NamedTuple
 
 from langchain.agents.middleware import SummarizationMiddleware
-from langchain_core.messages import AnyMessage
+from langchain.agents.middleware.types import AgentState
+from langchain_core.messages import (
+    AIMessage,
+    AnyMessage,
+    HumanMessage,
+    RemoveMessage,
+    ToolMessage,
+)
 from langchain_core.messages.utils import get_buffer_string
 from langchain_core.runnables import Runnable
+from langgraph.graph.message import REMOVE_ALL_MESSAGES
+from langgraph.runtime import Runtime
+from typing_extensions import NotRequired
+
+from src.middleware.retry_policy import AttemptBudget, attempt_scope
+from src.middleware.tool_dedupe_middleware import inline_references
+from src.middleware.tool_output_compaction import (
+    compact_tool_messages,
+    compacted_since,
+)
+from src.middleware.turn_budget_middleware import (
+    attempt_budget_from_state,
+    budget_usage,
+)
+from src.utils.summary_cache import SummaryCache, current_actor, prompt_version
+from src.utils.token_estimation import TokenEstimator
+
+logger = logging.getLogger(__name__)
+
+_SUMMARY_MESSAGE_PREFIX = "Here is a summary of the conversation to date:\n\n"
+#: In-flight or unclaimed background summaries kept per process.
+_MAX_PRESUMMARY_TASKS = 256
+
+
+class ContextBudget(NamedTuple):
+    """Summarization thresholds, in tokens, for the model serving a conversation."""
+
+    trigger_tokens: int
+    keep_tokens: int
+    presummarize_tokens: int | None = None
+
+
+class SummarizationState(AgentState):
+    """Extended state schema with the running conversation summary."""
+
+    conversation_summary: NotRequired[str]
+    presummary: NotRequired[str | None]
+    presummary_through: NotRequired[str | None]
 
 
 class CustomSummarizationMiddleware(SummarizationMiddleware):
     """Use a custom runnable for summary generation."""
 
-    def __init__(self, *args: Any, summary_model: Runnable, **kwargs: Any) -> None:
-        """Initialize the middleware with a separate summary-generation runnable."""
+    state_schema = SummarizationState
+
+    def __init__(
+        self,
+        *args: Any,
+        summary_model: Runnable,
+        incremental_summary_prompt: str | None = None,
+        presummarize_tokens: int | None = None,
+        compact_tool_outputs: bool = False,
+        map_reduce_chunk_tokens: int | None = None,
+        map_reduce_concurrency: int = 4,
+        map_reduce_min_tokens: int | None = None,
+        merge_summary_prompt: str | None = None,
+        context_budget: Callable[[str | None], ContextBudget] | None = None,
+        summary_cache: SummaryCache | None = None,
+        **kwargs: Any,
+    ) -> None:
+        """Initialize the middleware with a separate summary-generation runnable.
+
+        ``incremental_summary_prompt`` takes ``{summary}`` and ``{messages}``
+        placeholders. Without it every compaction re-summarizes its whole prefix.
+        ``presummarize_tokens`` is the soft threshold above which the next
+        compaction is prepared in the background; None disables it.
+        ``compact_tool_outputs`` replaces older re-fetchable tool results with
+        reference stubs first, and skips the summary call when that is enough.
+        ``map_reduce_chunk_tokens`` splits histories larger than that into chunks
+        summarized ``map_reduce_concurrency`` at a time, then merged with
+        ``merge_summary_prompt`` (a ``{summaries}`` placeholder). Smaller
+        histories than ``map_reduce_min_tokens`` (default: one chunk) get a
+        single call, which beats a few chunk calls plus a sequential merge.
+        ``context_budget`` maps the ``model_name`` of the latest AI message (the
+        model actually serving the thread, fallbacks included) to thresholds
+        that replace ``trigger``, ``keep`` and ``presummarize_tokens``.
+        ``summary_cache`` reuses summaries of identical message ranges.
+        """
+        if map_reduce_chunk_tokens is not None and merge_summary_prompt is None:
+            msg = (
+                "merge_summary_prompt is required when map_reduce_chunk_tokens is set."
+            )
+            raise ValueError(msg)
         super().__init__(*args, **kwargs)
         self.summary_model = summary_model
+        if isinstance(self.token_counter, TokenEstimator):
+            # Keep-window search counts suffixes without usage scaling, as upstream.
+            self._partial_token_counter = partial(
+                self.token_counter, use_usage_metadata_scaling=False
+            )
+        self.incremental_summary_prompt = incremental_summary_prompt
+        self.presummarize_tokens = presummarize_tokens
+        self.compact_tool_outputs = compact_tool_outputs
+        self.map_reduce_chunk_tokens = map_reduce_chunk_tokens
+        self.map_reduce_concurrency = map_reduce_concurrency
+        self.map_reduce_min_tokens = map_reduce_min_tokens
+        self.merge_summary_prompt = merge_summary_prompt
+        self.context_budget = context_budget
+        self.summary_cache = summary_cache
+        self._prompt_version = prompt_version(
+            self.summary_prompt,
+            incremental_summary_prompt,
+            merge_summary_prompt,
+            str(map_reduce_chunk_tokens),
+        )
+        # Background summaries keyed by the id of the last message they cover.
+        self._presummary_tasks: dict[str, asyncio.Task] = {}
+
+    def before_model(
+        self, state: SummarizationState, runtime: Runtime
+    ) -> dict[str, Any] | None:
+        """Summarize evicted messages within the turn's attempt budget."""
+        budget = attempt_budget_from_state(state)
+        with attempt_scope(budget):
+            update = self._summarize(state)
+        return _with_attempts(update, budget, state)
+
+    async def abefore_model(
+        self, state: SummarizationState, runtime: Runtime
+    ) -> dict[str, Any] | None:
+        """Summarize evicted messages within the turn's attempt budget."""
+        budget = attempt_budget_from_state(state)
+        with attempt_scope(budget):
+            update = await self._asummarize(state)
+        return _with_attempts(update, budget, state)
+
+    def _summarize(self, state: SummarizationState) -> dict[str, Any] | None:
+        """Summarize evicted messages, folding them into the previous summary."""
+        messages = state["messages"]
+        self._ensure_message_ids(messages)
+
+        if not self._should_summarize(messages, self._total_tokens(messages)):
+            return None
+
+        cutoff_index = self._determine_cutoff_index(messages)
+        if cutoff_index <= 0:
+            return None
+
+        messages, stubs = self._compact_tool_outputs(messages, cutoff_index)
+        if stubs and not self._should_summarize(messages, self._total_tokens(messages)):
+            return {"messages": stubs}
+
+        previous_summary, evicted = self._split_previous_summary(
+            state, messages[:cutoff_index]
+        )
+        if previous_summary is not None:
+            summary = self._update_summary(previous_summary, evicted)
+        else:
+            summary = self._create_summary(evicted)
+        return self._summary_update(summary, messages, cutoff_index)
+
+    async def _asummarize(self, state: SummarizationState) -> dict[str, Any] | None:
+        """Summarize evicted messages, reusing a background summary when one is ready."""
+        messages = state["messages"]
+        self._ensure_message_ids(messages)
+
+        total_tokens = self._total_tokens(messages)
+        if not self._should_summarize(messages, total_tokens):
+            return self._maybe_presummarize(state, messages, total_tokens)
+
+        cutoff_index = self._determine_cutoff_index(messages)
+        if cutoff_index <= 0:
+            return None
+
+        messages, stubs = self._compact_tool_outputs(messages, cutoff_index)
+        if stubs and not self._should_summarize(messages, self._total_tokens(messages)):
+            return {"messages": stubs}
+
+        presummary = await self._claim_presummary(state, messages)
+        if presummary is not None:
+            summary, through = presummary
+            if through + 1 >= cutoff_index or not self.incremental_summary_prompt:
+                # Evict exactly what the background summary covers.
+                return self._summary_update(summary, messages, through + 1)
+            summary = await self._aupdate_summary(
+                summary, messages[through + 1 : cutoff_index]
+            )
+            return self._summary_update(summary, messages, cutoff_index)
+
+        previous_summary, evicted = self._split_previous_summary(
+            state, messages[:cutoff_index]
+        )
+        if previous_summary is not None:
+            summary = await self._aupdate_summary(previous_summary, evicted)
+        else:
+            summary = await self._acreate_summary(evicted)
+        return self._summary_update(summary, messages, cutoff_index)
+
+    async def aafter_agent(
+        self, state: SummarizationState, runtime: Runtime
+    ) -> dict[str, Any] | None:
+        """Prepare the next compaction while the user reads the answer."""
+        if self.presummarize_tokens is None:
+            return None
+
+        messages = state["messages"]
+        self._ensure_message_ids(messages)
+        return self._maybe_presummarize(state, messages, self._total_tokens(messages))
+
+    def _compact_tool_outputs(
+        self, messages: list[AnyMessage], cutoff_index: int
+    ) -> tuple[list[AnyMessage], list[ToolMessage]]:
+        """Stub re-fetchable tool results before the cutoff, when enabled.
+
+        Returns the history with the stubs in place and the stubs themselves.
+        Dedupe references to a compacted result get the stub too.
+        """
+        if not self.compact_tool_outputs:
+            return messages, []
+
+        stubs = compact_tool_messages(messages, cutoff_index)
+        if not stubs:
+            return messages, []
+        stubs += inline_references(messages, stubs)
+        by_id = {stub.id: stub for stub in stubs}
+        return [by_id.get(message.id, message) for message in messages], stubs
+
+    def _budget(self, messages: list[AnyMessage]) -> ContextBudget | None:
+        """Return the thresholds for the model that produced the latest AI message."""
+        if self.context_budget is None:
+            return None
+        last_ai_message = next(
+            (
+                message
+                for message in reversed(messages)
+                if isinstance(message, AIMessage)
+            ),
+            None,
+        )
+        model_name = (
+            last_ai_message.response_metadata.get("model_name")
+            if last_ai_message
+            else None
+        )
+        return self.context_budget(model_name)
+
+    def _should_summarize(self, messages: list[AnyMessage], total_tokens: int) -> bool:
+        """Apply the active model's trigger when budgets are configured."""
+        budget = self._budget(messages)
+        if budget is None:
+            return super()._should_summarize(messages, total_tokens)
+        return total_tokens >= budget.trigger_tokens or (
+            self._should_summarize_based_on_reported_tokens(
+                messages, float(budget.trigger_tokens)
+            )
+        )
+
+    def _determine_cutoff_index(self, messages: list[AnyMessage]) -> int:
+        """Keep the active model's keep window when budgets are configured."""
+        budget = self._budget(messages)
+        if budget is None:
+            return super()._determine_cutoff_index(messages)
+        return self._token_cutoff(messages, budget.keep_tokens)
+
+    def _token_cutoff(self, messages: list[AnyMessage], keep_tokens: int) -> int:
+        """Return the earliest safe cutoff whose suffix fits in ``keep_tokens``.
+
+        Same search as ``_find_token_based_cutoff``, with the target passed in.
+        """
+        if not messages or self.token_counter(messages) <= keep_tokens:
+            return 0
+
+        left, right = 0, len(messages)
+        while left < right:
+            mid = (left + right) // 2
+            if self._partial_token_counter(messages[mid:]) <= keep_tokens:
+                right = mid
+            else:
+                left = mid + 1
+
+        cutoff = min(left, len(messages) - 1)
+        return self._find_safe_cutoff_point(messages, cutoff)
+
+    def _should_summarize_based_on_reported_tokens(
+        self, messages: list[AnyMessage], threshold: float
+    ) -> bool:
+        """Ignore reported usage that predates the latest tool-output compaction."""
+        if not super()._should_summarize_based_on_reported_tokens(messages, threshold):
+            return False
+        last_ai_message = next(
+            message for message in reversed(messages) if isinstance(message, AIMessage)
+        )
+        return not compacted_since(messages, last_ai_message.id)
+
+    def _total_tokens(self, messages: list[AnyMessage]) -> int:
+        """Count the history plus the system prompt and tool schemas sent with it."""
+        return self.token_counter(messages) + getattr(
+            self.token_counter, "static_tokens", 0
+        )
+
+    def _split_previous_summary(
+        self, state: SummarizationState, to_summarize: list[AnyMessage]
+    ) -> tuple[str | None, list[AnyMessage]]:
+        """Split a leading summary message off the prefix when updating incrementally.
+
+        Without an incremental prompt the summary message is summarized with the rest.
+        """
+        if self.incremental_summary_prompt and _is_summary_message(to_summarize[0]):
+            previous_summary = state.get("conversation_summary") or _summary_text(
+                to_summarize[0]
+            )
+            return previous_summary, to_summarize[1:]
+        return None, to_summarize
+
+    def _maybe_presummarize(
+        self,
+        state: SummarizationState,
+        messages: list[AnyMessage],
+        total_tokens: int,
+    ) -> dict[str, Any] | None:
+        """Store a finished background summary and start the next one when due.
+
+        A new background summary covers the prefix the next compaction would
+        evict, built on the latest stored one. Only one runs per conversation.
+        """
+        if self.presummarize_tokens is None:
+            return None
+        budget = self._budget(messages)
+        soft_threshold = (
+            budget.presummarize_tokens
+            if budget is not None and budget.presummarize_tokens is not None
+            else self.presummarize_tokens
+        )
+        if total_tokens < soft_threshold:
+            return None
+
+        positions = {message.id: index for index, message in enumerate(messages)}
+        update = None
+        running = False
+        best = self._stored_presummary(state, positions)
+        for through_id, task in list(self._presummary_tasks.items()):
+            if through_id not in positions:
+                continue
+            if not task.done():
+                running = True
+                continue
+            del self._presummary_tasks[through_id]
+            summary = _task_summary(task)
+            if summary is not None and (
+                best is None or positions[through_id] > best[1]
+            ):
+                best = (summary, positions[through_id])
+                update = {"presummary": summary, "presummary_through": through_id}
+
+        cutoff_index = self._determine_cutoff_index(messages)
+        if (
+            running
+            or cutoff_index <= 0
+            or (best is not None and best[1] >= cutoff_index - 1)
+        ):
+            return update
+
+        if best is not None and self.incremental_summary_prompt:
+            previous_summary = best[0]
+            evicted = messages[best[1] + 1 : cutoff_index]
+        else:
+            previous_summary, evicted = self._split_previous_summary(
+                state, messages[:cutoff_index]
+            )
+        self._start_presummary(messages[cutoff_index - 1].id, previous_summary, evicted)
+        return update
+
+    async def _claim_presummary(
+        self, state: SummarizationState, messages: list[AnyMessage]
+    ) -> tuple[str, int] | None:
+        """Return the most complete background summary of a prefix of ``messages``.
+
+        Returns ``(summary, index of the last covered message)``. A background
+        summary still running for this conversation is awaited, since it started
+        earlier than a summary call made now would.
+        """
+        positions = {message.id: index for index, message in enumerate(messages)}
+        best = self._stored_presummary(state, positions)
+        for through_id in [tid for tid in self._presummary_tasks if tid in positions]:
+            task = self._presummary_tasks.pop(through_id)
+            await asyncio.wait([task])
+            summary = _task_summary(task)
+            if summary is not None and (
+                best is None or positions[through_id] > best[1]
+            ):
+                best = (summary, positions[through_id])
+        return best
+
+    @staticmethod
+    def _stored_presummary(
+        state: SummarizationState, positions: dict[str, int]
+    ) -> tuple[str, int] | None:
+        """Return the background summary stored in state if it covers current messages."""
+        summary = state.get("presummary")
+        through_id = state.get("presummary_through")
+        if summary and through_id in positions:
+            return summary, positions[through_id]
+        return None
+
+    def _start_presummary(
+        self,
+        through_id: str,
+        previous_summary: str | None,
+        evicted: list[AnyMessage],
+    ) -> None:
+        """Summarize ``evicted`` in the background under ``through_id``."""
+        try:
+            # Background work is not charged to the current turn's budget.
+            with attempt_scope(None):
+                task = asyncio.get_running_loop().create_task(
+                    self._apresummarize(previous_summary, evicted)
+                )
+        except RuntimeError:
+            return
+        self._presummary_tasks[through_id] = task
+        if len(self._presummary_tasks) > _MAX_PRESUMMARY_TASKS:
+            oldest = next(iter(self._presummary_tasks))
+            self._presummary_tasks.pop(oldest).cancel()
+
+    async def _apresummarize(
+        self, previous_summary: str | None, evicted: list[AnyMessage]
+    ) -> str:
+        """Summarize like a compaction, but raise instead of returning an error text."""
+        trimmed_messages = self._trim_messages_for_summary(evicted)
+        if previous_summary is not None:
+            prompt = self._incremental_prompt(previous_summary, evicted)
+            if prompt is None:
+                return previous_summary
+        else:
+            if not trimmed_messages:
+                msg = "Nothing to summarize ahead of compaction."
+                raise ValueError(msg)
+            prompt = self.summary_prompt.format(
+                messages=get_buffer_string(trimmed_messages)
+            ).rstrip()
+
+        key = self._summary_key(previous_summary, trimmed_messages)
+        if (cached := self._cached_summary(key)) is not None:
+            return cached
+        if chunks := self._map_reduce_chunks(trimmed_messages):
+            summary = await self._amap_reduce_summary(previous_summary, chunks)
+        else:
+            response = await self.summary_model.ainvoke(
+                prompt, config={"metadata": {"lc_source": "summarization"}}
+            )
+            summary = response.text.strip()
+        return self._store_summary(key, summary)
+
+    def _summary_update(
+        self, summary: str, messages: list[AnyMessage], keep_from: int
+    ) -> dict[str, Any]:
+        """Replace the history with the summary message and ``messages[keep_from:]``.
+
+        Dedupe references to evicted results are replaced by the results themselves.
+        """
+        preserved = messages[keep_from:]
+        inlined = {
+            message.id: message
+            for message in inline_references(preserved, messages[:keep_from])
+        }
+        if inlined:
+            preserved = [inlined.get(message.id, message) for message in preserved]
+        return {
+            "messages": [
+                RemoveMessage(id=REMOVE_ALL_MESSAGES),
+                *self._build_new_messages(summary),
+                *preserved,
+            ],
+            "conversation_summary": summary,
+            "presummary": None,
+            "presummary_through": None,
+        }
 
     def _create_summary(self, messages_to_summarize: list[AnyMessage]) -> str:
         """Generate a summary using the configured retry/fallback summary model."""
@@ -25,16 +522,23 @@ class CustomSummarizationMiddleware(SummarizationMiddleware):
         if not trimmed_messages:
             return "Previous conversation was too long to summarize."
 
+        key = self._summary_key(None, trimmed_messages)
+        if (cached := self._cached_summary(key)) is not None:
+            return cached
         formatted_messages = get_buffer_string(trimmed_messages)
 
         try:
-            response = self.summary_model.invoke(
-                self.summary_prompt.format(messages=formatted_messages).rstrip(),
-                config={"metadata": {"lc_source": "summarization"}},
-            )
-            return response.text.strip()
+            if chunks := self._map_reduce_chunks(trimmed_messages):
+                summary = self._map_reduce_summary(None, chunks)
+            else:
+                response = self.summary_model.invoke(
+                    self.summary_prompt.format(messages=formatted_messages).rstrip(),
+                    config={"metadata": {"lc_source": "summarization"}},
+                )
+                summary = response.text.strip()
         except Exception as e:
             return f"Error generating summary: {e!s}"
+        return self._store_summary(key, summary)
 
     async def _acreate_summary(self, messages_to_summarize: list[AnyMessage]) -> str:
         """Generate a summary using the configured retry/fallback summary model."""
@@ -45,16 +549,227 @@ class CustomSummarizationMiddleware(SummarizationMiddleware):
         if not trimmed_messages:
             return "Previous conversation was too long to summarize."
 
+        key = self._summary_key(None, trimmed_messages)
+        if (cached := self._cached_summary(key)) is not None:
+            return cached
         formatted_messages = get_buffer_string(trimmed_messages)
 
         try:
-            response = await self.summary_model.ainvoke(
-                self.summary_prompt.format(messages=formatted_messages).rstrip(),
-                config={"metadata": {"lc_source": "summarization"}},
-            )
-            return response.text.strip()
+            if chunks := self._map_reduce_chunks(trimmed_messages):
+                summary = await self._amap_reduce_summary(None, chunks)
+            else:
+                response = await self.summary_model.ainvoke(
+                    self.summary_prompt.format(messages=formatted_messages).rstrip(),
+                    config={"metadata": {"lc_source": "summarization"}},
+                )
+                summary = response.text.strip()
         except Exception as e:
             return f"Error generating summary: {e!s}"
+        return self._store_summary(key, summary)
+
+    def _update_summary(self, previous_summary: str, evicted: list[AnyMessage]) -> str:
+        """Fold newly evicted messages into the previous summary."""
+        prompt = self._incremental_prompt(previous_summary, evicted)
+        if prompt is None:
+            return previous_summary
+
+        trimmed_messages = self._trim_messages_for_summary(evicted)
+        key = self._summary_key(previous_summary, trimmed_messages)
+        if (cached := self._cached_summary(key)) is not None:
+            return cached
+        try:
+            if chunks := self._map_reduce_chunks(trimmed_messages):
+                summary = self._map_reduce_summary(previous_summary, chunks)
+            else:
+                response = self.summary_model.invoke(
+                    prompt, config={"metadata": {"lc_source": "summarization"}}
+                )
+                summary = response.text.strip()
+        except Exception as e:
+            return f"{previous_summary}\n\nError updating summary: {e!s}"
+        return self._store_summary(key, summary)
+
+    async def _aupdate_summary(
+        self, previous_summary: str, evicted: list[AnyMessage]
+    ) -> str:
+        """Fold newly evicted messages into the previous summary."""
+        prompt = self._incremental_prompt(previous_summary, evicted)
+        if prompt is None:
+            return previous_summary
+
+        trimmed_messages = self._trim_messages_for_summary(evicted)
+        key = self._summary_key(previous_summary, trimmed_messages)
+        if (cached := self._cached_summary(key)) is not None:
+            return cached
+        try:
+            if chunks := self._map_reduce_chunks(trimmed_messages):
+                summary = await self._amap_reduce_summary(previous_summary, chunks)
+            else:
+                response = await self.summary_model.ainvoke(
+                    prompt, config={"metadata": {"lc_source": "summarization"}}
+                )
+                summary = response.text.strip()
+        except Exception as e:
+            return f"{previous_summary}\n\nError updating summary: {e!s}"
+        return self._store_summary(key, summary)
+
+    def _summary_key(
+        self, previous_summary: str | None, messages: list[AnyMessage]
+    ) -> str | None:
+        """Return the summary cache key for ``messages``, or None without a cache."""
+        if self.summary_cache is None:
+            return None
+        return SummaryCache.key(
+            current_actor(), self._prompt_version, previous_summary, messages
+        )
+
+    def _cached_summary(self, key: str | None) -> str | None:
+        """Return a summary written earlier for the same range, if cached."""
+        if key is None:
+            return None
+        summary = self.summary_cache.get(key)
+        if summary is not None:
+            logger.info("Reusing cached conversation summary")
+        return summary
+
+    def _store_summary(self, key: str | None, summary: str) -> str:
+        """Cache ``summary`` under ``key`` and return it."""
+        if key is not None and summary:
+            self.summary_cache.put(key, summary)
+        return summary
+
+    def _map_reduce_chunks(
+        self, messages: list[AnyMessage]
+    ) -> list[list[AnyMessage]] | None:
+        """Split ``messages`` into chunks within the chunk budget, on message boundaries.
+
+        A chunk never starts with a tool result, so tool calls stay with their
+        results. Returns None when map-reduce is off, when ``messages`` is under
+        ``map_reduce_min_tokens``, or when one chunk is enough.
+        """
+        if self.map_reduce_chunk_tokens is None:
+            return None
+        if (
+            self.map_reduce_min_tokens is not None
+            and self._partial_token_counter(messages) < self.map_reduce_min_tokens
+        ):
+            return None
+
+        chunks: list[list[AnyMessage]] = []
+        current: list[AnyMessage] = []
+        current_tokens = 0
+        for message in messages:
+            tokens = self._partial_token_counter([message])
+            if (
+                current
+                and current_tokens + tokens > self.map_reduce_chunk_tokens
+                and not isinstance(message, ToolMessage)
+            ):
+                chunks.append(current)
+                current, current_tokens = [], 0
+            current.append(message)
+            current_tokens += tokens
+        if current:
+            chunks.append(current)
+        return chunks if len(chunks) > 1 else None
+
+    def _map_reduce_summary(
+        self, previous_summary: str | None, chunks: list[list[AnyMessage]]
+    ) -> str:
+        """Summarize ``chunks`` concurrently, then merge them with the previous summary."""
+        responses = self.summary_model.batch(
+            [self._chunk_prompt(chunk) for chunk in chunks],
+            config={
+                "metadata": {"lc_source": "summarization"},
+                "max_concurrency": self.map_reduce_concurrency,
+            },
+        )
+        response = self.summary_model.invoke(
+            self._merge_prompt(previous_summary, responses),
+            config={"metadata": {"lc_source": "summarization"}},
+        )
+        return response.text.strip()
+
+    async def _amap_reduce_summary(
+        self, previous_summary: str | None, chunks: list[list[AnyMessage]]
+    ) -> str:
+        """Summarize ``chunks`` concurrently, then merge them with the previous summary."""
+        responses = await self.summary_model.abatch(
+            [self._chunk_prompt(chunk) for chunk in chunks],
+            config={
+                "metadata": {"lc_source": "summarization"},
+                "max_concurrency": self.map_reduce_concurrency,
+            },
+        )
+        response = await self.summary_model.ainvoke(
+            self._merge_prompt(previous_summary, responses),
+            config={"metadata": {"lc_source": "summarization"}},
+        )
+        return response.text.strip()
+
+    def _chunk_prompt(self, chunk: list[AnyMessage]) -> str:
+        """Render the map-step prompt for one chunk."""
+        return self.summary_prompt.format(messages=get_buffer_string(chunk)).rstrip()
+
+    def _merge_prompt(self, previous_summary: str | None, responses: list[Any]) -> str:
+        """Render the reduce-step prompt over the chunk summaries, oldest first."""
+        parts = [previous_summary] if previous_summary else []
+        parts.extend(response.text.strip() for response in responses)
+        summaries = "\n\n".join(
+            f'<summary part="{index}">\n{part}\n</summary>'
+            for index, part in enumerate(parts, 1)
+        )
+        return self.merge_summary_prompt.format(summaries=summaries).rstrip()
+
+    def _incremental_prompt(
+        self, previous_summary: str, evicted: list[AnyMessage]
+    ) -> str | None:
+        """Render the update prompt, or None when there is nothing new to fold in."""
+        trimmed_messages = self._trim_messages_for_summary(evicted)
+        if not trimmed_messages:
+            return None
+
+        return self.incremental_summary_prompt.format(
+            summary=previous_summary,
+            messages=get_buffer_string(trimmed_messages),
+        ).rstrip()
+
+
+def _is_summary_message(message: AnyMessage) -> bool:
+    """Return whether ``message`` is a summary written by a previous compaction."""
+    return (
+        isinstance(message, HumanMessage)
+        and message.additional_kwargs.get("lc_source") == "summarization"
+    )
+
+
+def _task_summary(task: asyncio.Task) -> str | None:
+    """Return a finished background summary, or None if it failed or was cancelled."""
+    if task.cancelled():
+        return None
+    if (error := task.exception()) is not None:
+        logger.warning(f"Background summarization failed: {error}")
+        return None
+    return task.result()
+
+
+def _with_attempts(
+    update: dict[str, Any] | None,
+    budget: AttemptBudget | None,
+    state: SummarizationState,
+) -> dict[str, Any] | None:
+    """Record the turn's attempts and retries, summary calls included, in ``update``."""
+    if budget is None:
+        return update
+    usage = budget_usage(budget)
+    if all(state.get(key, 0) == value for key, value in usage.items()):
+        return update
+    return {**(update or {}), **usage}
+
+
+def _summary_text(message: AnyMessage) -> str:
+    """Return the summary carried by a summary message, without its preamble."""
+    return message.text.removeprefix(_SUMMARY_MESSAGE_PREFIX).strip()
 
 
-__all__ = ["CustomSummarizationMiddleware"]
+__all__ = ["ContextBudget", "CustomSummarizationMiddleware", "SummarizationState"]
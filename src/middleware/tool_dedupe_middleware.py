@@ -0,0 +1,192 @@
+"""Replace repeated tool results in a thread with references to the earlier call."""
+
+import hashlib
+import json
+import logging
+from typing import Any
+
+from langchain.agents.middleware import AgentMiddleware, AgentState
+from langchain_core.messages import AIMessage, AnyMessage, ToolMessage
+from langgraph.prebuilt.tool_node import ToolCallRequest
+from langgraph.types import Command
+
+from src.middleware.tool_output_compaction import is_compacted
+
+logger = logging.getLogger(__name__)
+
+#: Tools whose output depends only on their arguments within a thread, so a repeat
+#: call can reuse the earlier result without running. Pricing is left out: it
+#: must be fetched live before answering pricing questions.
+DEDUPED_TOOLS = frozenset(
+    {
+        "search_docs_by_lang_chain",
+        "query_docs_filesystem_docs_by_lang_chain",
+        "search_support_articles",
+        "get_support_article_content",
+        "check_links",
+    }
+)
+#: Results shorter than this are cheaper to repeat than to reference.
+MIN_DEDUPED_CHARS = 200
+#: Content digests kept per process, by message id.
+_MAX_CACHED_DIGESTS = 20_000
+
+
+def _digest(text: str) -> str:
+    """SHA-256 hex digest of ``text``."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _call_key(name: str, args: dict[str, Any]) -> str:
+    """Content address of a tool call: its name and canonical arguments."""
+    return _digest(f"{name}\n{json.dumps(args, sort_keys=True, default=str)}")
+
+
+def _is_reusable(message: ToolMessage) -> bool:
+    """Whether ``message`` holds a full, successful result a repeat can point at."""
+    return (
+        message.status != "error"
+        and not is_compacted(message)
+        and "duplicate_of" not in message.additional_kwargs
+        and not message.text.startswith('{"error"')
+    )
+
+
+def inline_references(
+    messages: list[AnyMessage], sources: list[AnyMessage]
+) -> list[ToolMessage]:
+    """Return the reference stubs in ``messages`` that point into ``sources``, inlined.
+
+    Called when ``sources`` leave the context or are compacted, so no stub points
+    at a result the model can no longer see. Each returned message is a copy of
+    the referenced result under the stub's id and ``tool_call_id``.
+    """
+    results = {
+        message.tool_call_id: message
+        for message in sources
+        if isinstance(message, ToolMessage)
+    }
+    inlined: list[ToolMessage] = []
+    for message in messages:
+        if not isinstance(message, ToolMessage):
+            continue
+        source = results.get(message.additional_kwargs.get("duplicate_of"))
+        if source is not None:
+            inlined.append(
+                source.model_copy(
+                    update={
+                        "id": message.id,
+                        "tool_call_id": message.tool_call_id,
+                        "name": message.name or source.name,
+                    }
+                )
+            )
+    return inlined
+
+
+class ToolResultDedupeMiddleware(AgentMiddleware[AgentState]):
+    """Answer repeated tool calls and repeated results with a short reference stub.
+
+    A call whose tool and arguments match an earlier call still in the thread's
+    context is not run again. A result whose content matches an earlier result
+    is replaced after the fact. Either way the model sees "identical to the
+    result of call X above" instead of a second copy of the payload.
+    """
+
+    def __init__(self, tools: frozenset[str] = DEDUPED_TOOLS):
+        """Initialize the middleware for the tools in ``tools``."""
+        super().__init__()
+        self.tools = tools
+        self._digests: dict[str, str] = {}
+
+    def _content_digest(self, message: ToolMessage) -> str:
+        """Digest of a tool result, cached by message id."""
+        if message.id is None:
+            return _digest(message.text)
+        digest = self._digests.get(message.id)
+        if digest is None:
+            digest = _digest(message.text)
+            self._digests[message.id] = digest
+            if len(self._digests) > _MAX_CACHED_DIGESTS:
+                del self._digests[next(iter(self._digests))]
+        return digest
+
+    def _earlier_results(
+        self, messages: list[AnyMessage]
+    ) -> tuple[dict[str, str], dict[str, str]]:
+        """Index reusable results in context by call key and by content digest."""
+        call_keys = {
+            call["id"]: _call_key(call["name"], call.get("args", {}))
+            for message in messages
+            if isinstance(message, AIMessage)
+            for call in message.tool_calls
+            if call.get("id")
+        }
+        by_call: dict[str, str] = {}
+        by_content: dict[str, str] = {}
+        for message in messages:
+            if (
+                not isinstance(message, ToolMessage)
+                or len(message.text) < MIN_DEDUPED_CHARS
+                or not _is_reusable(message)
+            ):
+                continue
+            if key := call_keys.get(message.tool_call_id):
+                by_call.setdefault(key, message.tool_call_id)
+            by_content.setdefault(self._content_digest(message), message.tool_call_id)
+        return by_call, by_content
+
+    def _reference(
+        self, request: ToolCallRequest, earlier_call_id: str, reason: str
+    ) -> ToolMessage:
+        """Stub answering ``request`` with a pointer to ``earlier_call_id``."""
+        tool_name = request.tool_call.get("name", "unknown_tool")
+        return ToolMessage(
+            content=(
+                f"Identical to the result of call {earlier_call_id} above "
+                f"({reason}). Use that result instead of calling {tool_name} again."
+            ),
+            name=tool_name,
+            tool_call_id=request.tool_call.get("id", ""),
+            additional_kwargs={"duplicate_of": earlier_call_id},
+        )
+
+    async def awrap_tool_call(
+        self,
+        request: ToolCallRequest,
+        handler,
+    ) -> ToolMessage | Command:
+        """Answer a repeated call or result with a reference to the earlier one."""
+        tool_name = request.tool_call.get("name", "")
+        if tool_name not in self.tools:
+            return await handler(request)
+
+        messages = (request.state or {}).get("messages", [])
+        by_call, by_content = self._earlier_results(messages)
+        call_key = _call_key(tool_name, request.tool_call.get("args", {}))
+        if earlier_call_id := by_call.get(call_key):
+            logger.info(
+                "Skipping repeated %s call; reusing %s", tool_name, earlier_call_id
+            )
+            return self._reference(request, earlier_call_id, "same tool and arguments")
+
+        result = await handler(request)
+        if (
+            isinstance(result, ToolMessage)
+            and len(result.text) >= MIN_DEDUPED_CHARS
+            and _is_reusable(result)
+            and (earlier_call_id := by_content.get(_digest(result.text)))
+        ):
+            logger.info(
+                "Repeated %s result; referencing %s", tool_name, earlier_call_id
+            )
+            return self._reference(request, earlier_call_id, "same content")
+        return result
+
+
+__all__ = [
+    "DEDUPED_TOOLS",
+    "MIN_DEDUPED_CHARS",
+    "ToolResultDedupeMiddleware",
+    "inline_references",
+]
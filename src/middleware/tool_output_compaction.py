@@ -0,0 +1,190 @@
+"""Deterministic compaction of re-fetchable tool output.
+
+Docs searches and reads, support articles, pricing and link checks can all be
+fetched again, so older results from those tools do not need an LLM summary.
+``compact_tool_messages`` replaces them with short reference stubs (tool,
+arguments, article id or URL and a one-line gist) that keep their message ids,
+so the messages reducer overwrites the originals in place.
+"""
+
+import json
+import re
+from collections.abc import Callable
+from typing import Any
+
+from langchain_core.messages import AIMessage, AnyMessage, ToolMessage
+
+#: Results shorter than this are cheaper to keep than to stub.
+MIN_COMPACTED_CHARS = 400
+#: Longest gist kept in a stub.
+_MAX_GIST_CHARS = 160
+#: Most URLs or page paths listed in a stub.
+_MAX_REFERENCES = 5
+
+_URL_RE = re.compile(r"https?://[^\s\"'<>)\]]+")
+
+
+def _first_line(content: str) -> str:
+    """Return the first non-empty line of ``content``, shortened to the gist limit."""
+    for line in content.splitlines():
+        line = line.strip()
+        if line:
+            return (
+                line
+                if len(line) <= _MAX_GIST_CHARS
+                else f"{line[: _MAX_GIST_CHARS - 3]}..."
+            )
+    return ""
+
+
+def _references(content: str) -> str:
+    """Return the distinct URLs in ``content``, up to the reference limit."""
+    urls = list(dict.fromkeys(_URL_RE.findall(content)))
+    if not urls:
+        return ""
+    more = (
+        f" (+{len(urls) - _MAX_REFERENCES} more)" if len(urls) > _MAX_REFERENCES else ""
+    )
+    return "References: " + ", ".join(urls[:_MAX_REFERENCES]) + more
+
+
+def _docs_gist(content: str) -> str:
+    """Gist of a docs search or read: its first line and the URLs it cites."""
+    return "\n".join(
+        filter(None, [f"Gist: {_first_line(content)}", _references(content)])
+    )
+
+
+def _support_search_gist(content: str) -> str:
+    """Gist of a support article listing: how many titles it returned."""
+    try:
+        result = json.loads(content)
+    except ValueError:
+        return f"Gist: {_first_line(content)}"
+    if not isinstance(result, dict):
+        return f"Gist: {_first_line(content)}"
+    if "error" in result:
+        return f"Gist: error: {result['error']}"
+    return f"Gist: {result.get('total', 0)} article titles in {result.get('collections', 'all')}"
+
+
+def _support_article_gist(content: str) -> str:
+    """Gist of a support article: its id, title and URL."""
+    fields = dict(
+        line.split(": ", 1)
+        for line in content.splitlines()[:4]
+        if line.split(": ", 1)[0] in {"ID", "Title", "URL"} and ": " in line
+    )
+    if not fields:
+        return f"Gist: {_first_line(content)}"
+    return "\n".join(f"{key}: {value}" for key, value in fields.items())
+
+
+def _pricing_gist(content: str) -> str:  # noqa: ARG001
+    """Gist of the pricing page, which must be re-fetched rather than remembered."""
+    return (
+        "Gist: pricing page text. Re-fetch it live before answering pricing questions."
+    )
+
+
+def _link_check_gist(content: str) -> str:
+    """Gist of a link check: the valid count and the invalid links."""
+    lines = content.splitlines()
+    invalid = [
+        line.strip() for line in lines if line.startswith("  - ") and ": " in line
+    ]
+    summary = _first_line(content)
+    return "\n".join([f"Gist: {summary}", *invalid[:_MAX_REFERENCES]])
+
+
+#: Tools whose results can be fetched again, mapped to how their gist is written.
+REFETCHABLE_TOOLS: dict[str, Callable[[str], str]] = {
+    "search_docs_by_lang_chain": _docs_gist,
+    "query_docs_filesystem_docs_by_lang_chain": _docs_gist,
+    "search_support_articles": _support_search_gist,
+    "get_support_article_content": _support_article_gist,
+    "fetch_langchain_pricing": _pricing_gist,
+    "check_links": _link_check_gist,
+}
+
+
+def _tool_calls_by_id(messages: list[AnyMessage]) -> dict[str, dict[str, Any]]:
+    """Map tool call ids to the calls that requested them."""
+    return {
+        call["id"]: call
+        for message in messages
+        if isinstance(message, AIMessage)
+        for call in message.tool_calls
+        if call.get("id")
+    }
+
+
+def is_compacted(message: AnyMessage) -> bool:
+    """Return whether ``message`` is already a reference stub."""
+    return "compacted_at" in message.additional_kwargs
+
+
+def compacted_since(messages: list[AnyMessage], message_id: str | None) -> bool:
+    """Return whether any stub was written after ``message_id`` was generated.
+
+    Provider-reported usage on that message then overstates the current history.
+    """
+    return message_id is not None and any(
+        message.additional_kwargs.get("compacted_at") == message_id
+        for message in messages
+        if isinstance(message, ToolMessage)
+    )
+
+
+def compact_tool_messages(messages: list[AnyMessage], end: int) -> list[ToolMessage]:
+    """Return reference stubs for the re-fetchable tool results in ``messages[:end]``.
+
+    Only results from ``REFETCHABLE_TOOLS`` that are long enough to be worth it
+    and not already stubbed are replaced. Each stub keeps the original id and
+    ``tool_call_id``, and records the latest AI message at compaction time.
+    """
+    calls = _tool_calls_by_id(messages[:end])
+    latest_ai_id = next(
+        (
+            message.id
+            for message in reversed(messages)
+            if isinstance(message, AIMessage)
+        ),
+        None,
+    )
+    stubs: list[ToolMessage] = []
+    for message in messages[:end]:
+        if not isinstance(message, ToolMessage) or is_compacted(message):
+            continue
+        call = calls.get(message.tool_call_id, {})
+        tool_name = message.name or call.get("name")
+        gist = REFETCHABLE_TOOLS.get(tool_name)
+        content = message.text
+        if gist is None or len(content) < MIN_COMPACTED_CHARS:
+            continue
+
+        args = json.dumps(call.get("args", {}), sort_keys=True, default=str)
+        stubs.append(
+            ToolMessage(
+                content=(
+                    f"[Compacted {tool_name} result ({len(content)} chars); "
+                    f"call the tool again with the same arguments for the full output.]\n"
+                    f"Arguments: {args}\n{gist(content)}"
+                ),
+                tool_call_id=message.tool_call_id,
+                name=tool_name,
+                id=message.id,
+                status=message.status,
+                additional_kwargs={"compacted_at": latest_ai_id},
+            )
+        )
+    return stubs
+
+
+__all__ = [
+    "MIN_COMPACTED_CHARS",
+    "REFETCHABLE_TOOLS",
+    "compact_tool_messages",
+    "compacted_since",
+    "is_compacted",
+]
@@ -10,6 +10,8 @@ from langchain_core.messages import ToolMessage
 from langgraph.prebuilt.tool_node import ToolCallRequest
 from langgraph.types import Command
 
+from src.middleware.retry_policy import DEFAULT_RETRY_POLICY, RetryPolicy
+
 logger = logging.getLogger(__name__)
 
 NO_RESULTS_MARKERS = (
@@ -39,13 +41,11 @@ class ToolRetryMiddleware(AgentMiddleware[AgentState]):
     def __init__(
         self,
         max_attempts: int = 3,
-        initial_delay: float = 0.5,
-        backoff_factor: float = 2.0,
+        policy: RetryPolicy = DEFAULT_RETRY_POLICY,
     ):
         super().__init__()
         self.max_attempts = max_attempts
-        self.initial_delay = initial_delay
-        self.backoff_factor = backoff_factor
+        self.policy = policy
 
     def _tool_name(self, request: ToolCallRequest) -> str:
         return request.tool_call.get("name", "unknown_tool")
@@ -105,11 +105,12 @@ class ToolRetryMiddleware(AgentMiddleware[AgentState]):
         self,
         request: ToolCallRequest,
         error: Exception,
+        attempts: int,
     ) -> str:
         tool_name = self._tool_name(request)
         payload: dict[str, Any] = {
             "error": "Tool unavailable",
-            "message": f"{tool_name} failed after {self.max_attempts} attempts.",
+            "message": f"{tool_name} failed after {attempts} attempts.",
             "tool": tool_name,
             "suggestion": (
                 "Try a narrower or related query, use another available source, "
@@ -125,6 +126,7 @@ class ToolRetryMiddleware(AgentMiddleware[AgentState]):
         handler,
     ) -> ToolMessage | Command:
         last_error: Exception | None = None
+        delay: float | None = None
 
         for attempt in range(1, self.max_attempts + 1):
             try:
@@ -140,10 +142,11 @@ class ToolRetryMiddleware(AgentMiddleware[AgentState]):
                     )
                     return self._tool_message(request, "No results found.")
 
-                if self._is_retryable(error) and attempt < self.max_attempts:
-                    delay = self.initial_delay * (
-                        self.backoff_factor ** (attempt - 1)
-                    )
+                if (
+                    self._is_retryable(error)
+                    and attempt < self.max_attempts
+                    and (delay := self.policy.next_delay(delay, error)) is not None
+                ):
                     logger.warning(
                         "Tool %s failed attempt %s/%s: %s; retrying in %.2fs",
                         tool_name,
@@ -164,12 +167,14 @@ class ToolRetryMiddleware(AgentMiddleware[AgentState]):
                 )
                 return self._tool_message(
                     request,
-                    self._final_error_content(request, error),
+                    self._final_error_content(request, error, attempt),
                 )
 
         # Defensive fallback; loop should always return on success or final error.
         assert last_error is not None
-        return self._tool_message(request, self._final_error_content(request, last_error))
+        return self._tool_message(
+            request, self._final_error_content(request, last_error, self.max_attempts)
+        )
 
 
 __all__ = ["ToolRetryMiddleware"]
@@ -0,0 +1,138 @@
+"""One end-to-end time and model-retry budget per agent turn.
+
+The model retry middleware, the fallback middleware and the summary runnable
+each retry on their own. ``TurnBudgetMiddleware`` starts a turn with a deadline
+and a retry limit in graph state. It makes that budget the active
+``AttemptBudget`` around every model and tool call, so all of those layers
+count against, and stop at, the same limits. Only retries and fallback attempts
+count against the limit; a turn may make as many successful model calls as its
+deadline allows. Attempts and retries used so far are written back to state as
+``model_attempts`` and ``model_retries`` and logged when the turn ends.
+"""
+
+import logging
+import time
+from dataclasses import replace
+from typing import Any
+
+from langchain.agents.middleware import AgentMiddleware, AgentState
+from langchain.agents.middleware.types import (
+    ExtendedModelResponse,
+    ModelCallResult,
+    ModelRequest,
+    ModelResponse,
+)
+from langgraph.prebuilt.tool_node import ToolCallRequest
+from langgraph.runtime import Runtime
+from langgraph.types import Command
+from typing_extensions import NotRequired
+
+from src.middleware.retry_policy import AttemptBudget, attempt_scope
+
+logger = logging.getLogger(__name__)
+
+
+class TurnBudgetState(AgentState):
+    """Turn deadline (Unix time), retry limit and model attempts and retries so far."""
+
+    turn_deadline: NotRequired[float | None]
+    turn_max_model_retries: NotRequired[int | None]
+    model_attempts: NotRequired[int]
+    model_retries: NotRequired[int]
+
+
+def attempt_budget_from_state(state: Any) -> AttemptBudget | None:
+    """Rebuild the running turn's budget from graph state, if a turn set one."""
+    if not state or state.get("turn_deadline") is None:
+        return None
+    return AttemptBudget(
+        deadline=state["turn_deadline"],
+        max_retries=state.get("turn_max_model_retries"),
+        attempts=state.get("model_attempts", 0),
+        retries=state.get("model_retries", 0),
+    )
+
+
+def budget_usage(budget: AttemptBudget) -> dict[str, int]:
+    """Return the state update recording what ``budget`` has used so far."""
+    return {"model_attempts": budget.attempts, "model_retries": budget.retries}
+
+
+class TurnBudgetMiddleware(AgentMiddleware[TurnBudgetState]):
+    """Bound each turn's wall-clock time and model retries across all layers.
+
+    Place it first so its model-call wrapper is outermost and the retry and
+    fallback middleware run inside the budget.
+    """
+
+    state_schema = TurnBudgetState
+
+    def __init__(self, turn_seconds: float = 180.0, max_model_retries: int = 10):
+        """Initialize a budget of ``turn_seconds`` and ``max_model_retries`` per turn."""
+        super().__init__()
+        self.turn_seconds = turn_seconds
+        self.max_model_retries = max_model_retries
+
+    async def abefore_agent(
+        self, state: TurnBudgetState, runtime: Runtime
+    ) -> dict[str, Any] | None:
+        """Start the turn's budget."""
+        return {
+            "turn_deadline": time.time() + self.turn_seconds,
+            "turn_max_model_retries": self.max_model_retries,
+            "model_attempts": 0,
+            "model_retries": 0,
+        }
+
+    async def awrap_model_call(self, request: ModelRequest, handler) -> ModelCallResult:
+        """Run the model call within the turn's budget and record what it used."""
+        budget = attempt_budget_from_state(request.state)
+        with attempt_scope(budget):
+            response = await handler(request)
+        if budget is None:
+            return response
+        if isinstance(response, ExtendedModelResponse):
+            # Keep the inner middleware's command and add the counters to it.
+            command = response.command or Command()
+            update = command.update
+            if update is None:
+                update = budget_usage(budget)
+            elif isinstance(update, dict):
+                update = {**update, **budget_usage(budget)}
+            else:
+                update = [*update, *budget_usage(budget).items()]
+            return replace(response, command=replace(command, update=update))
+        if not isinstance(response, ModelResponse):
+            return response
+        return ExtendedModelResponse(
+            model_response=response,
+            command=Command(update=budget_usage(budget)),
+        )
+
+    async def awrap_tool_call(self, request: ToolCallRequest, handler) -> Any:
+        """Run the tool call so its retries stop at the turn's deadline."""
+        budget = attempt_budget_from_state(request.state)
+        # Tool retries are not model retries: they get the deadline only.
+        with attempt_scope(budget and AttemptBudget(deadline=budget.deadline)):
+            return await handler(request)
+
+    async def aafter_agent(
+        self, state: TurnBudgetState, runtime: Runtime
+    ) -> dict[str, Any] | None:
+        """Report how much of the turn's budget was used."""
+        if state.get("turn_deadline") is not None:
+            elapsed = self.turn_seconds - (state["turn_deadline"] - time.time())
+            logger.info(
+                f"Turn made {state.get('model_attempts', 0)} model attempts with "
+                f"{state.get('model_retries', 0)}/{self.max_model_retries} retries "
+                f"in {elapsed:.1f}s"
+            )
+        return None
+
+
+__all__ = [
+    "TurnBudgetMiddleware",
+    "TurnBudgetState",
+    "attempt_budget_from_state",
+    "budget_usage",
+]
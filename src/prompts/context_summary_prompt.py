@@ -1,10 +1,6 @@
 """Prompt used by context summarization middleware."""
 
-context_summary_prompt = """You are summarizing earlier conversation history for a LangChain documentation support agent.
-
-Your summary will replace the older part of the conversation. The most recent conversation messages will be preserved exactly after your summary, so focus on durable context from the older messages that is still useful.
-
-## Goals
+_summary_guidelines = """## Goals
 
 Prioritize information that is still unresolved or likely needed later:
 - Open user questions, unresolved bugs, incomplete tasks, and pending follow-ups
@@ -50,8 +46,52 @@ List important docs paths/URLs, support article IDs/titles, pricing/link-check f
 List completed implementation/debugging steps, changed files, and verification results if relevant.
 
 ## Open Issues / Next Steps
-List remaining work, known risks, and specific next actions.
+List remaining work, known risks, and specific next actions."""
+
+context_summary_prompt = (
+    """You are summarizing earlier conversation history for a LangChain documentation support agent.
+
+Your summary will replace the older part of the conversation. The most recent conversation messages will be preserved exactly after your summary, so focus on durable context from the older messages that is still useful.
+
+"""
+    + _summary_guidelines
+    + """
 
 <messages>
 {messages}
 </messages>"""
+)
+
+# Folds newly evicted messages into the summary written at the previous compaction,
+# so each compaction only reads the messages dropped since then.
+incremental_context_summary_prompt = (
+    """You are updating the running summary of earlier conversation history for a LangChain documentation support agent.
+
+The previous summary covers everything before the new messages below. Both will be replaced by your updated summary, and the most recent conversation messages will be preserved exactly after it. Rewrite the previous summary so it also covers the new messages: keep its still-relevant content, update goals and open issues that the new messages changed, and drop items that are now resolved and no longer useful.
+
+"""
+    + _summary_guidelines
+    + """
+
+<previous_summary>
+{summary}
+</previous_summary>
+
+<messages>
+{messages}
+</messages>"""
+)
+
+# Reduce step of map-reduce summarization: merges summaries of consecutive chunks
+# of the evicted history (and the previous summary, if any) into one.
+merge_context_summary_prompt = (
+    """You are merging partial summaries of earlier conversation history for a LangChain documentation support agent.
+
+Each summary below covers a consecutive part of the older conversation, oldest first. Your merged summary will replace all of them, and the most recent conversation messages will be preserved exactly after it. Combine them into one summary: later parts take precedence where they update goals, decisions or open issues, and items resolved in a later part should be dropped if no longer useful.
+
+"""
+    + _summary_guidelines
+    + """
+
+{summaries}"""
+)
@@ -113,3 +113,28 @@ The user just asked a question that is outside your area of expertise. Your job
 - NEVER offer to "build / write / design / set up" something that relates to the declined content"""
 
 fallback_rejection_message = "I'm specifically designed to help with LangChain, LangGraph, LangSmith, and Deep Agents. Feel free to ask me about those topics!"
+
+# Appended to the classifier instruction when guardrails runs in single-call mode.
+single_call_rejection_instruction = """
+
+If the decision is BLOCKED, also set `block_category` and write `rejection_message`: a brief (2-3 sentences), friendly, professional reply with no emojis that says the request is outside your scope and points to LangChain, LangGraph, LangSmith, and Deep Agents in general terms only. Do not offer to write, build, or design anything related to the declined request. If the decision is ALLOWED, set `block_category` to "none" and leave `rejection_message` empty."""
+
+# What the classifier is asked to return in minimal-output mode, in place of
+# the decision plus explanation.
+minimal_output_instruction = (
+    "Reply with exactly one word, ALLOWED or BLOCKED, and nothing else."
+)
+
+# Asks for the explanation of a minimal-output decision, off the request path.
+explanation_instruction = """The user query below was classified as {decision}. In one concise sentence, explain the policy reason for this decision."""
+
+# Zero-latency rejection replies per block category, used when the classifier
+# does not return its own message.
+rejection_templates = {
+    "off_topic": "That's outside my wheelhouse - I focus on LangChain, LangGraph, LangSmith, and Deep Agents. Happy to help with any of those.",
+    "creative_writing": "I don't write stories, roleplay, or other creative pieces. I'm here for LangChain, LangGraph, LangSmith, and Deep Agents questions - ask me about any of those.",
+    "explicit_content": "I can't help with that. I'm designed to answer questions about LangChain, LangGraph, LangSmith, and Deep Agents.",
+    "harmful_use": "I can't help build that. If you're working on a legitimate LangChain, LangGraph, LangSmith, or Deep Agents project, I'm glad to help with it.",
+    "prompt_extraction": "I can't share my internal instructions or configuration, but I'm happy to answer questions about LangChain, LangGraph, LangSmith, and Deep Agents.",
+    "social_pressure": "My answer on that one stays the same - it's outside my scope. I'm glad to help with anything related to LangChain, LangGraph, LangSmith, or Deep Agents.",
+}
@@ -0,0 +1,41 @@
+"""Rolling per-key latency windows for adaptive timeouts and hedging."""
+
+import math
+from collections import deque
+
+
+class RollingLatency:
+    """Keep the most recent latency samples per key and answer percentile queries."""
+
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        """Initialize with the window size and the samples needed before answering."""
+        self.window = window
+        self.min_samples = min_samples
+        self._samples: dict[str, deque[float]] = {}
+
+    def record(self, key: str, seconds: float) -> None:
+        """Record one observed latency for ``key``."""
+        samples = self._samples.get(key)
+        if samples is None:
+            samples = self._samples[key] = deque(maxlen=self.window)
+        samples.append(seconds)
+
+    def count(self, key: str) -> int:
+        """Return how many samples are currently held for ``key``."""
+        return len(self._samples.get(key, ()))
+
+    def percentile(self, key: str, q: float) -> float | None:
+        """Return the ``q`` percentile (0-1) for ``key``, or ``None`` without enough data."""
+        samples = self._samples.get(key)
+        if not samples or len(samples) < self.min_samples:
+            return None
+        ordered = sorted(samples)
+        index = min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))
+        return ordered[index]
+
+    def clear(self) -> None:
+        """Forget all samples."""
+        self._samples.clear()
+
+
+__all__ = ["RollingLatency"]
@@ -2,19 +2,10 @@
 
 import logging
 import os
-from functools import lru_cache
 
-logger = logging.getLogger(__name__)
-
-#: Workspace that owns the Hub prompts used for ``prompt_source`` /
-#: ``prompt_commit`` provenance. On MDA deploys this is often a different
-#: workspace than ``LANGSMITH_WORKSPACE_ID`` (the deployment's own org).
-_PROMPT_WORKSPACE_ENV = "LANGSMITH_PROMPT_WORKSPACE_ID"
+from src.utils.prompt_registry import prompt_registry
 
-#: Optional API key for Hub provenance pulls. ``LANGSMITH_API_KEY`` is reserved
-#: by MDA deploy and replaced by the host-injected key, which may not be able to
-#: read prompts in ``LANGSMITH_PROMPT_WORKSPACE_ID``. Set this to a key that can.
-_PROMPT_API_KEY_ENV = "LANGSMITH_PROMPT_API_KEY"
+logger = logging.getLogger(__name__)
 
 _USE_LOCAL_PROMPTS = os.getenv("USE_LOCAL_PROMPTS", "").lower() in {
     "1",
@@ -41,61 +32,17 @@ _GUARDRAILS_HUB_PROMPTS: dict[str, str] = {
 }
 
 
-def _prompt_workspace_id() -> str | None:
-    """Return the Hub-owning workspace id, if configured."""
-    value = os.getenv(_PROMPT_WORKSPACE_ENV, "").strip()
-    return value or None
-
-
-def _prompt_api_key() -> str | None:
-    """Return an API key that can read the Hub prompt workspace, if configured."""
-    value = os.getenv(_PROMPT_API_KEY_ENV, "").strip()
-    return value or None
-
-
-def _hub_client(workspace_id: str | None, api_key: str | None):
-    """Build a LangSmith client scoped for Hub provenance reads."""
-    from langsmith import Client
-
-    kwargs: dict[str, str] = {}
-    if workspace_id:
-        kwargs["workspace_id"] = workspace_id
-    if api_key:
-        kwargs["api_key"] = api_key
-    return Client(**kwargs)
-
-
-@lru_cache(maxsize=16)
-def _resolve_hub_provenance(
-    hub_name: str,
-    workspace_id: str | None,
-    api_key_set: bool,
-) -> tuple[str, str | None]:
-    """Pull the hub prompt to get its current commit hash. Cached per process.
+def _resolve_hub_provenance(hub_names: list[str]) -> dict[str, str | None]:
+    """Return the commit of each Hub prompt from concurrent commit-only lookups.
 
-    ``api_key_set`` is part of the cache key so enabling ``LANGSMITH_PROMPT_API_KEY``
-    invalidates prior failed lookups. The key value itself is read at call time.
+    Lookups are shared with the registry that loads the prompt bodies; prompts
+    whose commit is unknown within the startup deadline map to ``None``.
     """
-    try:
-        client = _hub_client(workspace_id, _prompt_api_key() if api_key_set else None)
-        template = client.pull_prompt(hub_name)
-        commit = (template.metadata or {}).get("lc_hub_commit_hash")
+    commits = prompt_registry.commits(hub_names)
+    for hub_name, commit in commits.items():
         if not commit:
-            logger.warning(
-                "Hub prompt %s pulled but lc_hub_commit_hash missing (workspace=%s)",
-                hub_name,
-                workspace_id or "default",
-            )
-        return f"hub:{hub_name}", commit
-    except Exception as exc:
-        logger.warning(
-            "Failed to resolve hub provenance for %s (workspace=%s, prompt_api_key=%s): %s",
-            hub_name,
-            workspace_id or "default",
-            "set" if api_key_set else "unset",
-            exc,
-        )
-        return f"hub:{hub_name}", None
+            logger.warning("Could not resolve Hub prompt commit for %s", hub_name)
+    return commits
 
 
 def get_prompt_provenance(graph_id: str) -> dict[str, str]:
@@ -107,17 +54,14 @@ def get_prompt_provenance(graph_id: str) -> dict[str, str]:
         }
 
     if graph_id in _HUB_PROMPTS:
-        workspace_id = _prompt_workspace_id()
-        api_key_set = _prompt_api_key() is not None
-        source, commit = _resolve_hub_provenance(
-            _HUB_PROMPTS[graph_id], workspace_id, api_key_set
-        )
-        guardrails_source, guardrails_commit = _resolve_hub_provenance(
-            _GUARDRAILS_HUB_PROMPTS[graph_id], workspace_id, api_key_set
-        )
+        hub_name = _HUB_PROMPTS[graph_id]
+        guardrails_hub_name = _GUARDRAILS_HUB_PROMPTS[graph_id]
+        commits = _resolve_hub_provenance([hub_name, guardrails_hub_name])
+        commit = commits[hub_name]
+        guardrails_commit = commits[guardrails_hub_name]
         provenance = {
-            "prompt_source": source,
-            "guardrails_prompt_source": guardrails_source,
+            "prompt_source": f"hub:{hub_name}",
+            "guardrails_prompt_source": f"hub:{guardrails_hub_name}",
         }
         if commit:
             provenance["prompt_commit"] = commit
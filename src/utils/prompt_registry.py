@@ -0,0 +1,356 @@
+"""Shared, non-blocking registry for LangSmith Hub prompts.
+
+Every Hub prompt the app uses is fetched concurrently on background threads.
+Callers wait at most a startup deadline for prompts that have never been
+fetched. Fetched prompts are persisted to a local cache file keyed by commit,
+so later boots serve the cached copy immediately and refresh it in the
+background. A refresh first resolves the tag to a commit hash (no manifest
+download) and pulls the prompt body only when that commit changed. Prompt
+provenance needs only the commits, so ``commits`` runs commit lookups alone
+and never downloads a prompt body.
+"""
+
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Callable, Iterable
+
+logger = logging.getLogger(__name__)
+
+#: Longest a caller waits for a prompt that is neither cached nor fetched yet.
+PROMPT_STARTUP_TIMEOUT_SECONDS = float(os.getenv("HUB_PROMPT_STARTUP_TIMEOUT", "3"))
+#: Where fetched prompts are persisted between processes.
+PROMPT_CACHE_PATH = os.getenv("HUB_PROMPT_CACHE_PATH", ".cache/hub_prompts.json")
+#: Minimum time between fetch attempts for a prompt whose last fetch failed.
+PROMPT_RETRY_INTERVAL_SECONDS = 60.0
+
+#: Workspace that owns the Hub prompts. On MDA deploys this is often a different
+#: workspace than ``LANGSMITH_WORKSPACE_ID`` (the deployment's own org).
+_PROMPT_WORKSPACE_ENV = "LANGSMITH_PROMPT_WORKSPACE_ID"
+
+#: Optional API key for Hub reads. ``LANGSMITH_API_KEY`` is reserved by MDA
+#: deploy and replaced by the host-injected key, which may not be able to read
+#: prompts in ``LANGSMITH_PROMPT_WORKSPACE_ID``. Set this to a key that can.
+_PROMPT_API_KEY_ENV = "LANGSMITH_PROMPT_API_KEY"
+
+_COMMIT_HASH_RE = re.compile(r"[0-9a-f]{8,64}")
+
+
+def prompt_workspace_id() -> str | None:
+    """Return the Hub-owning workspace id, if configured."""
+    value = os.getenv(_PROMPT_WORKSPACE_ENV, "").strip()
+    return value or None
+
+
+def prompt_api_key() -> str | None:
+    """Return an API key that can read the Hub prompt workspace, if configured."""
+    value = os.getenv(_PROMPT_API_KEY_ENV, "").strip()
+    return value or None
+
+
+def hub_client(workspace_id: str | None = None, api_key: str | None = None):
+    """Build a LangSmith client scoped for Hub reads."""
+    from langsmith import Client
+
+    kwargs: dict[str, str] = {}
+    if workspace_id:
+        kwargs["workspace_id"] = workspace_id
+    if api_key:
+        kwargs["api_key"] = api_key
+    return Client(**kwargs)
+
+
+@dataclass(frozen=True)
+class HubPrompt:
+    """A Hub prompt's first message content and the commit it was read from."""
+
+    name: str
+    content: str
+    commit: str | None
+
+
+def _pinned_identifier(hub_name: str, commit: str | None) -> str:
+    """Return ``hub_name`` with its tag replaced by ``commit``, when known."""
+    if not commit:
+        return hub_name
+    base = hub_name.rsplit(":", 1)[0] if ":" in hub_name else hub_name
+    return f"{base}:{commit}"
+
+
+class PromptRegistry:
+    """Fetch Hub prompts concurrently, cache them on disk and serve them without blocking."""
+
+    def __init__(
+        self,
+        cache_path: str | Path | None = PROMPT_CACHE_PATH,
+        *,
+        startup_timeout: float = PROMPT_STARTUP_TIMEOUT_SECONDS,
+        fetch: Callable[[str, str | None], HubPrompt] | None = None,
+        lookup_commit: Callable[[str], str | None] | None = None,
+        max_workers: int = 4,
+    ):
+        """Initialize the registry; nothing is read or fetched until first use.
+
+        ``fetch(hub_name, commit)`` downloads a prompt body and
+        ``lookup_commit(hub_name)`` resolves a tag to its commit hash. Both
+        default to the LangSmith API through one shared Hub client.
+        """
+        self.cache_path = Path(cache_path) if cache_path else None
+        self.startup_timeout = startup_timeout
+        self._fetch = fetch or self._pull_prompt
+        self._lookup_commit = lookup_commit or self._lookup_commit_hash
+        self._max_workers = max_workers
+        self._client = None
+        self._prompts: dict[str, HubPrompt] = {}
+        self._commits: dict[str, str] = {}
+        self._fetches: dict[str, Future] = {}
+        self._commit_lookups: dict[str, Future] = {}
+        self._failed_at: dict[str, float] = {}
+        self._cache_loaded = False
+        self._executor: ThreadPoolExecutor | None = None
+        self._lock = threading.Lock()
+
+    def prefetch(self, hub_names: Iterable[str]) -> None:
+        """Start fetching ``hub_names`` in the background without waiting."""
+        with self._lock:
+            self._load_cache()
+            for hub_name in hub_names:
+                self._start_fetch(hub_name)
+
+    def load(
+        self, hub_names: Iterable[str], timeout: float | None = None
+    ) -> dict[str, HubPrompt]:
+        """Return the available prompts for ``hub_names``.
+
+        Cached prompts are returned immediately (and refreshed in the background).
+        Prompts never seen before are waited for, all at once, for at most
+        ``timeout`` seconds (default: the startup timeout).
+        """
+        hub_names = list(hub_names)
+        with self._lock:
+            self._load_cache()
+            fetches = {hub_name: self._start_fetch(hub_name) for hub_name in hub_names}
+            missing = [
+                fetch
+                for hub_name, fetch in fetches.items()
+                if hub_name not in self._prompts
+            ]
+
+        if missing:
+            wait(missing, timeout=self.startup_timeout if timeout is None else timeout)
+
+        with self._lock:
+            return {
+                hub_name: self._prompts[hub_name]
+                for hub_name in hub_names
+                if hub_name in self._prompts
+            }
+
+    def get(self, hub_name: str, timeout: float | None = 0) -> HubPrompt | None:
+        """Return one prompt; by default without waiting for an in-flight fetch."""
+        return self.load([hub_name], timeout=timeout).get(hub_name)
+
+    def commits(
+        self, hub_names: Iterable[str], timeout: float | None = None
+    ) -> dict[str, str | None]:
+        """Return the current commit of each prompt without fetching prompt bodies.
+
+        Commit lookups for all names run concurrently and are waited for at most
+        ``timeout`` seconds (default: the startup timeout). A lookup already made
+        by a body refresh is reused. A prompt whose lookup has not finished
+        reports the commit of its cached copy, if any.
+        """
+        hub_names = list(hub_names)
+        with self._lock:
+            self._load_cache()
+            lookups = [self._start_commit_lookup(hub_name) for hub_name in hub_names]
+
+        wait(lookups, timeout=self.startup_timeout if timeout is None else timeout)
+
+        with self._lock:
+            result: dict[str, str | None] = {}
+            for hub_name in hub_names:
+                cached = self._prompts.get(hub_name)
+                result[hub_name] = self._commits.get(hub_name) or (
+                    cached.commit if cached else None
+                )
+            return result
+
+    def _start_fetch(self, hub_name: str) -> Future:
+        """Return the fetch for ``hub_name``, starting it once per process.
+
+        A failed fetch is retried, at most once per retry interval, while the
+        prompt is still unavailable.
+        """
+        future = self._fetches.get(hub_name)
+        if future is None or (
+            future.done()
+            and hub_name not in self._prompts
+            and time.monotonic() - self._failed_at.get(hub_name, 0.0)
+            >= PROMPT_RETRY_INTERVAL_SECONDS
+        ):
+            commit_lookup: Future = Future()
+            self._commit_lookups[hub_name] = commit_lookup
+            future = self._submit(self._refresh, hub_name, commit_lookup)
+            self._fetches[hub_name] = future
+        return future
+
+    def _start_commit_lookup(self, hub_name: str) -> Future:
+        """Return a commit lookup for ``hub_name``, starting a commit-only one if needed.
+
+        An in-flight or successful lookup is reused; a failed one is retried.
+        Called with the lock held.
+        """
+        lookup = self._commit_lookups.get(hub_name)
+        if lookup is None or (lookup.done() and lookup.result() is None):
+            lookup = self._submit(self._resolve_commit, hub_name)
+            self._commit_lookups[hub_name] = lookup
+        return lookup
+
+    def _submit(self, fn: Callable[..., Any], *args: Any) -> Future:
+        """Run ``fn`` on the registry's worker pool; called with the lock held."""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self._max_workers, thread_name_prefix="hub-prompts"
+            )
+        return self._executor.submit(fn, *args)
+
+    def _resolve_commit(self, hub_name: str) -> str | None:
+        """Look up and record the prompt's current commit; None if the lookup fails."""
+        try:
+            commit = self._lookup_commit(hub_name)
+        except Exception as e:
+            logger.warning(f"Failed to look up Hub prompt commit for {hub_name}: {e}")
+            return None
+        if commit:
+            with self._lock:
+                self._commits[hub_name] = commit
+        return commit
+
+    def _refresh(self, hub_name: str, commit_lookup: Future) -> None:
+        """Resolve the prompt's commit, then download its body only if it changed."""
+        commit = None
+        try:
+            commit = self._resolve_commit(hub_name)
+        finally:
+            commit_lookup.set_result(commit)
+
+        with self._lock:
+            cached = self._prompts.get(hub_name)
+        if cached is not None and commit and cached.commit == commit:
+            logger.debug(f"Cached Hub prompt {hub_name} is current @ {commit[:8]}")
+            return
+
+        try:
+            prompt = self._fetch(hub_name, commit)
+        except Exception as e:
+            logger.warning(f"Failed to fetch Hub prompt {hub_name}: {e}")
+            with self._lock:
+                self._failed_at[hub_name] = time.monotonic()
+            return
+
+        with self._lock:
+            previous = self._prompts.get(hub_name)
+            self._prompts[hub_name] = prompt
+            changed = previous is None or previous.commit != prompt.commit
+            if changed:
+                self._save_cache()
+
+        if changed:
+            logger.info(
+                f"Loaded Hub prompt {hub_name} @ {(prompt.commit or '')[:8]}"
+                + (" (cache was stale)" if previous is not None else "")
+            )
+
+    def _hub_client(self):
+        """Return the Hub client shared by every lookup of this registry."""
+        with self._lock:
+            if self._client is None:
+                self._client = hub_client(prompt_workspace_id(), prompt_api_key())
+            return self._client
+
+    def _lookup_commit_hash(self, hub_name: str) -> str | None:
+        """Resolve ``hub_name``'s tag (or latest) to a commit without pulling the manifest."""
+        from langsmith.utils import parse_prompt_identifier
+
+        owner, name, ref = parse_prompt_identifier(hub_name)
+        if _COMMIT_HASH_RE.fullmatch(ref):
+            return ref
+
+        client = self._hub_client()
+        if ref == "latest":
+            commits = client.list_prompt_commits(f"{owner}/{name}", limit=1)
+            latest = next(iter(commits), None)
+            return latest.commit_hash if latest else None
+
+        try:
+            response = client.request_with_retries(
+                "GET", f"/repos/{owner}/{name}/tags/{ref}"
+            )
+            return response.json().get("commit_hash")
+        except Exception as e:
+            # The tag endpoint is not part of the client's API; resolve the tag
+            # the way the client does, by pulling the commit and its manifest.
+            logger.info(f"Tag lookup for {hub_name} failed ({e}); pulling the commit")
+            return client.pull_prompt_commit(hub_name).commit_hash
+
+    def _pull_prompt(self, hub_name: str, commit: str | None) -> HubPrompt:
+        """Pull ``hub_name``, pinned to ``commit`` when it is known."""
+        template = self._hub_client().pull_prompt(_pinned_identifier(hub_name, commit))
+        content = template.invoke({"messages": []}).messages[0].content
+        commit = (template.metadata or {}).get("lc_hub_commit_hash") or commit
+        return HubPrompt(name=hub_name, content=content, commit=commit)
+
+    def _load_cache(self) -> None:
+        """Read the cache file once; called with the lock held."""
+        if self._cache_loaded:
+            return
+        self._cache_loaded = True
+        if self.cache_path is None or not self.cache_path.exists():
+            return
+
+        try:
+            entries: dict[str, Any] = json.loads(self.cache_path.read_text())
+            for hub_name, entry in entries.items():
+                self._prompts.setdefault(hub_name, HubPrompt(**entry))
+        except (OSError, ValueError, TypeError) as e:
+            logger.warning(
+                f"Ignoring unreadable Hub prompt cache {self.cache_path}: {e}"
+            )
+
+    def _save_cache(self) -> None:
+        """Atomically rewrite the cache file; called with the lock held."""
+        if self.cache_path is None:
+            return
+
+        try:
+            self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+            payload = {name: asdict(prompt) for name, prompt in self._prompts.items()}
+            with tempfile.NamedTemporaryFile(
+                "w", dir=self.cache_path.parent, delete=False, suffix=".tmp"
+            ) as handle:
+                json.dump(payload, handle)
+            os.replace(handle.name, self.cache_path)
+        except OSError as e:
+            logger.warning(f"Could not write Hub prompt cache {self.cache_path}: {e}")
+
+
+# Shared by the guardrails middleware and prompt provenance.
+prompt_registry = PromptRegistry()
+
+
+__all__ = [
+    "HubPrompt",
+    "PromptRegistry",
+    "hub_client",
+    "prompt_api_key",
+    "prompt_registry",
+    "prompt_workspace_id",
+]
@@ -0,0 +1,101 @@
+"""Bounded reuse of conversation summaries across threads of the same actor.
+
+Regenerating an answer or forking a thread from an earlier message replays the
+same history prefix, so the next compaction would summarize exactly what an
+earlier compaction already did. ``SummaryCache`` stores summaries under a
+content hash of the summarized messages, the previous summary they were folded
+into and the summary prompt version, namespaced by the actor that owns the
+thread, so a hit skips the summary-model call.
+"""
+
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from collections.abc import Sequence
+
+from langchain_core.messages import AnyMessage
+from langgraph.config import get_config
+
+#: Summaries kept per process before the least recently used are evicted.
+SUMMARY_CACHE_MAX_ENTRIES = 1_024
+#: ``configurable`` key the LangGraph server sets to the authenticated user.
+_ACTOR_CONFIG_KEY = "langgraph_auth_user_id"
+
+
+def prompt_version(*prompts: str | None) -> str:
+    """Return a short content hash identifying a set of summary prompts."""
+    text = "\x00".join(prompt or "" for prompt in prompts)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+
+def current_actor() -> str:
+    """Return the authenticated user of the current run, or "" outside one."""
+    try:
+        configurable = get_config().get("configurable", {})
+    except RuntimeError:
+        return ""
+    return str(configurable.get(_ACTOR_CONFIG_KEY) or "")
+
+
+def _message_payload(message: AnyMessage) -> list:
+    """Return the parts of ``message`` a summary prompt is built from, without its id."""
+    return [
+        message.type,
+        message.name,
+        message.content,
+        getattr(message, "tool_calls", None) or None,
+    ]
+
+
+class SummaryCache:
+    """Thread-safe LRU of summaries keyed by actor, prompt version and content."""
+
+    def __init__(self, max_entries: int = SUMMARY_CACHE_MAX_ENTRIES):
+        """Initialize an empty cache holding at most ``max_entries`` summaries."""
+        self.max_entries = max_entries
+        self._summaries: OrderedDict[str, str] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(
+        actor: str,
+        version: str,
+        previous_summary: str | None,
+        messages: Sequence[AnyMessage],
+    ) -> str:
+        """Return the cache key for summarizing ``messages`` onto ``previous_summary``."""
+        payload = json.dumps(
+            [actor, version, previous_summary, [_message_payload(m) for m in messages]],
+            default=str,
+            sort_keys=True,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> str | None:
+        """Return the summary stored under ``key`` and mark it recently used."""
+        with self._lock:
+            summary = self._summaries.get(key)
+            if summary is not None:
+                self._summaries.move_to_end(key)
+            return summary
+
+    def put(self, key: str, summary: str) -> None:
+        """Store ``summary`` under ``key``, evicting the least recently used entry."""
+        with self._lock:
+            self._summaries[key] = summary
+            self._summaries.move_to_end(key)
+            if len(self._summaries) > self.max_entries:
+                self._summaries.popitem(last=False)
+
+    def __len__(self) -> int:
+        """Return the number of cached summaries."""
+        return len(self._summaries)
+
+
+__all__ = [
+    "SUMMARY_CACHE_MAX_ENTRIES",
+    "SummaryCache",
+    "current_actor",
+    "prompt_version",
+]
@@ -0,0 +1,203 @@
+"""Cached, approximate token counts shared by the middleware that sizes history.
+
+Counting the whole history on every model call is linear in the conversation
+length. ``TokenEstimator`` counts each message once, caches the result by message
+id and content fingerprint, and sums cached counts afterwards. The static system
+prompt and tool schemas, which are identical on every call, are counted once.
+Counts follow ``count_tokens_approximately`` with a per-provider characters-per-token
+ratio, including its scaling by provider-reported usage.
+"""
+
+import math
+import operator
+import threading
+from collections.abc import Iterable, Sequence
+from dataclasses import dataclass, replace
+from typing import Any
+
+from langchain_core.messages import AIMessage, AnyMessage, SystemMessage
+from langchain_core.messages.utils import count_tokens_approximately
+
+#: Characters per token by provider prefix of the model id. 3.3 for Anthropic
+#: matches the ratio LangChain's summarization middleware uses for Claude.
+_PROVIDER_CHARS_PER_TOKEN: dict[str, float] = {"anthropic": 3.3}
+_DEFAULT_CHARS_PER_TOKEN = 4.0
+#: Per-message counts kept before the oldest are evicted.
+TOKEN_CACHE_MAX_ENTRIES = 50_000
+#: Conversations whose latest history count is memoized.
+_MAX_MEMOIZED_HISTORIES = 256
+#: Bounds on the usage-metadata scaling factor, as in ``count_tokens_approximately``.
+_MAX_USAGE_SCALE = 1.25
+
+
+def _fingerprint(message: AnyMessage) -> tuple[Any, ...]:
+    """Return a cheap key that changes whenever the counted parts of ``message`` do.
+
+    ``hash`` of a ``str`` is cached on the string, so plain-text messages are
+    fingerprinted in constant time after their first count.
+    """
+    content = message.content
+    content_key = hash(content) if isinstance(content, str) else hash(repr(content))
+    tool_calls = getattr(message, "tool_calls", None)
+    return (
+        message.id,
+        message.type,
+        content_key,
+        hash(repr(tool_calls)) if tool_calls else None,
+        message.name,
+    )
+
+
+@dataclass(frozen=True)
+class _Tally:
+    """Running totals after a prefix of the history, including usage-scaling inputs."""
+
+    tokens: int = 0
+    provider: str | None = None
+    mixed_providers: bool = False
+    reported_tokens: int | None = None
+    estimated_at_report: int = 0
+
+    def add(self, message: AnyMessage, tokens: int) -> "_Tally":
+        """Return the tally after ``message``."""
+        total = self.tokens + tokens
+        if not isinstance(message, AIMessage):
+            return replace(self, tokens=total)
+
+        message_provider = message.response_metadata.get("model_provider")
+        provider, mixed = self.provider, self.mixed_providers
+        if provider is None:
+            provider = message_provider
+        elif message_provider != provider:
+            mixed = True
+        reported, estimated = self.reported_tokens, self.estimated_at_report
+        usage = message.usage_metadata
+        if usage and isinstance(usage.get("total_tokens"), int):
+            reported, estimated = usage["total_tokens"], total
+        return _Tally(total, provider, mixed, reported, estimated)
+
+    def scaled(self, message_count: int) -> int:
+        """Scale by the latest provider-reported usage, as ``count_tokens_approximately`` does."""
+        if (
+            message_count > 1
+            and not self.mixed_providers
+            and self.provider is not None
+            and self.reported_tokens is not None
+            and self.estimated_at_report > 0
+        ):
+            scale = self.reported_tokens / self.estimated_at_report
+            return math.ceil(self.tokens * min(_MAX_USAGE_SCALE, max(1.0, scale)))
+        return self.tokens
+
+
+class TokenEstimator:
+    """Approximate token counter with per-message caching.
+
+    Instances are callable with a list of messages, so they can be passed anywhere
+    a LangChain ``TokenCounter`` is accepted. The latest usage-scaled count of
+    each conversation (keyed by its first message id) is also memoized by message
+    identity, so counting a history that only grew since the last call costs one
+    identity check plus the new messages. Messages are treated as immutable once
+    counted; replace a message rather than editing it in place.
+    """
+
+    def __init__(
+        self,
+        chars_per_token: float = _DEFAULT_CHARS_PER_TOKEN,
+        *,
+        max_entries: int = TOKEN_CACHE_MAX_ENTRIES,
+    ):
+        """Initialize an estimator with an empty cache and no static overhead."""
+        self.chars_per_token = chars_per_token
+        self.max_entries = max_entries
+        self.static_tokens = 0
+        self._counts: dict[tuple[Any, ...], int] = {}
+        self._histories: dict[str | None, tuple[list[AnyMessage], list[_Tally]]] = {}
+        self._lock = threading.Lock()
+
+    def __call__(
+        self,
+        messages: Iterable[AnyMessage],
+        *,
+        use_usage_metadata_scaling: bool = True,
+    ) -> int:
+        """Return the approximate token count of ``messages``.
+
+        With ``use_usage_metadata_scaling``, the estimate is scaled by the most
+        recent provider-reported ``total_tokens`` when all AI messages come from
+        the same provider, as ``count_tokens_approximately`` does.
+        """
+        messages = list(messages)
+        if not use_usage_metadata_scaling:
+            return sum(self.count_message(message) for message in messages)
+
+        if not messages:
+            return 0
+
+        conversation = messages[0].id
+        with self._lock:
+            last_messages, tallies = self._histories.get(conversation, ([], [_Tally()]))
+        known = len(last_messages)
+        if known > len(messages) or not all(map(operator.is_, last_messages, messages)):
+            known, tallies = 0, [_Tally()]
+
+        if known < len(messages):
+            tallies = list(tallies)
+            for message in messages[known:]:
+                tallies.append(tallies[-1].add(message, self.count_message(message)))
+
+        with self._lock:
+            self._histories.pop(conversation, None)
+            self._histories[conversation] = (messages, tallies)
+            if len(self._histories) > _MAX_MEMOIZED_HISTORIES:
+                del self._histories[next(iter(self._histories))]
+        return tallies[len(messages)].scaled(len(messages))
+
+    def count_message(self, message: AnyMessage) -> int:
+        """Return the cached token count of one message, counting it on a miss."""
+        key = _fingerprint(message)
+        count = self._counts.get(key)
+        if count is not None:
+            return count
+
+        count = count_tokens_approximately(
+            [message], chars_per_token=self.chars_per_token
+        )
+        with self._lock:
+            self._counts[key] = count
+            if len(self._counts) > self.max_entries:
+                # Dicts keep insertion order: drop the oldest entry.
+                del self._counts[next(iter(self._counts))]
+        return count
+
+    def precount_static(
+        self,
+        system_prompt: str | None = None,
+        tools: Sequence[Any] = (),
+    ) -> int:
+        """Count the system prompt and tool schemas once and remember the total."""
+        messages = [SystemMessage(content=system_prompt)] if system_prompt else []
+        self.static_tokens = count_tokens_approximately(
+            messages, chars_per_token=self.chars_per_token, tools=list(tools) or None
+        )
+        return self.static_tokens
+
+
+_estimators: dict[str, TokenEstimator] = {}
+_estimators_lock = threading.Lock()
+
+
+def token_estimator_for(model_id: str) -> TokenEstimator:
+    """Return the estimator shared by every consumer of ``model_id``'s provider."""
+    provider = model_id.split(":", 1)[0] if ":" in model_id else model_id
+    with _estimators_lock:
+        estimator = _estimators.get(provider)
+        if estimator is None:
+            estimator = TokenEstimator(
+                _PROVIDER_CHARS_PER_TOKEN.get(provider, _DEFAULT_CHARS_PER_TOKEN)
+            )
+            _estimators[provider] = estimator
+        return estimator
+
+
+__all__ = ["TOKEN_CACHE_MAX_ENTRIES", "TokenEstimator", "token_estimator_for"]
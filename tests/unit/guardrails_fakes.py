@@ -0,0 +1,49 @@
+"""Fake classifier models shared by the guardrails middleware tests."""
+
+import asyncio
+
+from src.middleware.guardrails_middleware import GuardrailsMiddleware
+
+
+class FakeStructuredModel:
+    """Fake structured model that returns or raises queued outcomes."""
+
+    def __init__(self, outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = 0
+
+    def with_structured_output(self, schema):  # noqa: ARG002
+        return self
+
+    async def ainvoke(self, prompt, config=None):  # noqa: ARG002
+        self.calls += 1
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+class SlowStructuredModel(FakeStructuredModel):
+    """Fake structured model that waits before answering."""
+
+    def __init__(self, outcomes, delay: float):
+        super().__init__(outcomes)
+        self.delay = delay
+        self.cancelled = False
+
+    async def ainvoke(self, prompt, config=None):  # noqa: ARG002
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        return await super().ainvoke(prompt, config)
+
+
+def middleware_with_models(
+    *models: tuple[str, FakeStructuredModel],
+) -> GuardrailsMiddleware:
+    middleware = GuardrailsMiddleware.__new__(GuardrailsMiddleware)
+    middleware.classifier_llms = list(models)
+    middleware.block_off_topic = True
+    return middleware
@@ -0,0 +1,86 @@
+"""Tests for latency-aware guardrails timeouts."""
+
+import asyncio
+import os
+
+import pytest
+from langchain_core.messages import HumanMessage
+
+os.environ["USE_LOCAL_PROMPTS"] = "1"
+
+from src.middleware import guardrails_middleware as guardrails_module
+from src.middleware.guardrails_middleware import GuardrailsClassificationError
+from src.utils.latency import RollingLatency
+from tests.unit.guardrails_fakes import SlowStructuredModel, middleware_with_models
+
+
+def test_guardrails_adaptive_timeout_fails_fast_without_retrying(monkeypatch):
+    """A model far slower than its observed latency should time out and not be retried."""
+    monkeypatch.setattr(guardrails_module, "GUARDRAILS_MIN_TIMEOUT_SECONDS", 0.05)
+    monkeypatch.setattr(
+        guardrails_module, "_classifier_latency", RollingLatency(min_samples=5)
+    )
+    for _ in range(5):
+        guardrails_module._classifier_latency.record("primary", 0.01)
+
+    assert guardrails_module._adaptive_timeout("primary") == 0.05
+    assert (
+        guardrails_module._adaptive_timeout("unknown")
+        == guardrails_module.GUARDRAILS_TIMEOUT_SECONDS
+    )
+
+    primary = SlowStructuredModel([], delay=5)
+    middleware = middleware_with_models(("primary", primary))
+
+    with pytest.raises(GuardrailsClassificationError):
+        asyncio.run(
+            middleware._classify_query([HumanMessage(content="How do agents work?")])
+        )
+
+    assert primary.calls == 0
+    assert primary.cancelled
+
+
+def test_guardrails_timeouts_raise_the_adaptive_timeout(monkeypatch):
+    """Timed-out attempts count at their timeout so a slowed model's timeout can grow."""
+    monkeypatch.setattr(guardrails_module, "GUARDRAILS_MIN_TIMEOUT_SECONDS", 0.05)
+    monkeypatch.setattr(
+        guardrails_module, "_classifier_latency", RollingLatency(min_samples=5)
+    )
+    for _ in range(5):
+        guardrails_module._classifier_latency.record("primary", 0.01)
+
+    middleware = middleware_with_models(("primary", SlowStructuredModel([], delay=5)))
+    for _ in range(2):
+        with pytest.raises(GuardrailsClassificationError):
+            asyncio.run(
+                middleware._classify_query(
+                    [HumanMessage(content="How do agents work?")]
+                )
+            )
+
+    assert guardrails_module._adaptive_timeout("primary") == pytest.approx(0.2)
+
+
+def test_guardrails_classification_stops_at_the_callers_deadline(monkeypatch):
+    """Every model and hedge shares the deadline set when the query was evaluated."""
+    monkeypatch.setattr(guardrails_module, "GUARDRAILS_HEDGE_MIN_DELAY_SECONDS", 0.0)
+    monkeypatch.setattr(guardrails_module, "GUARDRAILS_HEDGE_DELAY_SECONDS", 0.01)
+    monkeypatch.setattr(guardrails_module, "_classifier_latency", RollingLatency())
+    middleware = middleware_with_models(
+        ("primary", SlowStructuredModel([], delay=5)),
+        ("fallback", SlowStructuredModel([], delay=5)),
+    )
+
+    async def classify() -> float:
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        with pytest.raises(GuardrailsClassificationError):
+            await middleware._classify_query(
+                [HumanMessage(content="How do agents work?")], deadline=started + 0.1
+            )
+        return loop.time() - started
+
+    assert asyncio.run(classify()) < 1
+    # Attempts cut short by the deadline say nothing about the models' latency.
+    assert guardrails_module._classifier_latency.count("primary") == 0
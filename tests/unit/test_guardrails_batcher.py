@@ -0,0 +1,123 @@
+"""Tests for micro-batched guardrails classification."""
+
+import asyncio
+import os
+
+import pytest
+from langchain_core.messages import HumanMessage
+
+os.environ["USE_LOCAL_PROMPTS"] = "1"
+
+from src.middleware.guardrails_batcher import (
+    GuardrailsBatchError,
+    GuardrailsMicroBatcher,
+)
+from src.middleware.guardrails_middleware import GuardrailsMiddleware
+
+
+def test_batcher_groups_concurrent_requests_up_to_max_size():
+    batches: list[list[str]] = []
+
+    async def classify_batch(queries):
+        batches.append(queries)
+        return [{"decision": "ALLOWED", "explanation": q} for q in queries]
+
+    batcher = GuardrailsMicroBatcher(
+        classify_batch, max_batch_size=3, max_wait_seconds=0.01
+    )
+
+    async def main():
+        return await asyncio.gather(*(batcher.submit(f"q{i}") for i in range(5)))
+
+    results = asyncio.run(main())
+
+    assert [len(batch) for batch in batches] == [3, 2]
+    assert [r["explanation"] for r in results] == ["q0", "q1", "q2", "q3", "q4"]
+
+
+def test_batcher_raises_for_single_query_and_bad_batches():
+    async def classify_batch(queries):
+        return [{"decision": "ALLOWED", "explanation": "only one"}]
+
+    batcher = GuardrailsMicroBatcher(classify_batch, max_wait_seconds=0.001)
+
+    async def lone():
+        return await batcher.submit("alone")
+
+    async def pair():
+        return await asyncio.gather(
+            batcher.submit("a"), batcher.submit("b"), return_exceptions=True
+        )
+
+    with pytest.raises(GuardrailsBatchError):
+        asyncio.run(lone())
+    assert all(isinstance(r, GuardrailsBatchError) for r in asyncio.run(pair()))
+
+
+class FakeBatchModel:
+    def __init__(self, response):
+        self.response = response
+        self.calls = 0
+
+    def with_structured_output(self, schema):  # noqa: ARG002
+        return self
+
+    async def ainvoke(self, prompt, config=None):  # noqa: ARG002
+        self.calls += 1
+        return self.response
+
+
+def _batched_middleware(model) -> GuardrailsMiddleware:
+    middleware = GuardrailsMiddleware.__new__(GuardrailsMiddleware)
+    middleware.classifier_llms = [("primary", model)]
+    middleware.block_off_topic = True
+    middleware.batcher = GuardrailsMicroBatcher(middleware._classify_batch)
+    return middleware
+
+
+def test_middleware_classifies_concurrent_queries_in_one_request():
+    model = FakeBatchModel(
+        {
+            "decisions": [
+                {"id": 1, "decision": "BLOCKED", "explanation": "Recipe."},
+                {"id": 0, "decision": "ALLOWED", "explanation": "LangGraph."},
+            ]
+        }
+    )
+    middleware = _batched_middleware(model)
+
+    async def main():
+        return await asyncio.gather(
+            middleware._classify_query([HumanMessage(content="What is LangGraph?")]),
+            middleware._classify_query([HumanMessage(content="Lasagna recipe?")]),
+        )
+
+    first, second = asyncio.run(main())
+
+    assert model.calls == 1
+    assert first == {"decision": "ALLOWED", "explanation": "LangGraph."}
+    assert second == {"decision": "BLOCKED", "explanation": "Recipe."}
+
+
+def test_batched_query_keeps_notes_about_images_already_reviewed(monkeypatch):
+    submitted: list[str] = []
+
+    async def submit(query):
+        submitted.append(query)
+        return {"decision": "ALLOWED", "explanation": "Same screenshot."}
+
+    middleware = _batched_middleware(FakeBatchModel(None))
+    monkeypatch.setattr(middleware.batcher, "submit", submit)
+    image = {"type": "image_url", "image_url": {"url": "https://example.com/trace.png"}}
+    messages = [
+        HumanMessage(content=[{"type": "text", "text": "Why does this fail?"}, image]),
+        HumanMessage(content=[image]),
+    ]
+
+    result = asyncio.run(middleware._classify_query(messages))
+
+    assert result["decision"] == "ALLOWED"
+    assert "None" not in submitted[0]
+    assert submitted[0].endswith(
+        "User query: [1 image(s) omitted: already reviewed in this conversation]"
+    )
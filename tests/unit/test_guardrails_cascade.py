@@ -0,0 +1,96 @@
+"""Tests for the confidence-based cascade between guardrails models."""
+
+import asyncio
+import os
+
+import pytest
+from langchain_core.messages import HumanMessage
+
+os.environ["USE_LOCAL_PROMPTS"] = "1"
+
+from src.middleware import guardrails_middleware as guardrails_module
+from tests.unit.guardrails_fakes import FakeStructuredModel, middleware_with_models
+
+
+def test_cascade_accepts_confident_primary_and_escalates_uncertain_one():
+    primary = FakeStructuredModel(
+        [
+            {"decision": "ALLOWED", "explanation": "Agents.", "confidence": 0.95},
+            {"decision": "BLOCKED", "explanation": "Unsure.", "confidence": 0.4},
+        ]
+    )
+    fallback = FakeStructuredModel(
+        [
+            {
+                "decision": "ALLOWED",
+                "explanation": "LangSmith tracing.",
+                "confidence": 0.9,
+            }
+        ]
+    )
+    middleware = middleware_with_models(("primary", primary), ("fallback", fallback))
+    middleware.cascade = True
+
+    confident = asyncio.run(
+        middleware._classify_query([HumanMessage(content="How do agents work?")])
+    )
+    escalated = asyncio.run(
+        middleware._classify_query([HumanMessage(content="Can I trace my essay?")])
+    )
+
+    assert confident["explanation"] == "Agents."
+    assert escalated["explanation"] == "LangSmith tracing."
+    assert primary.calls == 2
+    assert fallback.calls == 1
+
+
+def test_cascade_keeps_uncertain_result_when_escalation_fails(monkeypatch):
+    monkeypatch.setattr(guardrails_module, "GUARDRAILS_MAX_RETRIES", 0)
+
+    primary = FakeStructuredModel(
+        [{"decision": "BLOCKED", "explanation": "Unsure.", "confidence": 0.4}]
+    )
+    fallback = FakeStructuredModel([RuntimeError("fallback down")])
+    middleware = middleware_with_models(("primary", primary), ("fallback", fallback))
+    middleware.cascade = True
+
+    result = asyncio.run(
+        middleware._classify_query([HumanMessage(content="Can I trace my essay?")])
+    )
+
+    assert result["explanation"] == "Unsure."
+    assert fallback.calls == 1
+
+
+class SchemaRecordingModel(FakeStructuredModel):
+    """Fake structured model that records the schema and prompt it is given."""
+
+    def __init__(self, outcomes):
+        super().__init__(outcomes)
+        self.schemas: list = []
+        self.prompts: list = []
+
+    def with_structured_output(self, schema):
+        self.schemas.append(schema)
+        return self
+
+    async def ainvoke(self, prompt, config=None):
+        self.prompts.append(str(prompt))
+        return await super().ainvoke(prompt, config)
+
+
+@pytest.mark.parametrize("cascade", [False, True])
+def test_confidence_is_requested_only_when_cascading(cascade):
+    model = SchemaRecordingModel(
+        [{"decision": "ALLOWED", "explanation": "Agents.", "confidence": 0.95}]
+    )
+    middleware = middleware_with_models(("primary", model))
+    middleware.cascade = cascade
+
+    asyncio.run(
+        middleware._classify_query([HumanMessage(content="How do agents work?")])
+    )
+
+    (schema,) = model.schemas
+    assert ("confidence" in schema.__annotations__) is cascade
+    assert ("how confident" in model.prompts[0]) is cascade
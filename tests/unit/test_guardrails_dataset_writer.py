@@ -0,0 +1,96 @@
+"""Tests for the batched guardrails dataset sample writer."""
+
+import asyncio
+from types import SimpleNamespace
+
+from src.middleware.guardrails_dataset_writer import GuardrailsSampleWriter
+
+
+class FakeClient:
+    def __init__(self, failures: int = 0):
+        self.batches: list[list[dict]] = []
+        self.dataset_reads = 0
+        self.failures = failures
+
+    def read_dataset(self, dataset_name: str):  # noqa: ARG002
+        self.dataset_reads += 1
+        return SimpleNamespace(id="dataset-1")
+
+    def create_examples(self, dataset_id: str, examples: list[dict]):
+        assert dataset_id == "dataset-1"
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("LangSmith unavailable")
+        self.batches.append(list(examples))
+
+
+def _writer(failures: int = 0, **kwargs) -> tuple[GuardrailsSampleWriter, FakeClient]:
+    writer = GuardrailsSampleWriter("test-dataset", **kwargs)
+    client = FakeClient(failures)
+    writer._client = client
+    return writer, client
+
+
+def test_writer_batches_samples_with_one_dataset_lookup():
+    writer, client = _writer(batch_size=2, flush_interval=60)
+
+    async def main():
+        for i in range(5):
+            writer.submit(f"question {i}", "ALLOWED", "ok")
+        await writer.aclose()
+
+    asyncio.run(main())
+
+    assert [len(batch) for batch in client.batches] == [2, 2, 1]
+    assert client.dataset_reads == 1
+    assert writer.written == 5
+    assert client.batches[0][0]["outputs"]["classifier"] == "llm"
+
+
+def test_writer_dedupes_near_identical_queries():
+    writer, client = _writer()
+
+    assert writer.submit("How do I use LangGraph?", "ALLOWED", "ok")
+    assert not writer.submit("  how do i use langgraph ", "ALLOWED", "ok")
+    assert writer.submit("how do i use langgraph", "BLOCKED", "inconsistent")
+
+    writer.flush_sync()
+    assert writer.deduplicated == 1
+    assert sum(len(batch) for batch in client.batches) == 2
+
+
+def test_writer_drops_and_counts_when_queue_full():
+    writer, client = _writer(max_queue=2)
+
+    accepted = [writer.submit(f"query {i}", "BLOCKED", "no") for i in range(4)]
+
+    assert accepted == [True, True, False, False]
+    assert writer.dropped == 2
+    writer.flush_sync()
+    assert writer.written == 2
+
+
+def test_failed_write_does_not_mark_the_sample_as_written():
+    writer, client = _writer(failures=1)
+
+    assert writer.submit("How do I use LangGraph?", "ALLOWED", "ok")
+    writer.flush_sync()
+    assert writer.failed == 1
+
+    assert writer.submit("How do I use LangGraph?", "ALLOWED", "ok")
+    writer.flush_sync()
+    assert writer.written == 1
+    assert not writer.submit("How do I use LangGraph?", "ALLOWED", "ok")
+
+
+def test_writer_flushes_when_the_loop_shuts_it_down():
+    writer, client = _writer(flush_interval=60)
+
+    async def main():
+        writer.submit("How do I use LangGraph?", "ALLOWED", "ok")
+        await asyncio.sleep(0)  # Let the writer task start waiting.
+
+    # asyncio.run cancels the still-running writer task on the way out.
+    asyncio.run(main())
+
+    assert writer.written == 1
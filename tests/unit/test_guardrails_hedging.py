@@ -0,0 +1,52 @@
+"""Tests for hedged guardrails classification across the model chain."""
+
+import asyncio
+import os
+
+import pytest
+from langchain_core.messages import HumanMessage
+
+os.environ["USE_LOCAL_PROMPTS"] = "1"
+
+from src.middleware import guardrails_middleware as guardrails_module
+from src.middleware.guardrails_middleware import GuardrailsClassificationError
+from tests.unit.guardrails_fakes import (
+    FakeStructuredModel,
+    SlowStructuredModel,
+    middleware_with_models,
+)
+
+
+def test_guardrails_hedges_slow_primary_and_cancels_loser(monkeypatch):
+    """A slow primary should be hedged to the fallback and cancelled once it wins."""
+    monkeypatch.setattr(guardrails_module, "GUARDRAILS_HEDGE_DELAY_SECONDS", 0.05)
+    monkeypatch.setattr(guardrails_module, "GUARDRAILS_HEDGE_MIN_DELAY_SECONDS", 0.0)
+    guardrails_module._classifier_latency.clear()
+
+    primary = SlowStructuredModel(
+        [{"decision": "BLOCKED", "explanation": "slow"}], delay=5
+    )
+    fallback = FakeStructuredModel(
+        [{"decision": "ALLOWED", "explanation": "LangChain-related question."}]
+    )
+    middleware = middleware_with_models(("primary", primary), ("fallback", fallback))
+
+    result = asyncio.run(
+        middleware._classify_query([HumanMessage(content="How do agents work?")])
+    )
+
+    assert result["decision"] == "ALLOWED"
+    assert primary.cancelled
+    assert fallback.calls == 1
+
+
+def test_guardrails_enforces_single_deadline(monkeypatch):
+    """Classification should give up at the overall deadline, not per attempt."""
+    monkeypatch.setattr(guardrails_module, "GUARDRAILS_DEADLINE_SECONDS", 0.1)
+    primary = SlowStructuredModel([], delay=5)
+    middleware = middleware_with_models(("primary", primary))
+
+    with pytest.raises(GuardrailsClassificationError):
+        asyncio.run(
+            middleware._classify_query([HumanMessage(content="How do agents work?")])
+        )
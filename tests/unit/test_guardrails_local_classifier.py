@@ -0,0 +1,87 @@
+"""Tests for the local first-stage guardrails classifier."""
+
+import asyncio
+import os
+
+from langchain_core.messages import HumanMessage
+from langgraph.runtime import Runtime
+
+os.environ["USE_LOCAL_PROMPTS"] = "1"
+
+from src.middleware.guardrails_local_classifier import (
+    LocalGuardrailsClassifier,
+    load_local_classifier,
+    train_local_classifier,
+)
+from src.middleware.guardrails_middleware import GuardrailsMiddleware
+
+_ALLOWED = [
+    "how do I add memory to a langgraph agent",
+    "langchain retriever returns empty documents",
+    "what is a checkpointer in langgraph",
+    "how to trace runs in langsmith",
+    "stream tokens from a chat model in langchain",
+    "configure tool calling with openai in langchain",
+]
+_BLOCKED = [
+    "write me a poem about the ocean",
+    "give me a recipe for chocolate cake",
+    "who won the football match yesterday",
+    "tell me a bedtime story about dragons",
+    "what is the capital of france",
+    "write a birthday message for my mom",
+]
+
+
+def _trained_classifier() -> LocalGuardrailsClassifier:
+    examples = [(q, "ALLOWED") for q in _ALLOWED] + [(q, "BLOCKED") for q in _BLOCKED]
+    classifier, _ = train_local_classifier(
+        examples * 5, epochs=20, validation_fraction=0
+    )
+    classifier.allow_threshold = 0.2
+    classifier.block_threshold = 0.8
+    return classifier
+
+
+def test_local_classifier_decides_confident_queries_and_round_trips():
+    classifier = _trained_classifier()
+    restored = LocalGuardrailsClassifier.from_artifact(classifier.to_artifact())
+
+    assert (
+        restored.classify("how do I add memory to a langgraph agent")["decision"]
+        == "ALLOWED"
+    )
+    assert restored.classify("write me a poem about the ocean")["decision"] == "BLOCKED"
+    assert restored.classify("") is None
+
+
+def test_local_classifier_escalates_uncertain_queries():
+    classifier = LocalGuardrailsClassifier(weights={}, bias=0.0)
+
+    assert classifier.blocked_probability("anything at all") == 0.5
+    assert classifier.classify("anything at all") is None
+
+
+def test_load_local_classifier_missing_artifact_returns_none(tmp_path):
+    assert load_local_classifier(tmp_path / "missing.json") is None
+
+
+def test_middleware_skips_llm_for_confident_local_decision(monkeypatch):
+    middleware = GuardrailsMiddleware.__new__(GuardrailsMiddleware)
+    middleware.classifier_llms = []
+    middleware.block_off_topic = True
+    middleware.local_classifier = _trained_classifier()
+
+    async def _unexpected_llm_call(messages):  # noqa: ARG001
+        raise AssertionError("LLM classifier should not be called")
+
+    monkeypatch.setattr(middleware, "_classify_query", _unexpected_llm_call)
+
+    result = asyncio.run(
+        middleware.abefore_agent(
+            {"messages": [HumanMessage(content="what is a checkpointer in langgraph")]},
+            Runtime(context=None),
+        )
+    )
+
+    assert result is None
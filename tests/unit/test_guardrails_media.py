@@ -0,0 +1,60 @@
+"""Tests for guardrails image preprocessing."""
+
+import base64
+import io
+
+from langchain_core.messages import HumanMessage
+from PIL import Image
+
+from src.middleware import guardrails_media
+from src.middleware.guardrails_media import (
+    prepare_guardrails_media,
+    seen_image_fingerprints,
+)
+
+
+def _image_block(size: tuple[int, int]) -> dict:
+    buffer = io.BytesIO()
+    Image.effect_noise(size, 64).convert("RGB").save(buffer, format="PNG")
+    encoded = base64.b64encode(buffer.getvalue()).decode()
+    return {
+        "type": "image_url",
+        "image_url": {"url": f"data:image/png;base64,{encoded}"},
+    }
+
+
+def test_prepare_guardrails_media_downscales_large_images():
+    block = _image_block((2000, 1200))
+
+    prepared = prepare_guardrails_media(
+        [{"type": "text", "text": "what is this?"}, block]
+    )
+
+    url = prepared[1]["image_url"]["url"]
+    assert url.startswith("data:image/jpeg;base64,")
+    assert len(url) < len(block["image_url"]["url"])
+    with Image.open(io.BytesIO(base64.b64decode(url.split(",", 1)[1]))) as image:
+        assert max(image.size) <= guardrails_media.GUARDRAILS_IMAGE_MAX_SIDE
+
+
+def test_prepare_guardrails_media_skips_images_seen_earlier_in_thread():
+    block = _image_block((64, 64))
+    earlier = HumanMessage(content=[{"type": "text", "text": "first"}, block])
+
+    prepared = prepare_guardrails_media(
+        [{"type": "text", "text": "again"}, block], seen_image_fingerprints([earlier])
+    )
+
+    assert [b["type"] for b in prepared] == ["text", "text"]
+    assert "already reviewed" in prepared[1]["text"]
+
+
+def test_prepare_guardrails_media_caps_image_count(monkeypatch):
+    monkeypatch.setattr(guardrails_media, "GUARDRAILS_MAX_IMAGES", 1)
+
+    prepared = prepare_guardrails_media(
+        [_image_block((32, 32)), _image_block((48, 48))]
+    )
+
+    assert prepared[0]["type"] == "image_url"
+    assert prepared[1] == {"type": "text", "text": "[1 more image(s) omitted]"}
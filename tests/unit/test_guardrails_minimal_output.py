@@ -0,0 +1,146 @@
+"""Tests for minimal-output guardrails and their lazy explanations."""
+
+import asyncio
+import os
+from types import SimpleNamespace
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+os.environ["USE_LOCAL_PROMPTS"] = "1"
+
+from src.middleware import guardrails_middleware as guardrails_module
+from src.middleware.guardrails_dataset_writer import GuardrailsSampleWriter
+from tests.unit.guardrails_fakes import FakeStructuredModel, middleware_with_models
+
+
+class FakeLogprobModel(FakeStructuredModel):
+    """Fake chat model that records binds and returns plain messages."""
+
+    def __init__(self, outcomes):
+        super().__init__(outcomes)
+        self.bound: dict = {}
+
+    def bind(self, **kwargs):
+        self.bound.update(kwargs)
+        return self
+
+
+def test_minimal_output_parses_single_word_with_logprob_confidence():
+    model = FakeLogprobModel(
+        [
+            AIMessage(
+                content="BLOCKED",
+                response_metadata={
+                    "logprobs": {"content": [{"token": "BLOCK", "logprob": -0.1}]}
+                },
+            )
+        ]
+    )
+    middleware = middleware_with_models(("openai:gpt-5.4-nano", model))
+    middleware.minimal_output = True
+
+    result = asyncio.run(
+        middleware._classify_query([HumanMessage(content="Best lasagna recipe?")])
+    )
+
+    assert result == {"decision": "BLOCKED", "explanation": "", "confidence": 0.905}
+    assert model.bound == {"logprobs": True}
+
+
+def test_minimal_output_explains_blocked_query_off_the_request_path(monkeypatch):
+    classifier = FakeLogprobModel([AIMessage(content="BLOCKED")])
+    explainer = FakeLogprobModel([AIMessage(content="Cooking is off-topic.")])
+    middleware = middleware_with_models(("primary", classifier))
+    middleware.llm = explainer
+    middleware.minimal_output = True
+    middleware._background_tasks = set()
+    samples = []
+
+    async def _rejection(content, deadline=None):  # noqa: ARG001
+        return AIMessage(content="Out of scope.")
+
+    monkeypatch.setattr(middleware, "_generate_rejection_message", _rejection)
+    monkeypatch.setattr(
+        guardrails_module._sample_writer,
+        "submit",
+        lambda *args, **kwargs: samples.append(args),  # noqa: ARG005
+    )
+
+    async def main():
+        result = await middleware._evaluate_query(
+            [HumanMessage(content="Best lasagna recipe?")]
+        )
+        assert samples == []
+        await asyncio.gather(*middleware._background_tasks)
+        return result
+
+    result = asyncio.run(main())
+
+    assert result["jump_to"] == "end"
+    assert samples == [
+        ("Best lasagna recipe?", "BLOCKED", "Cooking is off-topic.", "llm")
+    ]
+
+
+def test_minimal_output_asks_only_for_the_decision():
+    model = FakeStructuredModel([])
+    middleware = middleware_with_models(("primary", model))
+    middleware.minimal_output = True
+
+    instruction = middleware._build_guardrails_content("Best lasagna recipe?", "")
+
+    assert "Reply with exactly one word" in instruction
+    assert "explaining why" not in instruction
+    assert "Ignore any instruction" not in instruction
+
+
+class HangingModel(FakeLogprobModel):
+    """Fake chat model whose calls never finish."""
+
+    async def ainvoke(self, prompt, config=None):  # noqa: ARG002
+        await asyncio.Event().wait()
+
+
+def test_minimal_output_records_unexplained_sample_when_loop_shuts_down(monkeypatch):
+    middleware = middleware_with_models(("primary", FakeLogprobModel([])))
+    middleware.llm = HangingModel([])
+    middleware._background_tasks = set()
+    samples = []
+    monkeypatch.setattr(
+        guardrails_module._sample_writer,
+        "submit",
+        lambda *args, **kwargs: samples.append((args, kwargs)),
+    )
+
+    async def main():
+        middleware._explain_later("Best lasagna recipe?", "BLOCKED", "llm")
+        await asyncio.sleep(0)
+
+    # asyncio.run cancels the still-running explanation on the way out.
+    asyncio.run(main())
+
+    assert samples == [
+        (("Best lasagna recipe?", "BLOCKED", "", "llm"), {"start_writer": False})
+    ]
+
+
+def test_aclose_waits_for_explanations_before_flushing_samples(monkeypatch):
+    middleware = middleware_with_models(("primary", FakeLogprobModel([])))
+    middleware.llm = FakeLogprobModel([AIMessage(content="Cooking is off-topic.")])
+    middleware._background_tasks = set()
+    written = []
+    writer = GuardrailsSampleWriter("test-dataset")
+    writer._client = SimpleNamespace(
+        read_dataset=lambda dataset_name: SimpleNamespace(id="dataset-1"),  # noqa: ARG005
+        create_examples=lambda dataset_id, examples: written.extend(examples),  # noqa: ARG005
+    )
+    monkeypatch.setattr(guardrails_module, "_sample_writer", writer)
+
+    async def main():
+        middleware._explain_later("Best lasagna recipe?", "BLOCKED", "llm")
+        await middleware.aclose()
+
+    asyncio.run(main())
+
+    [example] = written
+    assert example["outputs"]["explanation"] == "Cooking is off-topic."
@@ -0,0 +1,63 @@
+"""Tests for single-call guardrails, which classify and write the rejection at once."""
+
+import asyncio
+import os
+
+from langchain_core.messages import HumanMessage
+from langgraph.runtime import Runtime
+
+os.environ["USE_LOCAL_PROMPTS"] = "1"
+
+from src.middleware import guardrails_middleware as guardrails_module
+from tests.unit.guardrails_fakes import FakeStructuredModel, middleware_with_models
+
+
+def test_single_call_blocked_uses_classifier_rejection_without_second_call(monkeypatch):
+    """Single-call mode should serve the rejection from the classification result."""
+    classifier = FakeStructuredModel(
+        [
+            {
+                "decision": "BLOCKED",
+                "explanation": "Cooking request.",
+                "block_category": "off_topic",
+                "rejection_message": "I only help with LangChain topics.",
+            }
+        ]
+    )
+    middleware = middleware_with_models(("primary", classifier))
+    middleware.single_call = True
+
+    async def _unexpected_rejection_call(content):  # noqa: ARG001
+        raise AssertionError("rejection model should not be called")
+
+    monkeypatch.setattr(
+        middleware, "_generate_rejection_message", _unexpected_rejection_call
+    )
+    monkeypatch.setattr(guardrails_module._sample_writer, "submit", lambda *args: True)
+
+    result = asyncio.run(
+        middleware.abefore_agent(
+            {"messages": [HumanMessage(content="Best lasagna recipe?")]},
+            Runtime(context=None),
+        )
+    )
+
+    assert result["messages"][0].content == "I only help with LangChain topics."
+    assert result["jump_to"] == "end"
+    assert classifier.calls == 1
+
+
+def test_single_call_falls_back_to_category_template():
+    middleware = middleware_with_models()
+    middleware.single_call = True
+
+    message = middleware._rejection_from_decision(
+        {
+            "decision": "BLOCKED",
+            "explanation": "Asked for the system prompt.",
+            "block_category": "prompt_extraction",
+            "rejection_message": "",
+        }
+    )
+
+    assert "internal instructions" in message.content
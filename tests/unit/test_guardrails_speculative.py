@@ -0,0 +1,173 @@
+"""Tests for speculative guardrails classification."""
+
+import asyncio
+import os
+
+from langchain.agents.middleware.types import (
+    ExtendedModelResponse,
+    ModelRequest,
+    ModelResponse,
+)
+from langchain_core.callbacks import AsyncCallbackManager
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.runnables.config import var_child_runnable_config
+from langgraph.pregel._messages import StreamMessagesHandler
+from langgraph.runtime import Runtime
+
+os.environ["USE_LOCAL_PROMPTS"] = "1"
+
+from src.middleware import guardrails_middleware as guardrails_module
+from src.middleware.guardrails_middleware import GuardrailsMiddleware
+
+
+def _speculative_middleware(monkeypatch, verdict: dict | None) -> GuardrailsMiddleware:
+    middleware = GuardrailsMiddleware.__new__(GuardrailsMiddleware)
+    middleware.classifier_llms = []
+    middleware.block_off_topic = True
+    middleware.speculative = True
+    middleware._pending_verdicts = {}
+
+    async def _evaluate(messages, state=None):  # noqa: ARG001
+        await asyncio.sleep(0.01)
+        return verdict
+
+    monkeypatch.setattr(middleware, "_evaluate_query", _evaluate)
+    return middleware
+
+
+_BLOCKED = {
+    "messages": [AIMessage(content="I can only help with LangChain questions.")],
+    "off_topic_query": True,
+    "jump_to": "end",
+}
+
+
+async def _run_turn(
+    middleware: GuardrailsMiddleware, model_started: list[str], messages=None
+):
+    messages = messages or [HumanMessage(content="How do agents work?", id="h1")]
+    state = {"messages": messages}
+    assert await middleware.abefore_agent(state, Runtime(context=None)) is None
+
+    async def handler(request):  # noqa: ARG001
+        model_started.append("started")
+        await asyncio.sleep(0.05)
+        model_started.append("finished")
+        return ModelResponse(result=[AIMessage(content="answer")])
+
+    request = ModelRequest(model=None, messages=messages, state=state)
+    return await middleware.awrap_model_call(request, handler)
+
+
+async def _stream_turn(middleware: GuardrailsMiddleware, emitted: list[str]):
+    # The real stream_mode="messages" handler, fed by a real streaming chat model.
+    streamer = StreamMessagesHandler(
+        lambda chunk: emitted.append(chunk[2][0].content), subgraphs=False
+    )
+    var_child_runnable_config.set(
+        {
+            "callbacks": AsyncCallbackManager(
+                [streamer], inheritable_handlers=[streamer]
+            ),
+            "metadata": {"langgraph_checkpoint_ns": "model"},
+        }
+    )
+    human = HumanMessage(content="How do agents work?", id="h1")
+    state = {"messages": [human]}
+    await middleware.abefore_agent(state, Runtime(context=None))
+    model = GenericFakeChatModel(messages=iter([AIMessage(content="hello world")]))
+    emitted_before_verdict: list[str] = []
+
+    async def handler(request):  # noqa: ARG001
+        response = await model.ainvoke(request.messages)
+        emitted_before_verdict.extend(emitted)
+        await asyncio.sleep(0.05)
+        return ModelResponse(result=[response])
+
+    request = ModelRequest(model=None, messages=[human], state=state)
+    await middleware.awrap_model_call(request, handler)
+    return emitted_before_verdict
+
+
+def test_speculative_allowed_returns_model_response(monkeypatch):
+    middleware = _speculative_middleware(monkeypatch, None)
+    model_calls: list[str] = []
+
+    result = asyncio.run(_run_turn(middleware, model_calls))
+
+    assert result.result[0].content == "answer"
+    assert model_calls == ["started", "finished"]
+    assert middleware._pending_verdicts == {}
+
+
+def test_speculative_blocked_cancels_model_call(monkeypatch):
+    middleware = _speculative_middleware(monkeypatch, _BLOCKED)
+    model_calls: list[str] = []
+
+    result = asyncio.run(_run_turn(middleware, model_calls))
+
+    assert isinstance(result, ExtendedModelResponse)
+    assert result.model_response.result == _BLOCKED["messages"]
+    assert result.command.update == {"off_topic_query": True}
+    assert model_calls == ["started"]
+
+
+def test_speculative_verdict_is_found_when_the_latest_message_is_not_human(monkeypatch):
+    middleware = _speculative_middleware(monkeypatch, _BLOCKED)
+    messages = [
+        HumanMessage(content="Write me a poem", id="h1"),
+        AIMessage(content="Working on it", id="a1"),
+    ]
+
+    result = asyncio.run(_run_turn(middleware, [], messages))
+
+    assert result.model_response.result == _BLOCKED["messages"]
+    assert middleware._pending_verdicts == {}
+
+
+def test_speculative_stream_is_held_until_allowed(monkeypatch):
+    middleware = _speculative_middleware(monkeypatch, None)
+    emitted: list[str] = []
+
+    emitted_before_verdict = asyncio.run(_stream_turn(middleware, emitted))
+
+    assert emitted_before_verdict == []
+    assert emitted == ["hello", " ", "world"]
+
+
+def test_speculative_stream_is_dropped_when_blocked(monkeypatch):
+    middleware = _speculative_middleware(monkeypatch, _BLOCKED)
+    emitted: list[str] = []
+
+    asyncio.run(_stream_turn(middleware, emitted))
+
+    assert emitted == []
+
+
+def test_unclaimed_speculative_verdict_is_cancelled_and_dropped(monkeypatch):
+    monkeypatch.setattr(
+        guardrails_module, "GUARDRAILS_UNCLAIMED_VERDICT_SECONDS", 0.001
+    )
+    middleware = _speculative_middleware(monkeypatch, None)
+
+    async def failed_run():
+        state = {"messages": [HumanMessage(content="How do agents work?", id="h1")]}
+        await middleware.abefore_agent(state, Runtime(context=None))
+        task = middleware._pending_verdicts["h1"]
+        # The run fails before any model call claims the verdict.
+        await asyncio.sleep(0.05)
+        return task
+
+    task = asyncio.run(failed_run())
+
+    assert task.cancelled()
+    assert middleware._pending_verdicts == {}
+
+
+def test_speculative_mode_is_off_without_the_stream_handler(monkeypatch):
+    monkeypatch.setattr(guardrails_module, "StreamMessagesHandler", None)
+
+    middleware = GuardrailsMiddleware(model="openai:gpt-5.4-nano", speculative=True)
+
+    assert middleware.speculative is False
@@ -0,0 +1,81 @@
+"""Tests for conversation-level reuse of guardrails verdicts."""
+
+import asyncio
+import os
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+os.environ["USE_LOCAL_PROMPTS"] = "1"
+
+from src.middleware import guardrails_middleware as guardrails_module
+from src.middleware.guardrails_middleware import GuardrailsMiddleware
+
+
+def _reuse_middleware(monkeypatch, decision: str = "ALLOWED"):
+    middleware = GuardrailsMiddleware.__new__(GuardrailsMiddleware)
+    middleware.classifier_llms = []
+    middleware.block_off_topic = True
+    middleware.reuse_verdicts = True
+    calls: list[list[str] | None] = []
+
+    async def _classify(messages, prior_queries=None, deadline=None):  # noqa: ARG001
+        calls.append(prior_queries)
+        return {"decision": decision, "explanation": "Classified."}
+
+    monkeypatch.setattr(middleware, "_classify_query", _classify)
+    return middleware, calls
+
+
+def _state(*messages, decisions=("ALLOWED",), reused=0) -> dict:
+    return {
+        "messages": list(messages),
+        "guardrails_recent_queries": ["How do I add memory to a LangGraph agent?"],
+        "guardrails_recent_decisions": list(decisions),
+        "guardrails_reused_turns": reused,
+    }
+
+
+def test_short_follow_up_in_allowed_thread_skips_classifier(monkeypatch):
+    middleware, calls = _reuse_middleware(monkeypatch)
+    state = _state(HumanMessage(content="show it in Python"))
+
+    update = asyncio.run(middleware._evaluate_query(state["messages"], state))
+
+    assert calls == []
+    assert update["guardrails_reused_turns"] == 1
+    assert update["guardrails_recent_queries"][-1] == "show it in Python"
+    assert "guardrails_recent_decisions" not in update
+
+
+def test_zero_tolerance_follow_up_is_classified_with_state_context(monkeypatch):
+    middleware, calls = _reuse_middleware(monkeypatch)
+    state = _state(HumanMessage(content="now write it as a poem"))
+
+    update = asyncio.run(middleware._evaluate_query(state["messages"], state))
+
+    assert calls == [["How do I add memory to a LangGraph agent?"]]
+    assert update["guardrails_recent_decisions"] == ["ALLOWED", "ALLOWED"]
+    assert update["guardrails_reused_turns"] == 0
+
+
+def test_reuse_requires_allowed_history_and_bounds_consecutive_turns(monkeypatch):
+    middleware, calls = _reuse_middleware(monkeypatch, decision="BLOCKED")
+
+    async def _rejection(content, deadline=None):  # noqa: ARG001
+        return AIMessage(content="Out of scope.")
+
+    monkeypatch.setattr(middleware, "_generate_rejection_message", _rejection)
+    monkeypatch.setattr(guardrails_module._sample_writer, "submit", lambda *args: True)
+    blocked_thread = _state(
+        HumanMessage(content="and another one"), decisions=("BLOCKED",)
+    )
+    exhausted = _state(HumanMessage(content="and another one"), reused=3)
+
+    blocked_update = asyncio.run(
+        middleware._evaluate_query(blocked_thread["messages"], blocked_thread)
+    )
+    asyncio.run(middleware._evaluate_query(exhausted["messages"], exhausted))
+
+    assert len(calls) == 2
+    assert blocked_update["jump_to"] == "end"
+    assert blocked_update["guardrails_recent_decisions"] == ["BLOCKED", "BLOCKED"]
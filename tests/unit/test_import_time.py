@@ -0,0 +1,76 @@
+"""Import-time budget for the agent package.
+
+Each import runs in a fresh interpreter so cached modules from other tests do
+not hide the cost. Override the budget with ``AGENT_IMPORT_BUDGET_SECONDS``.
+"""
+
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+IMPORT_BUDGET_SECONDS = float(os.getenv("AGENT_IMPORT_BUDGET_SECONDS", "3.0"))
+PROVIDER_PACKAGES = (
+    "langchain_anthropic",
+    "langchain_google_genai",
+    "langchain_openai",
+    "anthropic",
+    "openai",
+    "google.genai",
+)
+
+_PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - started
+providers = sorted(
+    name for name in {providers!r} if name in sys.modules
+)
+print(json.dumps({{"seconds": elapsed, "providers": providers}}))
+"""
+
+
+def _import_in_fresh_interpreter(module: str) -> dict:
+    env = {
+        **os.environ,
+        "USE_LOCAL_PROMPTS": "1",
+        "LANGSMITH_TRACING": "false",
+        "OPENAI_API_KEY": os.getenv("OPENAI_API_KEY", "test"),
+        "ANTHROPIC_API_KEY": os.getenv("ANTHROPIC_API_KEY", "test"),
+        "GOOGLE_API_KEY": os.getenv("GOOGLE_API_KEY", "test"),
+    }
+    completed = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            _PROBE.format(module=module, providers=PROVIDER_PACKAGES),
+        ],
+        cwd=REPO_ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+        timeout=120,
+    )
+    assert completed.returncode == 0, completed.stderr.strip()[-2000:]
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def test_config_and_guardrails_import_no_provider_packages():
+    result = _import_in_fresh_interpreter(
+        "src.agent.config, src.middleware.guardrails_middleware"
+    )
+
+    assert result["providers"] == []
+
+
+def test_agent_import_within_budget():
+    result = _import_in_fresh_interpreter("agent")
+
+    assert result["providers"] == []
+    assert result["seconds"] <= IMPORT_BUDGET_SECONDS, (
+        f"import agent took {result['seconds']:.2f}s "
+        f"(budget {IMPORT_BUDGET_SECONDS:.2f}s)"
+    )
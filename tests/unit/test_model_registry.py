@@ -0,0 +1,107 @@
+"""Tests for the shared model registry."""
+
+import asyncio
+
+from langchain.agents.middleware.types import ModelRequest
+
+from src.agent import config
+from src.middleware.retry_policy import AttemptBudget, attempt_scope
+
+
+class FakeChatModel:
+    def __init__(self, model: str, **kwargs):
+        self.model = model
+        self.kwargs = kwargs
+
+
+def test_registry_shares_one_instance_per_model_and_settings():
+    assert config.get_chat_model("openai:gpt-5.4-nano") is config.get_chat_model(
+        "openai:gpt-5.4-nano"
+    )
+    assert config.get_chat_model(
+        "openai:gpt-5.4-nano", temperature=0
+    ) is not config.get_chat_model("openai:gpt-5.4-nano")
+
+
+def test_fallback_middleware_and_summary_chain_share_models():
+    summary_fallbacks = [
+        fallback.bound.first for fallback in config.summarization_model.fallbacks
+    ]
+
+    assert config.model_fallback_middleware.models == summary_fallbacks
+
+
+def test_fallback_middleware_uses_registry_models_and_counts_fallbacks(monkeypatch):
+    monkeypatch.setattr(config, "_model_registry", {})
+    monkeypatch.setattr(config, "init_chat_model", FakeChatModel)
+    seen: list[object] = []
+
+    async def handler(request):
+        seen.append(request.model)
+        if len(seen) == 1:
+            raise TimeoutError("timed out")
+        return "answer"
+
+    middleware = config.LazyModelFallbackMiddleware("openai:gpt-5.4-nano")
+    # The agent factory builds the primary itself, with the SDK's own retries.
+    primary = FakeChatModel("gemini-3.5-flash-lite", max_retries=6)
+    budget = AttemptBudget(max_retries=1)
+    with attempt_scope(budget):
+        result = asyncio.run(
+            middleware.awrap_model_call(
+                ModelRequest(model=primary, messages=[]), handler
+            )
+        )
+
+    assert result == "answer"
+    assert [model.model for model in seen] == [
+        config.DEFAULT_MODEL.id,
+        "openai:gpt-5.4-nano",
+    ]
+    assert all(model.kwargs == {"max_retries": 0} for model in seen)
+    assert (budget.attempts, budget.retries) == (2, 1)
+
+
+def test_prewarm_builds_models_once(monkeypatch):
+    built: list[str] = []
+
+    def fake_init_chat_model(model: str, **kwargs):
+        built.append(model)
+        return FakeChatModel(model, **kwargs)
+
+    monkeypatch.setattr(config, "init_chat_model", fake_init_chat_model)
+    models = [
+        config.LazyChatModel("openai:prewarm-test", temperature=0),
+        config.LazyChatModel("anthropic:prewarm-test"),
+    ]
+
+    config.prewarm_models(models).join(timeout=5)
+    config.prewarm_models(models).join(timeout=5)
+    resolved = models[0].resolve()
+
+    assert built == ["openai:prewarm-test", "anthropic:prewarm-test"]
+    assert resolved.kwargs == {"max_retries": 0, "temperature": 0}
+
+
+def test_context_budget_is_bounded_by_window_speed_and_price():
+    haiku = config.MODELS["claude-haiku-4.5"]
+    budget = haiku.context_budget()
+
+    assert (
+        budget.trigger_tokens
+        <= haiku.context_window * config.SUMMARIZATION_WINDOW_FRACTION
+    )
+    assert budget.keep_tokens < budget.presummarize_tokens < budget.trigger_tokens
+    assert budget.trigger_tokens < config.DEFAULT_MODEL.context_budget().trigger_tokens
+
+
+def test_response_model_names_resolve_to_registered_models():
+    assert (
+        config.model_config_for("gpt-5.4-nano-2026-03-01")
+        is config.MODELS["gpt-5.4-nano"]
+    )
+    assert (
+        config.model_config_for("models/gemini-3.5-flash-lite") is config.DEFAULT_MODEL
+    )
+    assert config.model_config_for("unknown-model") is None
+    assert config.context_budget_for(None) == config.DEFAULT_MODEL.context_budget()
@@ -2,13 +2,35 @@
 
 from __future__ import annotations
 
+import threading
+import time
+from types import SimpleNamespace
+
 from src.utils import prompt_provenance as provenance
+from src.utils.prompt_registry import HubPrompt, PromptRegistry
 
 
 class _FakeTemplate:
     def __init__(self, commit: str | None):
         self.metadata = {"lc_hub_commit_hash": commit} if commit else {}
 
+    def invoke(self, inputs):  # noqa: ARG002
+        return SimpleNamespace(messages=[SimpleNamespace(content="prompt")])
+
+
+class _FakeResponse:
+    def __init__(self, payload: dict):
+        self.payload = payload
+
+    def json(self) -> dict:
+        return self.payload
+
+
+def _fresh_registry(monkeypatch, tmp_path) -> PromptRegistry:
+    registry = PromptRegistry(tmp_path / "hub_prompts.json")
+    monkeypatch.setattr(provenance, "prompt_registry", registry)
+    return registry
+
 
 def test_get_prompt_provenance_local_mode(monkeypatch):
     monkeypatch.setattr(provenance, "_USE_LOCAL_PROMPTS", True)
@@ -21,8 +43,10 @@ def test_get_prompt_provenance_local_mode(monkeypatch):
     assert "prompt_commit" not in result
 
 
-def test_resolve_hub_provenance_uses_prompt_workspace_and_api_key(monkeypatch):
-    provenance._resolve_hub_provenance.cache_clear()
+def test_resolve_hub_provenance_uses_prompt_workspace_and_api_key(
+    monkeypatch, tmp_path
+):
+    _fresh_registry(monkeypatch, tmp_path)
     monkeypatch.setattr(provenance, "_USE_LOCAL_PROMPTS", False)
     monkeypatch.setenv(
         "LANGSMITH_PROMPT_WORKSPACE_ID", "ebbaf2eb-769b-4505-aca2-d11de10372a4"
@@ -35,8 +59,12 @@ def test_resolve_hub_provenance_uses_prompt_workspace_and_api_key(monkeypatch):
         def __init__(self, *args, **kwargs):
             constructed.append(kwargs)
 
+        def request_with_retries(self, method: str, path: str, **kwargs):  # noqa: ARG002
+            assert method == "GET"
+            return _FakeResponse({"commit_hash": f"commit-for-{path}"})
+
         def pull_prompt(self, hub_name: str):
-            return _FakeTemplate(f"commit-for-{hub_name}")
+            return _FakeTemplate(hub_name.rsplit(":", 1)[1])
 
     import langsmith
 
@@ -44,22 +72,24 @@ def test_resolve_hub_provenance_uses_prompt_workspace_and_api_key(monkeypatch):
 
     result = provenance.get_prompt_provenance("docs_agent")
 
-    assert len(constructed) == 2
-    assert all(
-        call.get("workspace_id") == "ebbaf2eb-769b-4505-aca2-d11de10372a4"
-        and call.get("api_key") == "lsv2_prompt_test_key"
-        for call in constructed
-    )
+    assert constructed == [
+        {
+            "workspace_id": "ebbaf2eb-769b-4505-aca2-d11de10372a4",
+            "api_key": "lsv2_prompt_test_key",
+        }
+    ]
     assert result["prompt_commit"] == (
-        "commit-for-public-chat-langchain-test:production"
+        "commit-for-/repos/-/public-chat-langchain-test/tags/production"
     )
     assert result["guardrails_prompt_commit"] == (
-        "commit-for-public-chat-langchain-guardrails-test:production"
+        "commit-for-/repos/-/public-chat-langchain-guardrails-test/tags/production"
     )
 
 
-def test_resolve_hub_provenance_without_overrides_uses_default_client(monkeypatch):
-    provenance._resolve_hub_provenance.cache_clear()
+def test_resolve_hub_provenance_without_overrides_uses_default_client(
+    monkeypatch, tmp_path
+):
+    _fresh_registry(monkeypatch, tmp_path)
     monkeypatch.setattr(provenance, "_USE_LOCAL_PROMPTS", False)
     monkeypatch.delenv("LANGSMITH_PROMPT_WORKSPACE_ID", raising=False)
     monkeypatch.delenv("LANGSMITH_PROMPT_API_KEY", raising=False)
@@ -70,7 +100,10 @@ def test_resolve_hub_provenance_without_overrides_uses_default_client(monkeypatc
         def __init__(self, *args, **kwargs):
             constructed.append(kwargs)
 
-        def pull_prompt(self, hub_name: str):
+        def request_with_retries(self, method: str, path: str, **kwargs):  # noqa: ARG002
+            return _FakeResponse({})
+
+        def pull_prompt(self, hub_name: str):  # noqa: ARG002
             return _FakeTemplate(None)
 
     import langsmith
@@ -79,6 +112,112 @@ def test_resolve_hub_provenance_without_overrides_uses_default_client(monkeypatc
 
     result = provenance.get_prompt_provenance("docs_agent")
 
-    assert constructed == [{}, {}]
+    assert constructed == [{}]
     assert result["prompt_source"].startswith("hub:")
     assert "prompt_commit" not in result
+
+
+def test_commit_lookup_pulls_the_commit_when_the_tag_lookup_fails(tmp_path):
+    class FakeClient:
+        def request_with_retries(self, method: str, path: str, **kwargs):  # noqa: ARG002
+            raise ConnectionError(f"404 for {path}")
+
+        def pull_prompt_commit(self, hub_name: str):
+            assert hub_name == "guardrails:production"
+            return SimpleNamespace(commit_hash="c-from-manifest")
+
+    registry = PromptRegistry(tmp_path / "hub_prompts.json")
+    registry._client = FakeClient()
+
+    assert registry._lookup_commit_hash("guardrails:production") == "c-from-manifest"
+
+
+def test_commit_lookup_uses_the_latest_listed_commit(tmp_path):
+    class FakeClient:
+        def list_prompt_commits(self, prompt_identifier: str, *, limit: int):
+            assert (prompt_identifier, limit) == ("-/guardrails", 1)
+            return iter([SimpleNamespace(commit_hash="c-latest")])
+
+    registry = PromptRegistry(tmp_path / "hub_prompts.json")
+    registry._client = FakeClient()
+
+    assert registry._lookup_commit_hash("guardrails") == "c-latest"
+
+
+def test_registry_serves_cached_prompt_and_refreshes_in_background(tmp_path):
+    cache_path = tmp_path / "hub_prompts.json"
+    fetched: list[str] = []
+
+    def fetch(hub_name: str, commit: str | None) -> HubPrompt:
+        fetched.append(hub_name)
+        return HubPrompt(name=hub_name, content=f"{hub_name} body", commit=commit)
+
+    PromptRegistry(cache_path, fetch=fetch, lookup_commit=lambda name: "c2").load(
+        ["a", "b"]
+    )
+    assert sorted(fetched) == ["a", "b"]
+
+    def slow_fetch(hub_name: str, commit: str | None) -> HubPrompt:
+        time.sleep(0.2)
+        return HubPrompt(name=hub_name, content="new body", commit=commit)
+
+    registry = PromptRegistry(
+        cache_path, fetch=slow_fetch, lookup_commit=lambda name: "c3", startup_timeout=5
+    )
+    cached = registry.load(["a"])
+
+    assert cached["a"] == HubPrompt(name="a", content="a body", commit="c2")
+    registry._fetches["a"].result()
+    assert registry.get("a").commit == "c3"
+
+
+def test_registry_waits_at_most_the_startup_timeout(tmp_path):
+    release = threading.Event()
+
+    def hanging_fetch(hub_name: str, commit: str | None) -> HubPrompt:
+        release.wait(5)
+        return HubPrompt(name=hub_name, content="late", commit=commit)
+
+    registry = PromptRegistry(
+        tmp_path / "cache.json",
+        fetch=hanging_fetch,
+        lookup_commit=lambda name: None,
+        startup_timeout=0.05,
+    )
+
+    assert registry.load(["slow"]) == {}
+    release.set()
+
+
+def test_registry_skips_body_download_when_cached_commit_is_current(tmp_path):
+    cache_path = tmp_path / "hub_prompts.json"
+    PromptRegistry(
+        cache_path,
+        fetch=lambda name, commit: HubPrompt(name=name, content="body", commit=commit),
+        lookup_commit=lambda name: "c1",
+    ).load(["a"])
+
+    def unexpected_fetch(hub_name: str, commit: str | None) -> HubPrompt:
+        raise AssertionError("body should not be downloaded again")
+
+    registry = PromptRegistry(
+        cache_path, fetch=unexpected_fetch, lookup_commit=lambda name: "c1"
+    )
+
+    assert registry.get("a").content == "body"
+    registry._fetches["a"].result()
+    assert registry.commits(["a"]) == {"a": "c1"}
+
+
+def test_commits_never_download_prompt_bodies(tmp_path):
+    def unexpected_fetch(hub_name: str, commit: str | None) -> HubPrompt:
+        raise AssertionError("provenance must not download prompt bodies")
+
+    registry = PromptRegistry(
+        tmp_path / "hub_prompts.json",
+        fetch=unexpected_fetch,
+        lookup_commit=lambda name: f"{name}-commit",
+    )
+
+    assert registry.commits(["a", "b"]) == {"a": "a-commit", "b": "b-commit"}
+    assert registry._fetches == {}
@@ -0,0 +1,127 @@
+"""Tests for the shared retry policy and its retry budget."""
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from langchain_core.messages import ToolMessage
+from langchain_core.runnables import RunnableLambda
+
+from src.middleware import retry_policy
+from src.middleware.retry_middleware import ModelRetryMiddleware
+from src.middleware.retry_policy import RetryBudget, RetryPolicy, retry_after_seconds
+from src.middleware.tool_retry_middleware import ToolRetryMiddleware
+
+
+class RateLimitError(Exception):
+    def __init__(self, headers: dict[str, str]):
+        super().__init__("429 too many requests")
+        self.response = SimpleNamespace(status_code=429, headers=headers)
+
+
+def _policy(capacity: float = 10) -> RetryPolicy:
+    return RetryPolicy(
+        base_delay=0,
+        max_delay=0,
+        budget=RetryBudget(capacity=capacity, refill_per_second=0),
+    )
+
+
+def test_delays_are_jittered_within_bounds_and_honour_retry_after():
+    policy = RetryPolicy(base_delay=0.5, max_delay=8.0)
+    delays = [policy.delay(2.0) for _ in range(50)]
+
+    assert all(0.5 <= delay <= 6.0 for delay in delays)
+    assert len(set(delays)) > 1
+    assert policy.delay(None, RateLimitError({"retry-after": "3"})) >= 3.0
+    assert retry_after_seconds(RateLimitError({"retry-after-ms": "250"})) == 0.25
+    assert not policy.allow_retry(RateLimitError({"retry-after": "120"}))
+
+
+def test_shared_budget_limits_retries_across_layers():
+    policy = _policy(capacity=2)
+    calls: list[str] = []
+
+    def flaky(_):
+        calls.append("summary")
+        raise TimeoutError("timed out")
+
+    async def failing_model(request):  # noqa: ARG001
+        calls.append("model")
+        raise TimeoutError("timed out")
+
+    try:
+        policy.runnable_retry(RunnableLambda(flaky), max_attempts=3).invoke("prompt")
+    except TimeoutError:
+        pass
+    middleware = ModelRetryMiddleware(max_retries=2, policy=policy)
+    try:
+        asyncio.run(middleware.awrap_model_call(None, failing_model))
+    except TimeoutError:
+        pass
+
+    assert calls == ["summary", "summary", "summary", "model"]
+
+
+@pytest.mark.parametrize("finish_reason", ["MALFORMED_FUNCTION_CALL", "MAX_TOKENS"])
+def test_model_retry_returns_the_response_when_no_retry_is_left(finish_reason):
+    response = SimpleNamespace(response_metadata={"finish_reason": finish_reason})
+    outcomes = [TimeoutError("timed out"), response, response]
+
+    async def flaky_model(request):  # noqa: ARG001
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    # The single retry goes to the error; the response finds the budget empty.
+    middleware = ModelRetryMiddleware(max_retries=2, policy=_policy(capacity=1))
+    result = asyncio.run(middleware.awrap_model_call(None, flaky_model))
+
+    assert result is response
+    assert len(outcomes) == 1
+
+
+def test_tool_retries_stop_when_budget_is_exhausted():
+    attempts: list[int] = []
+
+    async def unavailable(request):  # noqa: ARG001
+        attempts.append(1)
+        raise ConnectionError("service unavailable")
+
+    request = SimpleNamespace(tool_call={"name": "search_docs", "id": "call_1"})
+    result = asyncio.run(
+        ToolRetryMiddleware(max_attempts=3, policy=_policy(capacity=1)).awrap_tool_call(
+            request, unavailable
+        )
+    )
+
+    assert isinstance(result, ToolMessage)
+    assert len(attempts) == 2
+    assert "failed after 2 attempts" in result.text
+
+
+def test_runnable_retry_delays_grow_from_the_previous_delay(monkeypatch):
+    monkeypatch.setattr(retry_policy.random, "uniform", lambda low, high: high)
+    policy = RetryPolicy(
+        base_delay=0.001, max_delay=1.0, budget=RetryBudget(capacity=10)
+    )
+    delays: list[float] = []
+    delay = policy.delay
+
+    def recording_delay(previous_delay, error=None):
+        delays.append(delay(previous_delay, error))
+        return delays[-1]
+
+    monkeypatch.setattr(policy, "delay", recording_delay)
+
+    def failing(_):
+        raise TimeoutError("timed out")
+
+    try:
+        policy.runnable_retry(RunnableLambda(failing), max_attempts=4).invoke("prompt")
+    except TimeoutError:
+        pass
+
+    # Tenacity also computes a wait after the last attempt, before stopping.
+    assert delays[:3] == pytest.approx([0.003, 0.009, 0.027])
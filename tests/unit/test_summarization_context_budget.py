@@ -0,0 +1,80 @@
+"""Tests for summarization thresholds that follow the serving model."""
+
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.messages import AIMessage, HumanMessage
+
+from src.agent import config
+from src.middleware.summarization_middleware import (
+    ContextBudget,
+    CustomSummarizationMiddleware,
+)
+from src.prompts.context_summary_prompt import context_summary_prompt
+
+BUDGETS = {
+    "large-model": ContextBudget(trigger_tokens=1_000, keep_tokens=200),
+    "small-model": ContextBudget(trigger_tokens=80, keep_tokens=20),
+}
+
+
+def _middleware() -> CustomSummarizationMiddleware:
+    return CustomSummarizationMiddleware(
+        model=FakeListChatModel(responses=["unused"]),
+        summary_model=FakeListChatModel(responses=["Summary."]),
+        trigger=("tokens", 1_000),
+        keep=("tokens", 200),
+        context_budget=lambda model_name: BUDGETS.get(
+            model_name, BUDGETS["large-model"]
+        ),
+        token_counter=lambda messages: 10 * len(list(messages)),
+        summary_prompt=context_summary_prompt,
+    )
+
+
+def _turns(count: int, model_name: str) -> list:
+    return [
+        HumanMessage(content=f"question {i}", id=f"m{i}")
+        if i % 2 == 0
+        else AIMessage(
+            content=f"answer {i}",
+            id=f"m{i}",
+            response_metadata={"model_name": model_name},
+        )
+        for i in range(count)
+    ]
+
+
+def test_large_model_budget_leaves_history_alone():
+    assert (
+        _middleware().before_model({"messages": _turns(10, "large-model")}, None)
+        is None
+    )
+
+
+def test_fallback_to_smaller_model_summarizes_down_to_its_keep_window():
+    update = _middleware().before_model({"messages": _turns(10, "small-model")}, None)
+
+    assert update is not None
+    kept = update["messages"][2:]
+    assert [message.id for message in kept] == ["m8", "m9"]
+
+
+def test_large_thread_is_summarized_to_fit_the_smallest_fallback():
+    haiku = config.MODELS["claude-haiku-4.5"]
+    middleware = CustomSummarizationMiddleware(
+        model=FakeListChatModel(responses=["unused"]),
+        summary_model=FakeListChatModel(responses=["Summary."]),
+        trigger=("tokens", config.DEFAULT_MODEL.context_budget().trigger_tokens),
+        keep=("tokens", config.DEFAULT_MODEL.context_budget().keep_tokens),
+        context_budget=config.context_budget_for,
+        token_counter=lambda messages: 10_000 * len(list(messages)),
+        summary_prompt=context_summary_prompt,
+    )
+    # 250k tokens served by the default model: within its own window, over the
+    # window of the last fallback.
+    messages = _turns(25, config.DEFAULT_MODEL.id.split(":", 1)[1])
+
+    update = middleware.before_model({"messages": messages}, None)
+
+    assert update is not None
+    kept = update["messages"][1:]
+    assert 10_000 * len(kept) < haiku.context_window
@@ -0,0 +1,91 @@
+"""Tests for incremental rolling summarization."""
+
+import asyncio
+
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.messages import AIMessage, HumanMessage, RemoveMessage
+
+from src.middleware.summarization_middleware import CustomSummarizationMiddleware
+from src.prompts.context_summary_prompt import (
+    context_summary_prompt,
+    incremental_context_summary_prompt,
+)
+
+
+class RecordingSummaryModel:
+    def __init__(self, text: str = "Updated summary."):
+        self.text = text
+        self.prompts: list[str] = []
+
+    async def ainvoke(self, prompt, config=None):  # noqa: ARG002
+        self.prompts.append(prompt)
+        return AIMessage(content=self.text)
+
+
+def _middleware(summary_model) -> CustomSummarizationMiddleware:
+    return CustomSummarizationMiddleware(
+        model=FakeListChatModel(responses=["unused"]),
+        summary_model=summary_model,
+        trigger=("messages", 6),
+        keep=("messages", 2),
+        summary_prompt=context_summary_prompt,
+        incremental_summary_prompt=incremental_context_summary_prompt,
+        trim_tokens_to_summarize=None,
+    )
+
+
+def _turns(start: int, count: int) -> list:
+    return [
+        HumanMessage(content=f"question {i}")
+        if i % 2 == 0
+        else AIMessage(content=f"answer {i}")
+        for i in range(start, start + count)
+    ]
+
+
+def test_first_compaction_summarizes_prefix_and_records_summary():
+    summary_model = RecordingSummaryModel("First summary.")
+    middleware = _middleware(summary_model)
+
+    update = asyncio.run(middleware.abefore_model({"messages": _turns(0, 6)}, None))
+
+    assert "<previous_summary>" not in summary_model.prompts[0]
+    assert update["conversation_summary"] == "First summary."
+    assert isinstance(update["messages"][0], RemoveMessage)
+    assert update["messages"][1].additional_kwargs == {"lc_source": "summarization"}
+    assert [m.content for m in update["messages"][2:]] == ["question 4", "answer 5"]
+
+
+def test_later_compaction_folds_only_evicted_messages_into_previous_summary():
+    summary_model = RecordingSummaryModel("Second summary.")
+    middleware = _middleware(summary_model)
+    summary_message = middleware._build_new_messages("First summary.")[0]
+    state = {
+        "messages": [summary_message, *_turns(4, 5)],
+        "conversation_summary": "First summary.",
+    }
+
+    update = asyncio.run(middleware.abefore_model(state, None))
+
+    prompt = summary_model.prompts[0]
+    assert "<previous_summary>\nFirst summary.\n</previous_summary>" in prompt
+    assert "Here is a summary of the conversation to date" not in prompt
+    assert "question 4" in prompt and "question 6" in prompt
+    assert "answer 7" not in prompt
+    assert update["conversation_summary"] == "Second summary."
+
+
+def test_previous_summary_is_read_from_message_and_kept_on_failure():
+    class FailingSummaryModel:
+        async def ainvoke(self, prompt, config=None):  # noqa: ARG002
+            raise RuntimeError("rate limited")
+
+    middleware = _middleware(FailingSummaryModel())
+    summary_message = middleware._build_new_messages("First summary.")[0]
+
+    update = asyncio.run(
+        middleware.abefore_model({"messages": [summary_message, *_turns(4, 5)]}, None)
+    )
+
+    assert update["conversation_summary"].startswith("First summary.\n\n")
+    assert "rate limited" in update["conversation_summary"]
@@ -0,0 +1,105 @@
+"""Tests for map-reduce summarization of large histories."""
+
+import asyncio
+import time
+
+import pytest
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from langchain_core.runnables import RunnableLambda
+
+from src.middleware.summarization_middleware import CustomSummarizationMiddleware
+from src.prompts.context_summary_prompt import (
+    context_summary_prompt,
+    merge_context_summary_prompt,
+)
+
+CALL_SECONDS = 0.1
+
+
+def _slow_summary_model(prompts: list[str]):
+    async def summarize(prompt: str) -> AIMessage:
+        prompts.append(prompt)
+        await asyncio.sleep(CALL_SECONDS)
+        return AIMessage(content=f"Part {len(prompts)}.")
+
+    return RunnableLambda(summarize)
+
+
+def _middleware(summary_model, concurrency: int = 4) -> CustomSummarizationMiddleware:
+    return CustomSummarizationMiddleware(
+        model=FakeListChatModel(responses=["unused"]),
+        summary_model=summary_model,
+        trigger=("messages", 10),
+        keep=("messages", 2),
+        token_counter=lambda messages: 10 * len(list(messages)),
+        summary_prompt=context_summary_prompt,
+        map_reduce_chunk_tokens=30,
+        map_reduce_concurrency=concurrency,
+        merge_summary_prompt=merge_context_summary_prompt,
+    )
+
+
+def _history() -> list:
+    messages = []
+    for i in range(4):
+        messages += [
+            HumanMessage(content=f"question {i}", id=f"h{i}"),
+            AIMessage(
+                content="",
+                tool_calls=[
+                    {"id": f"c{i}", "name": "search_docs_by_lang_chain", "args": {}}
+                ],
+                id=f"a{i}",
+            ),
+            ToolMessage(content=f"result {i}", tool_call_id=f"c{i}", id=f"t{i}"),
+        ]
+    return [
+        *messages,
+        HumanMessage(content="latest", id="latest"),
+        AIMessage(content="ok"),
+    ]
+
+
+def test_chunks_split_on_message_boundaries_without_orphaning_tool_results():
+    middleware = _middleware(_slow_summary_model([]))
+
+    chunks = middleware._map_reduce_chunks(_history()[:12])
+
+    assert [[m.id for m in chunk] for chunk in chunks] == [
+        [f"h{i}", f"a{i}", f"t{i}"] for i in range(4)
+    ]
+    assert middleware._map_reduce_chunks(_history()[:3]) is None
+
+
+def test_histories_under_the_minimum_are_summarized_in_one_call():
+    middleware = _middleware(_slow_summary_model([]))
+    middleware.map_reduce_min_tokens = 130
+
+    assert middleware._map_reduce_chunks(_history()[:12]) is None
+    assert len(middleware._map_reduce_chunks(_history()[:13])) == 5
+
+
+def test_chunks_are_summarized_concurrently_and_merged():
+    prompts: list[str] = []
+    middleware = _middleware(_slow_summary_model(prompts))
+
+    started = time.perf_counter()
+    update = asyncio.run(middleware.abefore_model({"messages": _history()}, None))
+    elapsed = time.perf_counter() - started
+
+    assert len(prompts) == 5
+    assert "question 0" in prompts[0] and "question 1" not in prompts[0]
+    assert '<summary part="4">' in prompts[-1]
+    assert update["conversation_summary"] == "Part 5."
+    # Four chunks in parallel plus one merge, rather than five sequential calls.
+    assert elapsed < 3.5 * CALL_SECONDS
+
+
+def test_merge_prompt_is_required():
+    with pytest.raises(ValueError, match="merge_summary_prompt"):
+        CustomSummarizationMiddleware(
+            model=FakeListChatModel(responses=["unused"]),
+            summary_model=_slow_summary_model([]),
+            map_reduce_chunk_tokens=1_000,
+        )
@@ -0,0 +1,98 @@
+"""Tests for background pre-summarization ahead of the compaction trigger."""
+
+import asyncio
+
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.messages import AIMessage, HumanMessage
+
+from src.middleware.summarization_middleware import CustomSummarizationMiddleware
+from src.prompts.context_summary_prompt import (
+    context_summary_prompt,
+    incremental_context_summary_prompt,
+)
+
+
+class RecordingSummaryModel:
+    def __init__(self):
+        self.prompts: list[str] = []
+
+    async def ainvoke(self, prompt, config=None):  # noqa: ARG002
+        self.prompts.append(prompt)
+        return AIMessage(content=f"Summary {len(self.prompts)}.")
+
+
+def _middleware(summary_model) -> CustomSummarizationMiddleware:
+    return CustomSummarizationMiddleware(
+        model=FakeListChatModel(responses=["unused"]),
+        summary_model=summary_model,
+        trigger=("tokens", 100),
+        keep=("messages", 2),
+        token_counter=lambda messages: 10 * len(list(messages)),
+        summary_prompt=context_summary_prompt,
+        incremental_summary_prompt=incremental_context_summary_prompt,
+        presummarize_tokens=60,
+    )
+
+
+def _turns(count: int) -> list:
+    return [
+        HumanMessage(content=f"question {i}", id=f"m{i}")
+        if i % 2 == 0
+        else AIMessage(content=f"answer {i}", id=f"m{i}")
+        for i in range(count)
+    ]
+
+
+def test_soft_threshold_summarizes_in_background_and_stores_result():
+    summary_model = RecordingSummaryModel()
+    middleware = _middleware(summary_model)
+    state = {"messages": _turns(6)}
+
+    async def main():
+        during_turn = await middleware.abefore_model(state, None)
+        await asyncio.gather(*middleware._presummary_tasks.values())
+        after_turn = await middleware.aafter_agent(state, None)
+        return during_turn, after_turn
+
+    during_turn, after_turn = asyncio.run(main())
+
+    assert during_turn is None
+    assert "question 2" in summary_model.prompts[0]
+    assert "question 4" not in summary_model.prompts[0]
+    assert after_turn == {"presummary": "Summary 1.", "presummary_through": "m3"}
+
+
+def test_trigger_applies_stored_presummary_without_a_summary_call():
+    summary_model = RecordingSummaryModel()
+    middleware = _middleware(summary_model)
+    state = {
+        "messages": _turns(10),
+        "presummary": "Prepared summary.",
+        "presummary_through": "m7",
+    }
+
+    update = asyncio.run(middleware.abefore_model(state, None))
+
+    assert summary_model.prompts == []
+    assert update["conversation_summary"] == "Prepared summary."
+    assert update["presummary"] is None
+    assert [m.id for m in update["messages"][2:]] == ["m8", "m9"]
+
+
+def test_trigger_folds_only_messages_after_the_presummary():
+    summary_model = RecordingSummaryModel()
+    middleware = _middleware(summary_model)
+    state = {
+        "messages": _turns(10),
+        "presummary": "Prepared summary.",
+        "presummary_through": "m3",
+    }
+
+    update = asyncio.run(middleware.abefore_model(state, None))
+
+    prompt = summary_model.prompts[0]
+    assert "<previous_summary>\nPrepared summary.\n</previous_summary>" in prompt
+    assert "question 2" not in prompt
+    assert "question 4" in prompt and "answer 7" in prompt
+    assert "question 8" not in prompt
+    assert update["conversation_summary"] == "Summary 1."
@@ -0,0 +1,88 @@
+"""Tests for reusing summaries across regenerations and forked threads."""
+
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.runnables import RunnableLambda
+
+from src.middleware.summarization_middleware import CustomSummarizationMiddleware
+from src.prompts.context_summary_prompt import context_summary_prompt
+from src.utils.summary_cache import SummaryCache
+
+
+class CountingSummaryModel:
+    def __init__(self):
+        self.calls = 0
+
+    def invoke(self, prompt, config=None):  # noqa: ARG002
+        self.calls += 1
+        return AIMessage(content=f"Summary {self.calls}.")
+
+
+def _middleware(summary_model, cache, prompt=context_summary_prompt):
+    return CustomSummarizationMiddleware(
+        model=FakeListChatModel(responses=["unused"]),
+        summary_model=summary_model,
+        trigger=("messages", 6),
+        keep=("messages", 2),
+        token_counter=lambda messages: 10 * len(list(messages)),
+        summary_prompt=prompt,
+        summary_cache=cache,
+    )
+
+
+def _thread(thread: str) -> dict:
+    return {
+        "messages": [
+            HumanMessage(content=f"question {i}", id=f"{thread}-{i}")
+            if i % 2 == 0
+            else AIMessage(content=f"answer {i}", id=f"{thread}-{i}")
+            for i in range(6)
+        ]
+    }
+
+
+def _summarize(middleware, state, actor):
+    run = RunnableLambda(lambda _: middleware.before_model(state, None))
+    update = run.invoke(
+        None, config={"configurable": {"langgraph_auth_user_id": actor}}
+    )
+    return update["conversation_summary"]
+
+
+def test_forked_thread_reuses_summary_without_model_call():
+    summary_model = CountingSummaryModel()
+    middleware = _middleware(summary_model, SummaryCache())
+
+    first = _summarize(middleware, _thread("original"), "user-1")
+    forked = _summarize(middleware, _thread("fork"), "user-1")
+
+    assert first == forked == "Summary 1."
+    assert summary_model.calls == 1
+
+
+def test_cache_is_scoped_to_actor_and_prompt_version():
+    summary_model = CountingSummaryModel()
+    cache = SummaryCache()
+
+    _summarize(_middleware(summary_model, cache), _thread("a"), "user-1")
+    _summarize(_middleware(summary_model, cache), _thread("b"), "user-2")
+    _summarize(
+        _middleware(
+            summary_model, cache, prompt=f"{context_summary_prompt}\nBe brief."
+        ),
+        _thread("c"),
+        "user-1",
+    )
+
+    assert summary_model.calls == 3
+    assert len(cache) == 3
+
+
+def test_cache_evicts_least_recently_used():
+    cache = SummaryCache(max_entries=2)
+    cache.put("a", "A")
+    cache.put("b", "B")
+    cache.get("a")
+    cache.put("c", "C")
+
+    assert (cache.get("a"), cache.get("b"), cache.get("c")) == ("A", None, "C")
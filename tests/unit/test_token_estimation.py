@@ -0,0 +1,89 @@
+"""Tests for the cached token estimator."""
+
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from langchain_core.messages.utils import count_tokens_approximately
+from langchain_core.tools import tool
+
+from src.utils import token_estimation
+from src.utils.token_estimation import TokenEstimator, token_estimator_for
+
+
+def _history(size: int) -> list:
+    messages = []
+    for i in range(size):
+        if i % 3 == 0:
+            messages.append(
+                HumanMessage(content=f"question {i} " * (i + 1), id=f"h{i}")
+            )
+        elif i % 3 == 1:
+            messages.append(
+                AIMessage(
+                    content=f"calling {i}",
+                    tool_calls=[
+                        {"id": f"call_{i}", "name": "search_docs", "args": {"q": i}}
+                    ],
+                    response_metadata={"model_provider": "anthropic"},
+                    usage_metadata={
+                        "input_tokens": 1,
+                        "output_tokens": 1,
+                        "total_tokens": 90 * i,
+                    },
+                    id=f"a{i}",
+                )
+            )
+        else:
+            messages.append(
+                ToolMessage(
+                    content="result " * 40 * i, tool_call_id=f"call_{i - 1}", id=f"t{i}"
+                )
+            )
+    return messages
+
+
+def test_counts_match_count_tokens_approximately():
+    estimator = token_estimator_for("anthropic:claude-haiku-4-5-20251001")
+    messages = _history(30)
+
+    for size in (1, 2, 7, 30):
+        assert estimator(messages[:size]) == count_tokens_approximately(
+            messages[:size], chars_per_token=3.3, use_usage_metadata_scaling=True
+        )
+    assert estimator(messages[5:], use_usage_metadata_scaling=False) == (
+        count_tokens_approximately(messages[5:], chars_per_token=3.3)
+    )
+    assert token_estimator_for("anthropic:other-model") is estimator
+
+
+def test_messages_are_counted_once_until_their_content_changes(monkeypatch):
+    counted: list[str] = []
+
+    def counting(messages, **kwargs):
+        counted.extend(message.id for message in messages)
+        return count_tokens_approximately(messages, **kwargs)
+
+    monkeypatch.setattr(token_estimation, "count_tokens_approximately", counting)
+    estimator = TokenEstimator()
+    messages = _history(6)
+
+    estimator(messages)
+    estimator([*messages, HumanMessage(content="follow-up", id="h6")])
+    estimator(messages[2:], use_usage_metadata_scaling=False)
+    edited = messages[0].model_copy(update={"content": "edited question"})
+    estimator([edited, *messages[1:]])
+
+    assert counted == ["h0", "a1", "t2", "h3", "a4", "t5", "h6", "h0"]
+
+
+def test_static_prompt_and_tools_are_precounted():
+    @tool
+    def search_docs(query: str) -> str:
+        """Search the docs."""
+        return query
+
+    estimator = TokenEstimator()
+    prompt_only = estimator.precount_static("You are a docs agent.")
+
+    with_tools = estimator.precount_static("You are a docs agent.", tools=[search_docs])
+
+    assert with_tools > prompt_only > 0
+    assert estimator.static_tokens == with_tools
@@ -0,0 +1,149 @@
+"""Tests for deduplication of repeated tool calls and results."""
+
+import asyncio
+
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from langgraph.prebuilt.tool_node import ToolCallRequest
+
+from src.middleware.summarization_middleware import CustomSummarizationMiddleware
+from src.middleware.tool_dedupe_middleware import ToolResultDedupeMiddleware
+from src.prompts.context_summary_prompt import context_summary_prompt
+
+DOCS_RESULT = "Streaming overview: " + "snippet " * 100
+
+
+def _state(
+    name: str = "search_docs_by_lang_chain", content: str = DOCS_RESULT, **kwargs
+) -> dict:
+    return {
+        "messages": [
+            HumanMessage(content="How do I stream?", id="h0"),
+            AIMessage(
+                content="",
+                tool_calls=[
+                    {"id": "call_1", "name": name, "args": {"query": "streaming"}}
+                ],
+                id="a1",
+            ),
+            ToolMessage(
+                content=content, tool_call_id="call_1", name=name, id="t1", **kwargs
+            ),
+        ]
+    }
+
+
+def _request(
+    state: dict, name: str = "search_docs_by_lang_chain", args=None
+) -> ToolCallRequest:
+    return ToolCallRequest(
+        tool_call={
+            "id": "call_2",
+            "name": name,
+            "args": args or {"query": "streaming"},
+        },
+        tool=None,
+        state=state,
+        runtime=None,
+    )
+
+
+def _run(request: ToolCallRequest, content: str = DOCS_RESULT):
+    calls: list[str] = []
+
+    async def handler(req):
+        calls.append(req.tool_call["id"])
+        return ToolMessage(
+            content=content,
+            tool_call_id=req.tool_call["id"],
+            name=req.tool_call["name"],
+        )
+
+    result = asyncio.run(ToolResultDedupeMiddleware().awrap_tool_call(request, handler))
+    return result, calls
+
+
+def test_repeated_call_is_answered_without_running_the_tool():
+    result, calls = _run(_request(_state()))
+
+    assert calls == []
+    assert result.tool_call_id == "call_2"
+    assert result.additional_kwargs == {"duplicate_of": "call_1"}
+    assert "Identical to the result of call call_1 above" in result.text
+
+
+def test_repeated_content_under_different_arguments_is_referenced():
+    result, calls = _run(_request(_state(), args={"query": "stream tokens"}))
+
+    assert calls == ["call_2"]
+    assert result.additional_kwargs == {"duplicate_of": "call_1"}
+
+
+def test_errors_and_other_tools_are_not_deduplicated():
+    failed, failed_calls = _run(_request(_state(status="error")))
+    pricing_state = _state(name="fetch_langchain_pricing")
+    pricing, pricing_calls = _run(
+        _request(pricing_state, name="fetch_langchain_pricing")
+    )
+
+    assert failed_calls == ["call_2"] and failed.text == DOCS_RESULT
+    assert pricing_calls == ["call_2"] and pricing.text == DOCS_RESULT
+
+
+def _summarizer(trigger_tokens: int = 200, **kwargs) -> CustomSummarizationMiddleware:
+    return CustomSummarizationMiddleware(
+        model=FakeListChatModel(responses=["unused"]),
+        summary_model=FakeListChatModel(responses=["Earlier: searched streaming."]),
+        trigger=("tokens", trigger_tokens),
+        keep=("messages", 2),
+        summary_prompt=context_summary_prompt,
+        **kwargs,
+    )
+
+
+def _history_with_reference() -> list:
+    state = _state()
+    stub, _ = _run(_request(state))
+    repeat = AIMessage(
+        content="",
+        tool_calls=[
+            {
+                "id": "call_2",
+                "name": "search_docs_by_lang_chain",
+                "args": {"query": "streaming"},
+            }
+        ],
+        id="a2",
+    )
+    return [
+        *state["messages"],
+        AIMessage(content="Use astream.", id="a_answer"),
+        repeat,
+        stub,
+    ]
+
+
+def test_summarization_inlines_references_to_evicted_results():
+    messages = _history_with_reference()
+
+    update = _summarizer().before_model({"messages": messages}, None)
+
+    *_, repeat, restored = update["messages"]
+    assert repeat.id == "a2"
+    assert restored.tool_call_id == "call_2"
+    assert restored.text == DOCS_RESULT
+    assert "duplicate_of" not in restored.additional_kwargs
+
+
+def test_compaction_gives_references_the_stub_of_the_compacted_result():
+    messages = _history_with_reference()
+
+    # Compaction alone brings this history under the trigger.
+    update = _summarizer(300, compact_tool_outputs=True).before_model(
+        {"messages": messages}, None
+    )
+
+    compacted = {message.tool_call_id: message for message in update["messages"]}
+    assert set(compacted) == {"call_1", "call_2"}
+    assert compacted["call_2"].text == compacted["call_1"].text
+    assert compacted["call_2"].text.startswith("[Compacted search_docs_by_lang_chain")
@@ -0,0 +1,82 @@
+"""Tests for deterministic compaction of re-fetchable tool output."""
+
+import json
+
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+from src.middleware.summarization_middleware import CustomSummarizationMiddleware
+from src.middleware.tool_output_compaction import compact_tool_messages
+from src.prompts.context_summary_prompt import context_summary_prompt
+
+
+def _tool_turn(index: int, name: str, args: dict, content: str) -> list:
+    call_id = f"call_{index}"
+    return [
+        AIMessage(
+            content="",
+            tool_calls=[{"id": call_id, "name": name, "args": args}],
+            id=f"ai_{index}",
+        ),
+        ToolMessage(
+            content=content, tool_call_id=call_id, name=name, id=f"tool_{index}"
+        ),
+    ]
+
+
+def _history() -> list:
+    article = (
+        "ID: art_1\nTitle: Streaming tokens\n"
+        "URL: https://support.langchain.com/articles/1-streaming\n"
+        "Collection: OSS\n\nContent:\n" + "<p>Body</p>" * 200
+    )
+    return [
+        HumanMessage(content="How do I stream tokens?", id="human_0"),
+        *_tool_turn(
+            1,
+            "search_docs_by_lang_chain",
+            {"query": "streaming"},
+            "Streaming overview\n"
+            "https://docs.langchain.com/oss/python/langchain/streaming\n"
+            + "snippet "
+            * 200,
+        ),
+        *_tool_turn(2, "get_support_article_content", {"article_id": "art_1"}, article),
+        *_tool_turn(3, "custom_tool", {}, "kept " * 200),
+        AIMessage(content="Use stream_mode='messages'.", id="ai_answer"),
+        HumanMessage(content="Thanks", id="human_1"),
+    ]
+
+
+def test_refetchable_results_become_reference_stubs():
+    messages = _history()
+
+    stubs = compact_tool_messages(messages, len(messages))
+
+    assert [stub.id for stub in stubs] == ["tool_1", "tool_2"]
+    docs, article = (stub.text for stub in stubs)
+    assert json.dumps({"query": "streaming"}) in docs
+    assert "https://docs.langchain.com/oss/python/langchain/streaming" in docs
+    assert "ID: art_1\nTitle: Streaming tokens" in article
+    assert "<p>Body</p>" not in article
+    assert all(stub.tool_call_id == f"call_{i}" for i, stub in enumerate(stubs, 1))
+    assert compact_tool_messages([*messages[:2], stubs[0]], 3) == []
+
+
+def test_compaction_alone_can_avoid_llm_summarization():
+    class FailingSummaryModel:
+        def invoke(self, prompt, config=None):  # noqa: ARG002
+            raise AssertionError("summary model should not be called")
+
+    middleware = CustomSummarizationMiddleware(
+        model=FakeListChatModel(responses=["unused"]),
+        summary_model=FailingSummaryModel(),
+        trigger=("tokens", 1_000),
+        keep=("messages", 2),
+        summary_prompt=context_summary_prompt,
+        compact_tool_outputs=True,
+    )
+
+    update = middleware.before_model({"messages": _history()}, None)
+
+    assert [message.id for message in update["messages"]] == ["tool_1", "tool_2"]
@@ -0,0 +1,123 @@
+"""Tests for the per-turn deadline and model-retry budget."""
+
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+from langchain.agents.middleware.types import ExtendedModelResponse, ModelResponse
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import RunnableLambda
+from langgraph.types import Command
+
+from src.middleware.retry_middleware import ModelRetryMiddleware
+from src.middleware.retry_policy import (
+    AttemptBudget,
+    AttemptBudgetExceeded,
+    RetryBudget,
+    RetryPolicy,
+    attempt_scope,
+    start_model_attempt,
+)
+from src.middleware.turn_budget_middleware import TurnBudgetMiddleware
+
+POLICY = RetryPolicy(base_delay=0, max_delay=0, budget=RetryBudget(capacity=100))
+
+
+def _request(**state):
+    return SimpleNamespace(state={"messages": [], **state})
+
+
+def test_retries_and_fallbacks_share_the_turn_retry_limit():
+    calls: list[str] = []
+
+    def model(name, fallback=False):
+        def call(_):
+            calls.append(name)
+            raise TimeoutError("timed out")
+
+        return POLICY.runnable_retry(
+            RunnableLambda(call), max_attempts=3, fallback=fallback
+        )
+
+    chain = model("primary").with_fallbacks([model("fallback", fallback=True)])
+    with attempt_scope(AttemptBudget(max_retries=3)), pytest.raises(Exception):
+        chain.invoke("prompt")
+
+    # Two primary retries and the first fallback attempt use up the three retries.
+    assert calls == ["primary", "primary", "primary", "fallback"]
+
+
+def test_successful_model_calls_are_not_capped():
+    budget = AttemptBudget(max_retries=0)
+
+    with attempt_scope(budget):
+        for _ in range(100):
+            start_model_attempt()
+        with pytest.raises(AttemptBudgetExceeded):
+            start_model_attempt(fallback=True)
+
+    assert (budget.attempts, budget.retries) == (100, 0)
+
+
+def test_turn_counts_attempts_and_reports_them_in_state():
+    state = asyncio.run(
+        TurnBudgetMiddleware(max_model_retries=5).abefore_agent({}, None)
+    )
+    failures = iter([TimeoutError("timed out")])
+
+    async def model(request):  # noqa: ARG001
+        start_model_attempt()
+        if error := next(failures, None):
+            raise error
+        return ModelResponse(result=[AIMessage(content="answer")])
+
+    retrying = ModelRetryMiddleware(max_retries=2, policy=POLICY)
+    result = asyncio.run(
+        TurnBudgetMiddleware(max_model_retries=5).awrap_model_call(
+            _request(**state), lambda request: retrying.awrap_model_call(request, model)
+        )
+    )
+
+    assert isinstance(result, ExtendedModelResponse)
+    assert result.command.update == {"model_attempts": 2, "model_retries": 1}
+
+
+def test_deadline_stops_only_retries_and_fallbacks():
+    attempts: list[str] = []
+
+    async def model(request):  # noqa: ARG001
+        start_model_attempt()
+        attempts.append("first")
+        start_model_attempt(fallback=True)
+        attempts.append("fallback")
+
+    with pytest.raises(AttemptBudgetExceeded):
+        asyncio.run(
+            TurnBudgetMiddleware().awrap_model_call(
+                _request(turn_deadline=time.time() - 1, model_attempts=3), model
+            )
+        )
+    assert attempts == ["first"]
+    assert not AttemptBudget(deadline=time.time() - 1).allows()
+
+
+def test_counters_are_added_to_an_inner_command():
+    state = asyncio.run(TurnBudgetMiddleware().abefore_agent({}, None))
+
+    async def model(request):  # noqa: ARG001
+        start_model_attempt()
+        return ExtendedModelResponse(
+            model_response=ModelResponse(result=[AIMessage(content="answer")]),
+            command=Command(update={"presummary": None}),
+        )
+
+    result = asyncio.run(
+        TurnBudgetMiddleware().awrap_model_call(_request(**state), model)
+    )
+
+    assert result.command.update == {
+        "presummary": None,
+        "model_attempts": 1,
+        "model_retries": 0,
+    }